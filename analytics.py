@@ -0,0 +1,168 @@
+from datetime import date, timedelta
+import metrics
+from services import ServiceError
+from snapshot import SalesSnapshot
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+ROLLING_WINDOWS = (7, 30)  # Days averaged by the trend lines
+
+
+def as_date(value):
+    return date.fromisoformat(str(value)[:10]) if value else None
+
+
+def year_before(day):
+    # 29 February falls back to the 28th
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        return day.replace(year=day.year - 1, day=28)
+
+
+def change_pct(current, previous):
+    return round((current - previous) / previous * 100, 1) if previous else None
+
+
+class SalesAnalytics:
+    """
+    Time-series views of sales for the reports tab and the API: an hour by
+    weekday heatmap, period-over-period comparisons, rolling averages and
+    revenue by category.
+
+    Everything is answered from the rollup tables (daily_sales,
+    hourly_sales, product_daily_sales), which process_sale keeps current,
+    so a year of history is a few hundred rows however busy the shop is.
+    The shaping is done with numpy/pandas on whole columns, never row by
+    row. A missing start means "since the first sale"; a missing end means
+    today. Results are plain dicts and lists, ready for JSON.
+    Basket trends need every sale line, so they read the columnar
+    SalesSnapshot for closed months instead of sale_items.
+    """
+
+    def __init__(self, db, snapshot=None):
+        self.db = db
+        self.snapshot = snapshot or SalesSnapshot()
+
+    def _range(self, start, end):
+        end = as_date(end) or date.today()
+        start = as_date(start)
+        if start is None:
+            first = self.db.query("SELECT MIN(day) FROM daily_sales", one=True)[0]
+            start = as_date(first) or end
+        return start, end
+
+    @metrics.timed("report", report="sales_heatmap")
+    def heatmap(self, start=None, end=None, value="revenue"):
+        """7x24 grid (Monday first) of revenue or invoice counts by weekday and hour of day"""
+        import numpy as np
+        import pandas as pd
+
+        if value not in ("revenue", "invoices"):
+            raise ServiceError(f"Unknown heatmap value {value!r}")
+        df = self.db.get_hourly_sales(start, end)
+        grid = np.zeros((7, 24))
+        if not df.empty:
+            weekdays = pd.to_datetime(df['day']).dt.weekday.to_numpy()
+            np.add.at(grid, (weekdays, df['hour'].to_numpy(dtype=int)), df[value].to_numpy(dtype=float))
+        busiest = None
+        if grid.any():
+            weekday, hour = np.unravel_index(grid.argmax(), grid.shape)
+            busiest = {'weekday': WEEKDAYS[weekday], 'hour': int(hour), value: round(float(grid.max()), 2)}
+        return {'value': value, 'weekdays': list(WEEKDAYS), 'hours': list(range(24)),
+                'grid': grid.round(2).tolist(), 'busiest': busiest}
+
+    def _daily(self, start, end):
+        """daily_sales over [start, end] on a full calendar, days without sales as zero"""
+        import pandas as pd
+
+        df = self.db.get_daily_sales(start, end)
+        calendar = pd.date_range(start, end, freq="D")
+        if df.empty:
+            return pd.DataFrame(0.0, index=calendar, columns=["revenue", "tax", "discount", "invoices"])
+        df.index = pd.to_datetime(df['day'])
+        return df[["revenue", "tax", "discount", "invoices"]].astype(float).reindex(calendar, fill_value=0.0)
+
+    @metrics.timed("report", report="sales_compare")
+    def compare(self, start=None, end=None, against="week"):
+        """
+        The range against the same days a week earlier ("week") or a year
+        earlier ("year"): totals, percentage change and day-by-day pairs.
+        """
+        start, end = self._range(start, end)
+        if against == "week":
+            shift = lambda day: day - timedelta(days=7)
+        elif against == "year":
+            shift = year_before
+        else:
+            raise ServiceError(f"Unknown comparison {against!r}")
+        prev_start, prev_end = shift(start), shift(end)
+
+        current = self._daily(start, end)
+        previous = self._daily(prev_start, prev_end)
+        totals = {name: {col: round(float(frame[col].sum()), 2) for col in frame.columns}
+                  for name, frame in (('current', current), ('previous', previous))}
+        for name in totals:
+            totals[name]['invoices'] = int(totals[name]['invoices'])
+        # Day n of the range against day n of the earlier one (year ranges can differ by a leap day)
+        n = min(len(current), len(previous))
+        return {
+            'against': against,
+            'start': start.isoformat(), 'end': end.isoformat(),
+            'previous_start': prev_start.isoformat(), 'previous_end': prev_end.isoformat(),
+            **totals,
+            'change_pct': {col: change_pct(totals['current'][col], totals['previous'][col])
+                           for col in ("revenue", "invoices")},
+            'daily': [{'day': day.strftime("%Y-%m-%d"), 'revenue': round(cur, 2), 'previous': round(prev, 2)}
+                      for day, cur, prev in zip(current.index[:n], current['revenue'].to_numpy()[:n],
+                                                previous['revenue'].to_numpy()[:n])],
+        }
+
+    @metrics.timed("report", report="sales_trend")
+    def rolling(self, start=None, end=None, windows=ROLLING_WINDOWS):
+        """Daily revenue with rolling means; the windows reach back before `start` so day one is complete"""
+        start, end = self._range(start, end)
+        windows = tuple(int(w) for w in windows)
+        df = self._daily(start - timedelta(days=max(windows) - 1), end)
+        revenue = df['revenue']
+        trend = {f"avg_{w}": revenue.rolling(w, min_periods=1).mean().round(2) for w in windows}
+        keep = df.index >= str(start)
+        return {
+            'start': start.isoformat(), 'end': end.isoformat(), 'windows': list(windows),
+            'days': [day.strftime("%Y-%m-%d") for day in df.index[keep]],
+            'revenue': revenue[keep].round(2).tolist(),
+            **{name: series[keep].tolist() for name, series in trend.items()},
+        }
+
+    @metrics.timed("report", report="category_revenue")
+    def category_revenue(self, start=None, end=None):
+        """Revenue, units and share of revenue per product category, largest first"""
+        df = self.db.get_category_sales(start, end)
+        if df.empty:
+            return []
+        revenue = df['revenue'].astype(float)
+        share = (revenue / revenue.sum() * 100).round(1) if revenue.sum() else revenue * 0
+        return [{'category': category, 'quantity': int(qty), 'revenue': round(float(rev), 2), 'share': float(pct)}
+                for category, qty, rev, pct in zip(df['category'], df['quantity'], revenue, share)]
+
+    @metrics.timed("report", report="basket_trend")
+    def basket_trend(self, start=None, end=None):
+        """
+        Per month: invoices, average bill, and average lines and units per
+        bill, from the sale lines (see SalesSnapshot.history).
+        """
+        import pandas as pd
+
+        start, end = self._range(start, end)
+        items = self.snapshot.history(self.db, "items", start, end, columns=["invoice_id", "date", "quantity"])
+        sales = self.snapshot.history(self.db, "sales", start, end, columns=["invoice_id", "date", "grand_total"])
+        if sales.empty:
+            return []
+        bills = items.groupby("invoice_id").agg(lines=("quantity", "size"), units=("quantity", "sum"))
+        sales = sales.join(bills, on="invoice_id").fillna({'lines': 0, 'units': 0})
+        months = sales.groupby(pd.to_datetime(sales['date']).dt.strftime("%Y-%m")).agg(
+            invoices=("invoice_id", "size"), revenue=("grand_total", "sum"), avg_bill=("grand_total", "mean"),
+            avg_lines=("lines", "mean"), avg_units=("units", "mean"))
+        return [{'month': month, 'invoices': int(row.invoices), 'revenue': round(float(row.revenue), 2),
+                 'avg_bill': round(float(row.avg_bill), 2), 'avg_lines': round(float(row.avg_lines), 2),
+                 'avg_units': round(float(row.avg_units), 2)}
+                for month, row in months.iterrows()]
@@ -0,0 +1,383 @@
+"""
+HTTP/JSON API over the service layer, for web and mobile clients.
+
+    python api.py [--host 0.0.0.0] [--port 8080] [--journal] [--no-invoices]
+
+Every request needs HTTP Basic auth with a shop user; product changes
+need an Admin. Bodies and responses are JSON.
+
+    GET    /health
+    GET    /metrics                   Prometheus text format
+    GET    /products?q=toy            GET /products/{id}
+    POST   /products                  {"name", "category", "price", "stock", "min_stock"}
+    PUT    /products/{id}             same fields
+    DELETE /products/{id}
+    POST   /quote                     {"items": [{"id": 1, "qty": 2, "discount_percent": 0}], "discount_percent": 0,
+                                       "tax_percent": 18}  ("tax_percent": "GST" for GST by category)
+    POST   /checkout                  same body; 201 with the saved invoice
+    GET    /reports/sales-summary?from=YYYY-MM-DD&to=YYYY-MM-DD
+    GET    /reports/top-products?n=10&by=quantity|revenue&from=...&to=...
+    GET    /reports/low-stock
+    GET    /reports/reorder           low or soon-to-be-low products with days left and reorder quantity
+    GET    /analytics/heatmap?value=revenue|invoices&from=...&to=...
+    GET    /analytics/compare?against=week|year&from=...&to=...
+    GET    /analytics/trend?from=...&to=...
+    GET    /analytics/categories?from=...&to=...
+    GET    /analytics/baskets?from=...&to=...
+
+The server is a single asyncio loop speaking HTTP/1.1 with keep-alive;
+database work runs on a thread pool the size of the connection pool,
+so requests queue for a worker instead of for a connection.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qs
+from database import ShopDatabase
+import metrics
+from pricing import financials
+from report_engine import ReportEngine
+from services import BillingService, InventoryService, ReportService, ServiceError, NotFound, OutOfStock
+
+MAX_BODY = 1 << 20        # bytes
+MAX_HEADERS = 100
+AUTH_CACHE_SECONDS = 60   # Verified logins are trusted this long without a database lookup
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+           403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def product_json(row):
+    pid, name, category, price, stock, min_stock = row
+    return {'id': pid, 'name': name, 'category': category, 'price': float(price),
+            'stock': int(stock), 'min_stock': int(min_stock)}
+
+
+class ShopApi:
+    def __init__(self, db, billing, inventory, reports, workers):
+        self.db = db
+        self.billing = billing
+        self.inventory = inventory
+        self.reports = reports
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Repeated report requests are answered from cache until sales or products change
+        self.report_engine = ReportEngine(db, reports, inventory)
+        self.auth_cache = {}
+
+        # (method, path pattern, handler, admin only)
+        self.routes = [
+            ("GET", r"/health", self.health, False),
+            ("GET", r"/metrics", self.prometheus, False),
+            ("GET", r"/products", self.list_products, False),
+            ("GET", r"/products/(\d+)", self.get_product, False),
+            ("POST", r"/products", self.add_product, True),
+            ("PUT", r"/products/(\d+)", self.update_product, True),
+            ("DELETE", r"/products/(\d+)", self.delete_product, True),
+            ("POST", r"/quote", self.quote, False),
+            ("POST", r"/checkout", self.checkout, False),
+            ("GET", r"/reports/sales-summary", self.sales_summary, False),
+            ("GET", r"/reports/top-products", self.top_products, False),
+            ("GET", r"/reports/low-stock", self.low_stock, False),
+            ("GET", r"/reports/reorder", self.reorder, False),
+            ("GET", r"/analytics/heatmap", self.heatmap, False),
+            ("GET", r"/analytics/compare", self.compare, False),
+            ("GET", r"/analytics/trend", self.trend, False),
+            ("GET", r"/analytics/categories", self.categories, False),
+            ("GET", r"/analytics/baskets", self.baskets, False),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler, admin)
+                       for method, pattern, handler, admin in self.routes]
+
+    # --- Handlers (run on the worker pool) ---
+    def health(self, request):
+        health = {'status': 'ok', 'backend': self.db.backend.name, 'pool': self.db.pool_metrics()}
+        if self.billing.journal is not None:
+            health['journal'] = self.billing.journal.lag()
+        return 200, health
+
+    def prometheus(self, request):
+        return 200, metrics.registry.prometheus_text()
+
+    def list_products(self, request):
+        query = request['query'].get('q', [""])[0]
+        return 200, [product_json(row) for row in self.inventory.list_products(query)]
+
+    def get_product(self, request, pid):
+        return 200, product_json(self.inventory.get_product(pid))
+
+    def add_product(self, request):
+        body = request['json']
+        try:
+            pid = self.inventory.add_product(body['name'], body['category'], body['price'], body['stock'],
+                                             body.get('min_stock', 10))
+        except KeyError as e:
+            raise HttpError(400, f"Missing field {e}")
+        return 201, product_json(self.inventory.get_product(pid))
+
+    def update_product(self, request, pid):
+        body = request['json']
+        current = self.inventory.get_product(pid)
+        fields = dict(zip(('id', 'name', 'category', 'price', 'stock', 'min_stock'), current))
+        fields.update({k: v for k, v in body.items() if k in fields and k != 'id'})
+        self.inventory.update_product(pid, fields['name'], fields['category'], fields['price'],
+                                      fields['stock'], fields['min_stock'])
+        return 200, product_json(self.inventory.get_product(pid))
+
+    def delete_product(self, request, pid):
+        self.inventory.delete_product(pid)
+        return 204, None
+
+    def _cart(self, body):
+        if not isinstance(body.get('items'), list):
+            raise HttpError(400, "Body needs an 'items' list")
+        return self.billing.cart_from_lines(body['items'])
+
+    def quote(self, request):
+        body = request['json']
+        cart = self._cart(body)
+        bill = self.billing.price(cart, body.get('discount_percent', 0), body.get('tax_percent', 0))
+        return 200, {
+            'items': [{'id': pid, 'name': name, 'price': price, 'qty': qty, 'total': total}
+                      for pid, name, price, qty, total in self.billing.priced_items(cart, bill)],
+            **financials(bill),
+        }
+
+    def checkout(self, request):
+        body = request['json']
+        cart = self._cart(body)
+        invoice = self.billing.checkout(cart, body.get('discount_percent', 0), body.get('tax_percent', 0))
+        invoice['items'] = [{'name': name, 'price': price, 'qty': qty, 'total': total}
+                            for name, price, qty, total in invoice['items']]
+        return 201, invoice
+
+    def sales_summary(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("sales_summary", query.get('from', [None])[0], query.get('to', [None])[0])
+
+    def top_products(self, request):
+        query = request['query']
+        try:
+            n = int(query.get('n', ["10"])[0])
+        except ValueError:
+            raise HttpError(400, "n must be a whole number")
+        return 200, self.report_engine.get("top_products", n, query.get('from', [None])[0],
+                                           query.get('to', [None])[0], by=query.get('by', ["quantity"])[0])
+
+    def low_stock(self, request):
+        return 200, [product_json(row) for row in self.report_engine.get("low_stock")]
+
+    def reorder(self, request):
+        return 200, self.report_engine.get("reorder")
+
+    def heatmap(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("sales_heatmap", query.get('from', [None])[0], query.get('to', [None])[0],
+                                           value=query.get('value', ["revenue"])[0])
+
+    def compare(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("sales_compare", query.get('from', [None])[0], query.get('to', [None])[0],
+                                           against=query.get('against', ["week"])[0])
+
+    def trend(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("sales_trend", query.get('from', [None])[0], query.get('to', [None])[0])
+
+    def categories(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("category_revenue", query.get('from', [None])[0],
+                                           query.get('to', [None])[0])
+
+    def baskets(self, request):
+        query = request['query']
+        return 200, self.report_engine.get("basket_trend", query.get('from', [None])[0], query.get('to', [None])[0])
+
+    # --- Plumbing ---
+    def authenticate(self, header):
+        """Role for an `Authorization: Basic ...` header (runs on the worker pool)"""
+        if not header or not header.startswith("Basic "):
+            raise HttpError(401, "Login required")
+        try:
+            username, password = base64.b64decode(header[6:]).decode().split(":", 1)
+        except (ValueError, UnicodeDecodeError):
+            raise HttpError(401, "Malformed credentials")
+        key = (username, self.db.hash_password(password))
+        cached = self.auth_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        role = self.db.verify_login(username, password)
+        if not role:
+            raise HttpError(401, "Invalid Username or Password")
+        self.auth_cache[key] = (role, time.monotonic() + AUTH_CACHE_SECONDS)
+        return role
+
+    def dispatch(self, request):
+        """Route and run one request; returns (status, payload). Runs on the worker pool."""
+        allowed = False
+        for method, pattern, handler, admin in self.routes:
+            match = pattern.match(request['path'])
+            if not match:
+                continue
+            allowed = True
+            if method != request['method']:
+                continue
+            role = self.authenticate(request['headers'].get('authorization'))
+            if admin and role != 'Admin':
+                raise HttpError(403, "Admin only")
+            if request['method'] in ("POST", "PUT"):
+                try:
+                    request['json'] = json.loads(request['body'] or b"{}")
+                except ValueError:
+                    raise HttpError(400, "Body is not valid JSON")
+                if not isinstance(request['json'], dict):
+                    raise HttpError(400, "Body must be a JSON object")
+            return handler(request, *match.groups())
+        raise HttpError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    def respond(self, request):
+        try:
+            return self.dispatch(request)
+        except HttpError as e:
+            return e.status, {'error': str(e)}
+        except NotFound as e:
+            return 404, {'error': str(e)}
+        except OutOfStock as e:
+            return 409, {'error': str(e)}
+        except ServiceError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            print(f"Error handling {request['method']} {request['path']}: {e}")
+            return 500, {'error': "Internal error"}
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY:
+            raise HttpError(413, "Body too large")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return {'method': method.upper(), 'path': url.path.rstrip("/") or "/", 'query': parse_qs(url.query),
+                'headers': headers, 'body': body, 'version': version}
+
+    def write_response(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"" if payload is None else json.dumps(payload, default=json_default).encode()
+            content_type = "application/json"
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Length: {len(body)}",
+                "Connection: keep-alive" if keep_alive else "Connection: close"]
+        if body:
+            head.append(f"Content-Type: {content_type}")
+        if status == 401:
+            head.append('WWW-Authenticate: Basic realm="shop"')
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HttpError as e:
+                    self.write_response(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                start = time.perf_counter()
+                status, payload = await loop.run_in_executor(self.executor, self.respond, request)
+                metrics.registry.observe("shop_http_request_seconds", time.perf_counter() - start,
+                                         method=request['method'], status=status)
+                keep_alive = (request['headers'].get('connection', '').lower() != 'close'
+                              and request['version'] == "HTTP/1.1")
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Shop API listening on http://{host}:{port} ({self.db.backend})")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--journal", action="store_true",
+                        help="journal checkouts locally and sync in the background (offline tills)")
+    parser.add_argument("--no-invoices", action="store_true", help="do not render invoice PDFs")
+    args = parser.parse_args()
+
+    db = ShopDatabase()
+    db.start_catalog_refresh()
+    journal = invoice_queue = None
+    if args.journal:
+        from journal import SaleJournal
+        journal = SaleJournal(db)
+        journal.start()
+    if not args.no_invoices:
+        from invoice_queue import InvoiceQueue
+        invoice_queue = InvoiceQueue()
+        invoice_queue.start()
+
+    api = ShopApi(db, BillingService(db, journal=journal, invoice_queue=invoice_queue),
+                  InventoryService(db), ReportService(db), workers=db.backend.pool_size)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.executor.shutdown()
+        api.report_engine.shutdown()
+        if journal:
+            journal.close()
+        if invoice_queue:
+            invoice_queue.stop()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
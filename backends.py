@@ -0,0 +1,316 @@
+"""
+Storage backends behind ShopDatabase.
+
+All SQL in the app is written once, with %s placeholders. A backend
+supplies connections and cursors plus the few pieces of dialect that
+differ between engines: upserts, DDL types, index lookups, locking and
+EXPLAIN. `from_config()` picks one from config.DB_BACKEND.
+"""
+import math
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+import config
+
+MIGRATION_LOCK = "shop_inventory_migrations"
+
+
+class MySQLBackend:
+    """A shared MySQL server (mysql-connector-python)"""
+    name = "mysql"
+    autoincrement_pk = "INT AUTO_INCREMENT PRIMARY KEY"
+    supports_fulltext = True
+    for_update = " FOR UPDATE"  # Row lock for read-then-write inside a transaction
+
+    def __init__(self, host=config.MYSQL_HOST, port=config.MYSQL_PORT, user=config.MYSQL_USER,
+                 password=config.MYSQL_PASSWORD, database=config.MYSQL_DATABASE, pool_size=config.DB_POOL_SIZE):
+        import mysql.connector
+        self.connector = mysql.connector
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.pool_size = pool_size
+        # Errors that mean the connection itself is gone and must not be reused
+        self.connection_errors = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+        self.integrity_errors = (mysql.connector.IntegrityError,)
+        # Errors caused by the values themselves; retrying cannot help
+        self.data_errors = (mysql.connector.IntegrityError, mysql.connector.DataError)
+
+    def __str__(self):
+        return f"mysql://{self.user}@{self.host}:{self.port}/{self.database}"
+
+    # --- Connections ---
+    def create_database(self):
+        """Connect to the server and create the database if it doesn't exist"""
+        conn = self.connector.connect(host=self.host, port=self.port, user=self.user, password=self.password)
+        try:
+            cur = conn.cursor()
+            cur.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        finally:
+            conn.close()
+
+    def connect(self):
+        conn = self.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database
+        )
+        # Each statement sees fresh data; writes opt in via transaction()
+        conn.autocommit = True
+        return conn
+
+    def is_alive(self, conn):
+        return conn.is_connected()
+
+    def cursor(self, conn, buffered=True):
+        # buffered=True prevents 'Unread result found' errors when a query's
+        # rows are not all consumed; streams ask for an unbuffered cursor
+        return conn.cursor(buffered=buffered)
+
+    def begin(self, conn):
+        conn.start_transaction()
+
+    def set_lock_wait(self, conn, seconds):
+        """Cap how long this session waits on another's row lock (None = server default)"""
+        wait = "DEFAULT" if seconds is None else max(1, math.ceil(seconds))  # Whole seconds, at least 1
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SET SESSION innodb_lock_wait_timeout = {wait}")
+        finally:
+            cur.close()
+
+    def is_lock_timeout(self, error):
+        # ER_LOCK_WAIT_TIMEOUT; only the statement is rolled back, the link is fine
+        return isinstance(error, self.connector.Error) and error.errno == 1205
+
+    def finish_stream(self, conn):
+        # Drain anything unread (e.g. a cancelled export) before reuse
+        if conn.unread_result:
+            conn.consume_results()
+
+    # --- Dialect ---
+    def upsert(self, table, columns, keys, add=(), replace=()):
+        """INSERT that, on a key clash, adds to the `add` columns and overwrites the `replace` columns"""
+        sets = [f"{c} = {c} + VALUES({c})" for c in add] + [f"{c} = VALUES({c})" for c in replace]
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {', '.join(sets)}")
+
+    def index_exists(self, cur, table, index):
+        cur.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """, (table, index))
+        return cur.fetchone() is not None
+
+    def column_exists(self, cur, table, column):
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            LIMIT 1
+        """, (table, column))
+        return cur.fetchone() is not None
+
+    def generated_column(self, name, expression):
+        return f"{name} TINYINT(1) AS ({expression}) VIRTUAL"
+
+    def hour(self, column):
+        return f"HOUR({column})"
+
+    @contextmanager
+    def migration_lock(self, cur):
+        # Two tills starting at once must not run the same step twice
+        cur.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+        if cur.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another till to finish migrating the schema")
+        try:
+            yield
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cur.fetchone()
+
+    def explain(self, cur, sql, params, table):
+        """(key used, keys considered, access type) for `table` in the plan of `sql`"""
+        cur.execute(f"EXPLAIN {sql}", params)
+        columns = [d[0] for d in cur.description]
+        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        plan = next((r for r in rows if r.get('table') == table), rows[0] if rows else {})
+        return plan.get('key') or "", (plan.get('possible_keys') or "").split(","), plan.get('type')
+
+
+# SQLite has no DECIMAL or DATETIME type of its own; store them as text and
+# turn them back into the same Python types mysql.connector returns. Every
+# DECIMAL column in the schema has two places.
+CENTS = Decimal("0.01")
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()).quantize(CENTS))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+
+
+@lru_cache(maxsize=1024)
+def qmark(sql):
+    """Rewrite the app's %s placeholders in sqlite3's ? style"""
+    return sql.replace("%s", "?")
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts %s placeholders like the MySQL one"""
+
+    def __init__(self, cur):
+        self.cur = cur
+
+    def execute(self, sql, params=()):
+        self.cur.execute(qmark(sql), tuple(params))
+
+    def executemany(self, sql, seq_of_params):
+        self.cur.executemany(qmark(sql), seq_of_params)
+
+    def fetchone(self):
+        return self.cur.fetchone()
+
+    def fetchall(self):
+        return self.cur.fetchall()
+
+    def fetchmany(self, size):
+        return self.cur.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self.cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cur.lastrowid
+
+    @property
+    def description(self):
+        return self.cur.description
+
+    def close(self):
+        self.cur.close()
+
+
+class SQLiteBackend:
+    """
+    An embedded database file on the till itself. WAL mode lets the pooled
+    connections read while one of them writes, so the UI, exports and
+    reports never wait on a checkout.
+    """
+    name = "sqlite"
+    autoincrement_pk = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    supports_fulltext = False
+    for_update = ""  # BEGIN IMMEDIATE already holds the write lock
+
+    # A local file cannot drop the link, so no error means "reconnect"
+    connection_errors = ()
+    integrity_errors = (sqlite3.IntegrityError,)
+    data_errors = (sqlite3.IntegrityError, sqlite3.DataError)
+
+    def __init__(self, path=config.SQLITE_PATH, pool_size=config.DB_POOL_SIZE, busy_timeout=30.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+
+    def __str__(self):
+        return f"sqlite:///{self.path}"
+
+    # --- Connections ---
+    def create_database(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def connect(self):
+        # Autocommit mode (isolation_level=None); transactions are explicit.
+        # Pooled connections move between threads, one borrower at a time.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def is_alive(self, conn):
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.ProgrammingError:
+            return False
+
+    def cursor(self, conn, buffered=True):
+        # sqlite3 steps through results lazily either way
+        return SQLiteCursor(conn.cursor())
+
+    def begin(self, conn):
+        # Take the write lock up front: a deferred transaction that reads
+        # first can fail with "database is locked" when it later writes
+        conn.execute("BEGIN IMMEDIATE")
+
+    def set_lock_wait(self, conn, seconds):
+        """Cap how long this connection waits on another's write lock (None = busy_timeout)"""
+        seconds = self.busy_timeout if seconds is None else seconds
+        conn.execute(f"PRAGMA busy_timeout = {int(seconds * 1000)}")
+
+    def is_lock_timeout(self, error):
+        return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+    def finish_stream(self, conn):
+        pass
+
+    # --- Dialect ---
+    def upsert(self, table, columns, keys, add=(), replace=()):
+        sets = [f"{c} = {c} + excluded.{c}" for c in add] + [f"{c} = excluded.{c}" for c in replace]
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(sets)}")
+
+    def index_exists(self, cur, table, index):
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                    (table, index))
+        return cur.fetchone() is not None
+
+    def column_exists(self, cur, table, column):
+        # table_xinfo also lists generated columns
+        cur.execute(f"PRAGMA table_xinfo({table})")
+        return any(row[1] == column for row in cur.fetchall())
+
+    def generated_column(self, name, expression):
+        return f"{name} INTEGER GENERATED ALWAYS AS ({expression}) VIRTUAL"
+
+    def hour(self, column):
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    @contextmanager
+    def migration_lock(self, cur):
+        # The database file belongs to this till; there is nobody to race
+        yield
+
+    def explain(self, cur, sql, params, table):
+        cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[3] for row in cur.fetchall()]
+        detail = next((d for d in details if re.search(rf"\b{table}\b", d)), details[0] if details else "")
+        match = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+        key = match.group(1) if match else ("PRIMARY" if "PRIMARY KEY" in detail else "")
+        # Non-integer primary keys are backed by an automatic index
+        if key.startswith("sqlite_autoindex"):
+            key = "PRIMARY"
+        return key, [key] if key else [], detail.split(" ")[0] if detail else None
+
+
+def from_config():
+    """The backend named by config.DB_BACKEND"""
+    if config.DB_BACKEND == "mysql":
+        return MySQLBackend()
+    if config.DB_BACKEND == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown DB_BACKEND {config.DB_BACKEND!r} (expected 'mysql' or 'sqlite')")
@@ -0,0 +1,80 @@
+"""
+Concurrency stress test for InvoiceIdGenerator.
+
+Several processes, each with several threads, draw ids as fast as they
+can. The run fails if any id repeats or if a thread sees ids that do
+not increase. Slot files go to a temporary directory, so the till's
+real high-water marks are untouched.
+
+    python benchmarks/bench_invoice_ids.py [--processes 4] [--threads 4] [--per-thread 250000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_ids import InvoiceIdGenerator
+
+
+def worker(directory, threads, per_thread):
+    """Runs in a child process; returns (ids, seconds, out-of-order count)"""
+    gen = InvoiceIdGenerator(directory=directory)
+    results = [None] * threads
+
+    def draw(index):
+        next_id = gen.next_id
+        results[index] = [next_id() for _ in range(per_thread)]
+
+    pool = [threading.Thread(target=draw, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    gen.close()
+
+    unordered = sum(1 for ids in results for a, b in zip(ids, ids[1:]) if a >= b)
+    return [i for ids in results for i in ids], elapsed, unordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--per-thread", type=int, default=250000)
+    args = parser.parse_args()
+
+    total = args.processes * args.threads * args.per_thread
+    print(f"Drawing {total:,} ids: {args.processes} process(es) x {args.threads} thread(s) x {args.per_thread:,}")
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(worker, directory, args.threads, args.per_thread) for _ in range(args.processes)]
+            results = [f.result() for f in futures]
+        wall = time.perf_counter() - start
+
+    seen = set()
+    duplicates = unordered = 0
+    for ids, elapsed, bad in results:
+        unordered += bad
+        for invoice_id in ids:
+            if invoice_id in seen:
+                duplicates += 1
+            seen.add(invoice_id)
+        print(f"  process: {len(ids):,} ids in {elapsed:.2f}s ({len(ids) / elapsed:,.0f}/s)")
+
+    print(f"Total: {len(seen):,} unique ids in {wall:.2f}s wall ({total / wall:,.0f}/s)")
+    print(f"Duplicates: {duplicates}   Out of order within a thread: {unordered}")
+    print(f"Sample: {min(seen)} .. {max(seen)}")
+    if duplicates or unordered:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Invoice PDF throughput by bill size.
+
+For each line count, renders the same batch of invoices three ways:
+
+    cold       a fresh template per invoice (what every render used to pay)
+    template   one process, the shared template reused
+    batch      render_many across --workers processes
+
+and reports invoices/sec and pages per invoice. PDFs go to a temporary
+directory.
+
+    python benchmarks/bench_invoices.py [--lines 5,30,100,500] [--count 200] [--workers 4]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import invoice
+from invoice import render_invoice, render_many, invoice_path
+
+
+def make_invoices(count, lines):
+    invoices = []
+    for n in range(count):
+        items = [(f"Synthetic Item {n}-{k}", 12.5, k % 5 + 1, 12.5 * (k % 5 + 1)) for k in range(lines)]
+        subtotal = sum(item[3] for item in items)
+        invoices.append({
+            'invoice_id': f"BENCH-{lines}-{n}", 'date': "2024-12-01 10:00", 'items': items,
+            'subtotal': subtotal, 'discount': 0.0, 'tax': round(subtotal * 0.18, 2),
+            'grand_total': round(subtotal * 1.18, 2),
+        })
+    return invoices
+
+
+def page_count(path):
+    with open(path, "rb") as f:
+        return len(re.findall(rb"/Type /Page\b", f.read()))
+
+
+def sequential(invoices, directory, cold):
+    start = time.perf_counter()
+    for inv in invoices:
+        if cold:
+            invoice._template = None
+        render_invoice(inv, invoice_path(inv['invoice_id'], directory))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="5,30,100,500", help="comma-separated line counts")
+    parser.add_argument("--count", type=int, default=200, help="invoices per line count")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"{'lines':>6} {'pages':>6} {'cold/s':>9} {'template/s':>11} {'batch/s':>9}")
+    with tempfile.TemporaryDirectory(prefix="shop_invoices_") as directory:
+        # Load reportlab before anything is timed
+        sequential(make_invoices(1, 1), directory, cold=True)
+        for lines in (int(n) for n in args.lines.split(",")):
+            invoices = make_invoices(args.count, lines)
+            # Cold runs are only there for contrast; a tenth of the batch is enough
+            sample = invoices[:max(1, args.count // 10)]
+            cold = len(sample) / sequential(sample, directory, cold=True)
+            warm = len(invoices) / sequential(invoices, directory, cold=False)
+
+            start = time.perf_counter()
+            rendered, failed = render_many(invoices, directory, workers=args.workers)
+            batch = rendered / (time.perf_counter() - start)
+            if failed:
+                print(f"  {len(failed)} failed, e.g. {failed[0]}")
+
+            pages = page_count(invoice_path(invoices[0]['invoice_id'], directory))
+            print(f"{lines:>6} {pages:>6} {cold:>9.1f} {warm:>11.1f} {batch:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
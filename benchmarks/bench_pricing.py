@@ -0,0 +1,112 @@
+"""
+Bill pricing: one cart at a time vs the vectorized batch path.
+
+Builds random carts (mixed GST categories, line and bill discounts),
+checks that price_cart and price_carts agree to the paisa under every
+rounding setting, then times:
+
+    price_cart         each cart priced on its own, as the till does
+    price_carts        every cart in one numpy pass
+    reconcile          every invoice of a synthetic shop re-checked at the
+                       generator's flat 18% GST
+
+    python benchmarks/bench_pricing.py [--carts 10000] [--scale small]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import SCALES, build_shop
+from cart import Cart
+from pricing import PricingEngine, ROUNDING_MODES, reconcile
+
+RATES = {"Groceries": 5, "Books": 0, "Toys": 12, "Electronics": 28}
+CATEGORIES = list(RATES) + ["Clothing", None]
+TOTAL_KEYS = ('gross', 'line_discount', 'subtotal', 'discount', 'tax', 'round_off', 'grand_total')
+
+
+def make_carts(count, seed):
+    rng = random.Random(seed)
+    carts, discounts = [], []
+    for _ in range(count):
+        cart = Cart()
+        for pid in range(rng.randint(1, 12)):
+            cart.add(pid, f"Item {pid}", round(rng.uniform(0.5, 2500), 2), rng.randint(1, 9), rng.choice(CATEGORIES))
+            if rng.random() < 0.2:
+                cart.set_discount(pid, rng.choice([5, 10, 12.5, 33.33]))
+        carts.append(cart)
+        discounts.append(rng.choice([0, 0, 5, 7.5, 10]))
+    return carts, discounts
+
+
+def check_agreement(carts, discounts):
+    settings = 0
+    for rounding in ROUNDING_MODES:
+        for tax_rounding in ("line", "bill"):
+            for round_total_to in (1, 100):
+                engine = PricingEngine(RATES, 18, rounding, tax_rounding, round_total_to)
+                batch = engine.price_carts(carts, discounts)
+                for n, (cart, discount) in enumerate(zip(carts, discounts)):
+                    bill = engine.price_cart(cart, discount)
+                    for key in TOTAL_KEYS:
+                        if bill[key] != int(batch[key][n]):
+                            raise AssertionError(f"{rounding}/{tax_rounding}/{round_total_to}: cart {n} {key} "
+                                                 f"{bill[key]} != {int(batch[key][n])}")
+                settings += 1
+    return settings
+
+
+def timed(fn, reps=3):
+    best = None
+    for _ in range(reps):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carts", type=int, default=10_000)
+    parser.add_argument("--scale", default="small", choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    carts, discounts = make_carts(args.carts, args.seed)
+    lines = sum(len(cart) for cart in carts)
+    settings = check_agreement(carts[:500], discounts[:500])
+    print(f"price_cart and price_carts agree on 500 carts under {settings} rounding settings")
+
+    engine = PricingEngine(RATES, 18)
+    engine.price_carts(carts[:10], discounts[:10])  # numpy imported before timing
+    one = timed(lambda: [engine.price_cart(cart, d) for cart, d in zip(carts, discounts)])
+    batch = timed(lambda: engine.price_carts(carts, discounts))
+    print(f"{args.carts:,} carts, {lines:,} lines")
+    print(f"price_cart    {one * 1000:9.1f} ms   {args.carts / one:12,.0f} carts/s")
+    print(f"price_carts   {batch * 1000:9.1f} ms   {args.carts / batch:12,.0f} carts/s")
+
+    n_products, n_sales = SCALES[args.scale]
+    with tempfile.TemporaryDirectory() as directory:
+        db, _, _ = build_shop(directory, n_products, n_sales, args.seed)
+        try:
+            report = None
+
+            def run():
+                nonlocal report
+                report = reconcile(db, engine, tax_percent=18)
+            elapsed = timed(run, reps=1)
+        finally:
+            db.close()
+    print(f"reconcile     {elapsed * 1000:9.1f} ms   {len(report):12,} invoices "
+          f"({int((report['line_drift'] != 0).sum())} with line drift, "
+          f"{int((report['tax_drift'] != 0).sum())} with GST drift)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Checkout latency as a function of cart size.
+
+Runs ShopDatabase.process_sale against the configured database, next to
+the old one-INSERT-and-one-UPDATE-per-line loop for comparison. All rows
+it creates are tagged BENCH- and removed afterwards.
+
+    python benchmarks/bench_process_sale.py [--runs 20]
+    SHOP_DB_BACKEND=sqlite SHOP_DB_PATH=/tmp/bench.db python benchmarks/bench_process_sale.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ShopDatabase
+
+CART_SIZES = [1, 5, 10, 30, 60, 120, 250]
+BENCH_CATEGORY = "BENCH"
+
+
+def legacy_process_sale(db, invoice_id, cart_items, financials):
+    """The per-line write path process_sale used before batching"""
+    date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with db.transaction() as cur:
+        cur.execute("""
+            INSERT INTO sales (invoice_id, date, subtotal, tax, discount, grand_total)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (invoice_id, date_str, financials['subtotal'], financials['tax'], financials['discount'], financials['grand_total']))
+        for pid, name, price, qty, total in cart_items:
+            cur.execute("""
+                INSERT INTO sale_items (invoice_id, product_id, product_name, quantity, price, total)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (invoice_id, pid, name, qty, price, total))
+            cur.execute("UPDATE products SET stock = stock - %s WHERE id = %s", (qty, pid))
+    return True
+
+
+def make_products(db, count):
+    with db.transaction() as cur:
+        cur.executemany(
+            "INSERT INTO products (name, category, price, stock, min_stock) VALUES (%s, %s, %s, %s, %s)",
+            [(f"Bench Item {i}", BENCH_CATEGORY, 10.0, 10**9, 0) for i in range(count)])
+    return [row[0] for row in db.query("SELECT id FROM products WHERE category=%s ORDER BY id", (BENCH_CATEGORY,))]
+
+
+def cleanup(db):
+    with db.transaction() as cur:
+        cur.execute("DELETE FROM sale_items WHERE invoice_id LIKE 'BENCH-%'")
+        cur.execute("DELETE FROM sales WHERE invoice_id LIKE 'BENCH-%'")
+        cur.execute("DELETE FROM products WHERE category=%s", (BENCH_CATEGORY,))
+
+
+def run(db, pids, write, size, runs, label):
+    cart = [(pid, f"Bench Item {pid}", 10.0, 1, 10.0) for pid in pids[:size]]
+    subtotal = 10.0 * size
+    financials = {'subtotal': subtotal, 'discount': 0.0, 'tax': 0.0, 'grand_total': subtotal}
+    timings = []
+    for i in range(runs):
+        invoice_id = f"BENCH-{label}-{size}-{i}-{time.time_ns()}"
+        start = time.perf_counter()
+        if not write(invoice_id, None, cart, financials):
+            raise RuntimeError(f"{label} checkout failed for cart size {size}")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="checkouts per cart size")
+    args = parser.parse_args()
+
+    db = ShopDatabase()
+    cleanup(db)
+    pids = make_products(db, max(CART_SIZES))
+    try:
+        print(f"{'lines':>6} {'batched p50':>12} {'batched p95':>12} {'legacy p50':>12} {'legacy p95':>12}   (ms)")
+        for size in CART_SIZES:
+            new_p50, new_p95 = run(db, pids, db.process_sale, size, args.runs, "NEW")
+            old_p50, old_p95 = run(db, pids, lambda inv, cust, cart, fin: legacy_process_sale(db, inv, cart, fin),
+                                   size, args.runs, "OLD")
+            print(f"{size:>6} {new_p50:>12.2f} {new_p95:>12.2f} {old_p50:>12.2f} {old_p95:>12.2f}")
+    finally:
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Sales history from the database vs the columnar snapshot.
+
+Builds a synthetic SQLite shop, copies it into a SalesSnapshot and
+times the ways report code can get at the history:
+
+    db_read_sql        sales JOIN sale_items through the driver into pandas
+    snapshot_all       every line, memory-mapped Arrow table
+    snapshot_month     one month (the other months are never opened)
+    snapshot_90_days   a date range, filter pushed into the scan
+    snapshot_pandas    every line as a DataFrame
+    history_all        every line via history(): sync check, snapshot plus the open month
+    sync_incremental   100 late sales in one closed month, then synced (only that month is rewritten)
+
+    python benchmarks/bench_snapshot.py [--scale medium]
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import SCALES, build_shop, measure
+from snapshot import SalesSnapshot
+
+HISTORY_SQL = """
+    SELECT i.id, i.invoice_id, s.date, i.product_id, i.product_name, i.quantity, i.price, i.total
+    FROM sale_items i JOIN sales s ON s.invoice_id = i.invoice_id
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="medium", choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--reps", type=int, default=5)
+    args = parser.parse_args()
+
+    n_products, n_sales = SCALES[args.scale]
+    with tempfile.TemporaryDirectory() as directory:
+        db, rows, load_seconds = build_shop(directory, n_products, n_sales, args.seed)
+        try:
+            print(f"loaded {n_products:,} products and {n_sales:,} sales in {load_seconds:.1f}s")
+            snapshot = SalesSnapshot(os.path.join(directory, "snapshot"))
+            start = time.perf_counter()
+            months = snapshot.sync(db)
+            print(f"initial sync: {months:,} months in {time.perf_counter() - start:.2f}s")
+
+            months = snapshot.months()
+            latest = max(snapshot.load('sales', columns=["date"]).column("date").to_pylist()).date()
+            reps = [()] * args.reps
+            results = {
+                'db_read_sql': measure(lambda: db.read_sql(HISTORY_SQL), reps),
+                'snapshot_all': measure(lambda: snapshot.load(), reps),
+                'snapshot_month': measure(lambda: snapshot.load(start=f"{months[-1]}-01", end=latest), reps),
+                'snapshot_90_days': measure(
+                    lambda: snapshot.load(start=latest.fromordinal(latest.toordinal() - 89), end=latest), reps),
+                'snapshot_pandas': measure(lambda: snapshot.to_pandas(), reps),
+                'history_all': measure(lambda: snapshot.history(db), reps),
+            }
+
+            invoice_numbers = itertools.count()
+
+            def new_sales_then_sync():
+                sales = []
+                for _ in range(100):
+                    pid, name, price = rows[next(invoice_numbers) % len(rows)]
+                    sales.append({'invoice_id': f"SNAP-{next(invoice_numbers)}", 'date': f"{latest} 12:00:00",
+                                  'items': [(pid, name, float(price), 1, float(price))],
+                                  'financials': {'subtotal': float(price), 'discount': 0, 'tax': 0,
+                                                 'grand_total': float(price)}})
+                db.apply_sales(sales, check_stock=False)
+                snapshot.sync(db)
+            results['sync_incremental'] = measure(new_sales_then_sync, reps)
+        finally:
+            db.close()
+
+    for bench, result in results.items():
+        print(f"{bench:<18} median {result['median_ms']:9.2f} ms   p95 {result['p95_ms']:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
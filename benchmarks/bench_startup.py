@@ -0,0 +1,147 @@
+"""
+Cold start benchmark for the POS executable.
+
+Every measurement runs in a fresh interpreter so nothing is already
+imported or cached in-process:
+
+    import_main        time to `import main` (and which heavy modules it pulled in)
+    db_open_fresh      ShopDatabase() on an empty SQLite file (creates the schema)
+    db_open_current    ShopDatabase() again once the schema is current (no DDL)
+    first_paint        process start to the login window drawn (needs a display)
+
+    python benchmarks/bench_startup.py [--runs 5] [--output bench_startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "reportlab", "pyarrow")
+
+IMPORT_MAIN = """
+import json, sys, time
+start = time.perf_counter()
+import main
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'heavy': sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+OPEN_DB = """
+import json, time
+start = time.perf_counter()
+from database import ShopDatabase
+db = ShopDatabase()
+seconds = time.perf_counter() - start
+db.close()
+print(json.dumps({'seconds': seconds}))
+"""
+
+FIRST_PAINT = """
+import json, time
+start = time.perf_counter()
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError as e:
+    print(json.dumps({'skipped': str(e)}))
+    raise SystemExit
+import main
+main.build_login(root)
+root.update()
+print(json.dumps({'seconds': time.perf_counter() - start}))
+root.destroy()
+"""
+
+
+def run_python(code, env, extra_args=()):
+    proc = subprocess.run([sys.executable, *extra_args, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    return proc
+
+
+def run(code, env):
+    """Run a snippet in a fresh interpreter; its last stdout line is a JSON result"""
+    return json.loads(run_python(code, env).stdout.strip().splitlines()[-1])
+
+
+def top_imports(env, count=10):
+    """Slowest modules (cumulative) from -X importtime for `import main`"""
+    stderr = run_python("import main", env, ("-X", "importtime")).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # One space after the bar, then two more per level of nesting
+        rows.append((int(cumulative_us), name.strip(), (len(name) - len(name.lstrip()) - 1) // 2))
+    rows.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': us / 1000, 'depth': depth} for us, name, depth in rows[:count]]
+
+
+def summarize(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {'median_ms': statistics.median(ms), 'min_ms': ms[0], 'max_ms': ms[-1], 'runs': len(ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="bench_startup.json")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="shop_startup_") as directory:
+        env = dict(os.environ, SHOP_DB_BACKEND="sqlite", PYTHONDONTWRITEBYTECODE="1")
+
+        samples, heavy = [], set()
+        for _ in range(args.runs):
+            result = run(IMPORT_MAIN, env)
+            samples.append(result['seconds'])
+            heavy.update(result['heavy'])
+        results['import_main'] = dict(summarize(samples), heavy_modules=sorted(heavy))
+        results['top_imports'] = top_imports(env)
+
+        fresh, current = [], []
+        for i in range(args.runs):
+            db_env = dict(env, SHOP_DB_PATH=os.path.join(directory, f"shop_{i}.db"))
+            fresh.append(run(OPEN_DB, db_env)['seconds'])
+            current.append(run(OPEN_DB, db_env)['seconds'])
+        results['db_open_fresh'] = summarize(fresh)
+        results['db_open_current'] = summarize(current)
+
+        paint_env = dict(env, SHOP_DB_PATH=os.path.join(directory, "paint.db"))
+        samples = []
+        for _ in range(args.runs):
+            result = run(FIRST_PAINT, paint_env)
+            if 'skipped' in result:
+                results['first_paint'] = {'skipped': result['skipped']}
+                break
+            samples.append(result['seconds'])
+        else:
+            results['first_paint'] = summarize(samples)
+
+    for name, result in results.items():
+        if name == 'top_imports':
+            continue
+        if 'skipped' in result:
+            print(f"{name:<16} skipped ({result['skipped']})")
+        else:
+            print(f"{name:<16} median {result['median_ms']:9.1f} ms   min {result['min_ms']:9.1f} ms")
+    print(f"heavy modules loaded by import main: {', '.join(results['import_main']['heavy_modules']) or 'none'}")
+    print("slowest imports (cumulative):")
+    for row in results['top_imports']:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark suite for the billing and reporting hot paths.
+
+Builds a throwaway SQLite shop per scale from the deterministic
+generator in synthetic.py, then times each hot path headlessly.
+Results are written as JSON so two commits can be compared.
+
+    python benchmarks/bench_suite.py [--scales small,medium] [--output bench_results.json]
+    python benchmarks/bench_suite.py --compare base.json head.json [--threshold 1.25]
+
+Scales (products / sales): small 1k / 5k, medium 10k / 50k, large 50k / 250k.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SQLiteBackend
+from analytics import SalesAnalytics
+from database import ShopDatabase
+from pricing import PricingEngine
+from services import Cart, ReportService
+from stock_watch import forecast
+from synthetic import generate_products, generate_sales, write_product_csv
+
+SCALES = {
+    'small': (1_000, 5_000),
+    'medium': (10_000, 50_000),
+    'large': (50_000, 250_000),
+}
+LOAD_BATCH = 1000
+NOISE_FLOOR_MS = 0.05  # Differences below this are never called regressions
+
+
+def stats(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'min_ms': timings[0],
+    }
+
+
+def measure(fn, args_list, warmup=1):
+    """Time fn(*args) once per entry of args_list (after `warmup` untimed calls)"""
+    for args in args_list[:warmup]:
+        fn(*args)
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return stats(timings)
+
+
+def build_shop(directory, n_products, n_sales, seed):
+    db = ShopDatabase(SQLiteBackend(os.path.join(directory, "shop.db")))
+    start = time.perf_counter()
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO products (name, category, price, stock, min_stock) VALUES (%s, %s, %s, %s, %s)",
+                        generate_products(n_products, seed))
+    rows = db.query("SELECT id, name, price FROM products ORDER BY id")
+
+    batch = []
+    for sale in generate_sales(rows, n_sales, seed=seed + 1):
+        batch.append(sale)
+        if len(batch) == LOAD_BATCH:
+            db.apply_sales(batch, check_stock=False)
+            batch = []
+    if batch:
+        db.apply_sales(batch, check_stock=False)
+
+    # History was loaded without stock checks; give every product room for the checkout runs
+    with db.transaction() as cur:
+        cur.execute("UPDATE products SET stock = 1000000000")
+    return db, rows, time.perf_counter() - start
+
+
+def run_scale(name, n_products, n_sales, seed, quick):
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db, rows, load_seconds = build_shop(directory, n_products, n_sales, seed)
+        print(f"[{name}] loaded {n_products:,} products and {n_sales:,} sales in {load_seconds:.1f}s")
+        reps = 5 if quick else 20
+
+        try:
+            # Search: short fragments of real names, like a cashier types
+            queries = [(rng.choice(rows)[1][:rng.randint(2, 6)],) for _ in range(reps * 5)]
+            catalog = db.get_catalog()
+            results['catalog_search'] = measure(catalog.search, queries)
+            results['search_products'] = measure(db.search_products, queries[:reps])
+
+            # Checkout: typical 1-5 line baskets through the full write path
+            invoice_numbers = itertools.count()
+
+            def checkout():
+                items = []
+                for pid, pname, price in rng.sample(rows, rng.randint(1, 5)):
+                    items.append((pid, pname, float(price), 1, float(price)))
+                subtotal = sum(item[4] for item in items)
+                financials = {'subtotal': subtotal, 'discount': 0, 'tax': 0, 'grand_total': subtotal}
+                if not db.process_sale(f"BENCH-{name}-{next(invoice_numbers)}", None, items, financials):
+                    raise RuntimeError("checkout failed")
+            results['process_sale'] = measure(checkout, [()] * (reps * 2))
+
+            # Wholesale bill: 500 lines, totals refreshed after every scan as the till
+            # does, then priced in full with the bill discount as at checkout
+            wholesale = rows[:500]
+            engine = PricingEngine()
+
+            def ring_up():
+                cart = Cart()
+                for pid, pname, price in wholesale:
+                    cart.add(pid, pname, price, 2)
+                    engine.cart_totals(cart, 0, 18)
+                engine.price_cart(cart, 5, 18)
+                cart.items
+            results['cart_500_lines'] = measure(ring_up, [()] * reps)
+
+            reports = ReportService(db)
+            results['sales_summary'] = measure(reports.sales_summary, [()] * reps)
+            results['top_items'] = measure(reports.top_products, [()] * reps)
+            analytics = SalesAnalytics(db)
+            results['sales_heatmap'] = measure(analytics.heatmap, [()] * reps)
+            results['sales_trend'] = measure(analytics.rolling, [()] * reps)
+            results['compare_year'] = measure(lambda: analytics.compare(against="year"), [()] * reps)
+            results['category_revenue'] = measure(analytics.category_revenue, [()] * reps)
+            results['reorder_forecast'] = measure(lambda: forecast(db), [()] * reps)
+            results['get_sales_data'] = measure(db.get_sales_data, [()] * max(3, reps // 4))
+
+            from importer import import_products
+            csv_path = os.path.join(directory, "import.csv")
+            write_product_csv(csv_path, max(1000, n_products // 10), seed + 2)
+            results['import_csv'] = measure(lambda: import_products(db, csv_path), [()] * 3)
+
+            try:
+                from invoice import render_invoice
+            except ImportError:
+                print(f"[{name}] reportlab not installed; skipping generate_pdf")
+            else:
+                invoices = db.get_invoices("2024-12-01", "2024-12-31")[:reps]
+                path = os.path.join(directory, "invoice.pdf")
+                results['generate_pdf'] = measure(lambda inv: render_invoice(inv, path),
+                                                  [(inv,) for inv in invoices])
+        finally:
+            db.close()
+
+    for bench, result in results.items():
+        print(f"[{name}] {bench:<16} median {result['median_ms']:9.3f} ms   p95 {result['p95_ms']:9.3f} ms")
+    return {'products': n_products, 'sales': n_sales, 'load_seconds': load_seconds, 'results': results}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(base_path, head_path, threshold):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"base {base['meta'].get('commit') or base_path}  vs  head {head['meta'].get('commit') or head_path}")
+    print(f"{'benchmark':<28} {'base ms':>10} {'head ms':>10} {'ratio':>7}")
+    regressions = 0
+    for scale, scale_result in head['scales'].items():
+        for bench, result in scale_result['results'].items():
+            old = base['scales'].get(scale, {}).get('results', {}).get(bench)
+            if old is None:
+                print(f"{scale + '/' + bench:<28} {'-':>10} {result['median_ms']:>10.3f}     new")
+                continue
+            ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            flag = ""
+            if ratio > threshold and result['median_ms'] - old['median_ms'] > NOISE_FLOOR_MS:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif ratio < 1 / threshold:
+                flag = "  faster"
+            print(f"{scale + '/' + bench:<28} {old['median_ms']:>10.3f} {result['median_ms']:>10.3f} "
+                  f"{ratio:>7.2f}{flag}")
+    if regressions:
+        print(f"{regressions} regression(s) over {threshold:.2f}x")
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="small,medium", help=f"comma-separated: {', '.join(SCALES)}")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+        return
+
+    commit, dirty = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+            'seed': args.seed,
+        },
+        'scales': {},
+    }
+    for name in args.scales.split(","):
+        n_products, n_sales = SCALES[name.strip()]
+        report['scales'][name] = run_scale(name, n_products, n_sales, args.seed, args.quick)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Load test for the HTTP API: many concurrent clients ringing up sales.
+
+Each client keeps one HTTP/1.1 connection open and sends checkouts of
+1-5 random products back to back. Latency is reported as p50/p90/p99/max
+per endpoint.
+
+    python benchmarks/load_test_api.py --url http://127.0.0.1:8080 [--clients 200] [--requests 20]
+    python benchmarks/load_test_api.py --spawn [--clients 200] [--products 2000]
+
+--spawn seeds a throwaway SQLite database, starts api.py against it on
+a free port and stops it afterwards, so no server is needed.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class Client:
+    def __init__(self, host, port, auth):
+        self.host = host
+        self.port = port
+        self.auth = auth
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nAuthorization: {self.auth}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+async def run_client(host, port, auth, pids, requests, rng, latencies, statuses):
+    client = Client(host, port, auth)
+    try:
+        for _ in range(requests):
+            items = [{'id': pid, 'qty': rng.randint(1, 3)} for pid in rng.sample(pids, rng.randint(1, 5))]
+            start = time.perf_counter()
+            try:
+                status, _ = await client.request("POST", "/checkout", {'items': items, 'tax_percent': 18})
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                status = type(e).__name__
+                client.close()
+                client = Client(host, port, auth)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        client.close()
+
+
+async def load(host, port, auth, clients, requests, seed):
+    probe = Client(host, port, auth)
+    status, products = await probe.request("GET", "/products")
+    probe.close()
+    if status != 200 or not products:
+        raise SystemExit(f"Could not list products (HTTP {status}); seed some first or use --spawn")
+    pids = [p['id'] for p in products]
+
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(host, port, auth, pids, requests, random.Random(seed + i), latencies, statuses)
+        for i in range(clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{clients} clients x {requests} checkouts in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f} checkouts/s)")
+    print(f"checkout latency (ms): p50 {percentile(latencies, 50):.1f}  p90 {percentile(latencies, 90):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}  max {latencies[-1]:.1f}")
+    print(f"responses: {', '.join(f'{k}: {v}' for k, v in sorted(statuses.items(), key=str))}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(directory, products, pool_size):
+    from backends import SQLiteBackend
+    from database import ShopDatabase
+
+    path = os.path.join(directory, "shop.db")
+    db = ShopDatabase(SQLiteBackend(path))
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO products (name, category, price, stock, min_stock) VALUES (%s, %s, %s, %s, %s)",
+                        [(f"Load Item {i}", f"Category {i % 20}", 10 + i % 90, 10**9, 0) for i in range(products)])
+    db.close()
+
+    port = free_port()
+    env = dict(os.environ, SHOP_DB_BACKEND="sqlite", SHOP_DB_PATH=path, SHOP_DB_POOL_SIZE=str(pool_size),
+               SHOP_TILL_ID="99")
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "api.py"), "--port", str(port), "--no-invoices"],
+                            cwd=directory, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("API server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--spawn", action="store_true", help="start a throwaway SQLite-backed server")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="checkouts per client")
+    parser.add_argument("--products", type=int, default=2000, help="products seeded with --spawn")
+    parser.add_argument("--pool-size", type=int, default=8, help="server connection pool with --spawn")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    auth = "Basic " + base64.b64encode(f"{args.user}:{args.password}".encode()).decode()
+    if not args.spawn:
+        url = urlsplit(args.url)
+        asyncio.run(load(url.hostname, url.port or 80, auth, args.clients, args.requests, args.seed))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        proc, port = spawn_server(directory, args.products, args.pool_size)
+        try:
+            asyncio.run(load("127.0.0.1", port, auth, args.clients, args.requests, args.seed))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
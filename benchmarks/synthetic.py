@@ -0,0 +1,109 @@
+"""
+Deterministic synthetic shop data for benchmarks.
+
+The same seed always gives the same catalog and the same sales history,
+so timings from different commits are comparable. Product popularity
+follows a Zipf law (a few items sell all the time, most rarely), basket
+sizes are mostly small with a long tail, and sales cluster in the
+evening and at weekends.
+"""
+import bisect
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+
+CATEGORIES = ["Crackers", "Sparklers", "Rockets", "Lamps", "Sweets", "Clothing", "Toys", "Decor",
+              "Gifts", "Rangoli", "Candles", "Puja", "Lights", "Kids", "Snacks", "Stationery"]
+WORDS = ["Red", "Gold", "Mega", "Mini", "Star", "Royal", "Classic", "Deluxe", "Magic", "Silver",
+         "Bright", "Festival", "Family", "Super", "Happy", "Color", "Sky", "Thunder", "Flower", "Moon"]
+NOUNS = ["Chakra", "Anaar", "Bomb", "Rocket", "Diya", "Box", "Pack", "Set", "Kurta", "Candle",
+         "Lantern", "Garland", "Toran", "Sparkler", "Laddoo", "Barfi", "Kit", "Bundle", "Lamp", "Wheel"]
+
+# Relative sales by hour of day (shops open 9-22) and by weekday (Mon..Sun)
+HOUR_WEIGHTS = {9: 2, 10: 3, 11: 4, 12: 4, 13: 3, 14: 3, 15: 4, 16: 5, 17: 7, 18: 9, 19: 10, 20: 9, 21: 6, 22: 3}
+WEEKDAY_WEIGHTS = [5, 5, 5, 6, 8, 10, 10]
+
+
+def generate_products(n, seed=1):
+    """[(name, category, price, stock, min_stock)]; names are unique"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(NOUNS)} {i:06d}"
+        price = round(min(5000.0, math.exp(rng.gauss(4.2, 1.0))), 2)
+        products.append((name, rng.choice(CATEGORIES), price, rng.randint(50, 5000), rng.choice([5, 10, 20, 50])))
+    return products
+
+
+class ZipfPicker:
+    """Picks indexes 0..n-1 with P(k) proportional to 1 / (k + 1) ** s, in O(log n)"""
+
+    def __init__(self, n, s=1.1, rng=None):
+        self.rng = rng or random.Random()
+        self.cumulative = list(itertools.accumulate(1.0 / (k + 1) ** s for k in range(n)))
+        self.total = self.cumulative[-1]
+
+    def pick(self):
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+
+
+def basket_size(rng):
+    """Mostly 1-4 lines, occasionally a big family order (mean about 3.5)"""
+    if rng.random() < 0.05:
+        return rng.randint(10, 40)
+    return 1 + min(int(rng.expovariate(1 / 1.7)), 12)
+
+
+def generate_sales(products, m, days=180, seed=2, end=None, zipf_s=1.1):
+    """
+    Yield m sales dicts (as accepted by ShopDatabase.apply_sales) spread
+    over the `days` days before `end`, in time order. `products` is a
+    list of (pid, name, price) rows; popularity rank follows list order
+    after a seeded shuffle.
+    """
+    rng = random.Random(seed)
+    ranked = list(products)
+    rng.shuffle(ranked)
+    picker = ZipfPicker(len(ranked), zipf_s, rng)
+    end = end or datetime(2024, 12, 31, 23, 0)
+    start = end - timedelta(days=days)
+
+    # Pre-draw timestamps so sales come out in order
+    hours = list(HOUR_WEIGHTS)
+    hour_weights = list(HOUR_WEIGHTS.values())
+    day_list = [start + timedelta(days=d) for d in range(days)]
+    day_weights = [WEEKDAY_WEIGHTS[d.weekday()] for d in day_list]
+    stamps = sorted(
+        day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+        for day, hour in zip(rng.choices(day_list, day_weights, k=m), rng.choices(hours, hour_weights, k=m))
+    )
+
+    for i, stamp in enumerate(stamps):
+        lines = {}
+        for _ in range(basket_size(rng)):
+            pid, name, price = ranked[picker.pick()]
+            qty = 1 if rng.random() < 0.7 else rng.randint(2, 5)
+            if pid in lines:
+                qty += lines[pid][3]
+            lines[pid] = (pid, name, float(price), qty, round(float(price) * qty, 2))
+        items = list(lines.values())
+        subtotal = round(sum(item[4] for item in items), 2)
+        discount = round(subtotal * rng.choice([0, 0, 0, 5, 10]) / 100, 2)
+        tax = round((subtotal - discount) * 0.18, 2)
+        yield {
+            'invoice_id': f"SYN-{stamp:%Y%m%d%H%M%S}-{i:07d}",
+            'date': stamp.strftime("%Y-%m-%d %H:%M:%S"),
+            'items': items,
+            'financials': {'subtotal': subtotal, 'discount': discount, 'tax': tax,
+                           'grand_total': round(subtotal - discount + tax, 2)},
+        }
+
+
+def write_product_csv(path, n, seed=3):
+    """A product import file like a shop would upload"""
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "category", "price", "stock", "min_stock"])
+        writer.writerows(generate_products(n, seed))
@@ -0,0 +1,171 @@
+"""
+The bill being rung up at a till.
+
+Money is kept in integer minor units (paise) so a cart of hundreds of
+lines adds up to the cent, and every change updates running totals
+instead of re-summing the lines. One line per product: scanning the
+same product again raises that line's quantity. Lines carry their
+product category and any line discount; a pricer from pricing.py works
+out each line's discount and GST, and only the line that changed is
+priced again.
+"""
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+# What a pricer returns for one line, all in paise; the cart keeps a running sum of each
+FIGURES = ("gross", "line_discount", "net", "tax", "weighted")
+
+
+def to_minor(amount):
+    """Rupees (float, str or Decimal) -> integer paise, rounded half up"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """Integer paise -> Decimal rupees with two places"""
+    return (Decimal(minor) / 100).quantize(CENT)
+
+
+def to_basis_points(percent):
+    """A percentage (float, str or Decimal) -> integer hundredths of a percent, e.g. 2.5 -> 250"""
+    return int((Decimal(str(percent)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def gross_only(line):
+    # Until a pricer is set: no line discount and no GST
+    gross = line.price * line.qty
+    return gross, 0, gross, 0, 0
+
+
+class CartLine:
+    __slots__ = ("pid", "name", "price", "qty", "category", "discount", "figures")
+
+    def __init__(self, pid, name, price, qty, category=None):
+        self.pid = pid
+        self.name = name
+        self.price = price  # paise
+        self.qty = qty
+        self.category = category
+        self.discount = 0   # basis points off this line
+        self.figures = (0, 0, 0, 0, 0)  # as last priced, in FIGURES order
+
+    @property
+    def total(self):
+        return self.price * self.qty
+
+    def as_item(self):
+        """(pid, name, price, qty, total) as process_sale and the journal expect"""
+        return (self.pid, self.name, float(from_minor(self.price)), self.qty, float(from_minor(self.total)))
+
+
+class Cart:
+    """
+    Lines keyed by product id, in the order they were first added. `id`
+    names the cart's stock reservations and is renewed whenever the cart
+    is emptied. Changed product ids are collected for the display (see
+    take_changes), so a redraw only touches the lines that moved.
+
+    `totals` holds the running sum of every line's FIGURES. A change
+    re-prices just that line and applies the difference, so adding the
+    500th line costs the same as adding the first.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.lines = {}          # pid -> CartLine
+        self.totals = dict.fromkeys(FIGURES, 0)
+        self.pricer = gross_only
+        self.pricer_key = None
+        self.changed = None      # None = redraw everything, else a set of pids
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def items(self):
+        """The lines as (pid, name, price, qty, total) tuples"""
+        return [line.as_item() for line in self.lines.values()]
+
+    def line(self, pid):
+        return self.lines.get(pid)
+
+    def _touch(self, pid):
+        if self.changed is not None:
+            self.changed.add(pid)
+
+    def _reprice(self, line, figures):
+        for name, old, new in zip(FIGURES, line.figures, figures):
+            self.totals[name] += new - old
+        line.figures = figures
+
+    def set_pricer(self, pricer, key):
+        """
+        Price lines with `pricer` (line -> FIGURES). The whole cart is
+        priced again only when `key` differs from the current pricer's.
+        """
+        if key == self.pricer_key:
+            return
+        self.pricer, self.pricer_key = pricer, key
+        for line in self.lines.values():
+            self._reprice(line, pricer(line))
+
+    # --- Changes ---
+    def add(self, pid, name, price, qty, category=None):
+        """Add qty of a product; an existing line keeps its price and grows"""
+        line = self.lines.get(pid)
+        if line is None:
+            line = self.lines[pid] = CartLine(pid, name, to_minor(price), 0, category)
+        line.qty += qty
+        self._reprice(line, self.pricer(line))
+        self._touch(pid)
+
+    def set_quantity(self, pid, qty):
+        """Set a line's quantity; zero or less removes it"""
+        line = self.lines.get(pid)
+        if line is None:
+            return
+        if qty <= 0:
+            self.remove(pid)
+            return
+        line.qty = qty
+        self._reprice(line, self.pricer(line))
+        self._touch(pid)
+
+    def set_discount(self, pid, percent):
+        """Discount one line by a percentage (0 removes it)"""
+        line = self.lines.get(pid)
+        if line is not None:
+            line.discount = to_basis_points(percent)
+            self._reprice(line, self.pricer(line))
+            self._touch(pid)
+
+    def remove(self, pid):
+        line = self.lines.pop(pid, None)
+        if line is not None:
+            self._reprice(line, (0, 0, 0, 0, 0))
+            self._touch(pid)
+
+    def clear(self):
+        self.id = uuid.uuid4().hex
+        self.lines = {}
+        self.totals = dict.fromkeys(FIGURES, 0)
+        self.changed = None
+
+    def take_changes(self):
+        """Product ids changed since the last call, or None if the whole cart must be redrawn"""
+        changed, self.changed = self.changed, set()
+        return changed
+
+    # --- Totals ---
+    def quantity_of(self, pid):
+        line = self.lines.get(pid)
+        return line.qty if line else 0
+
+    def demand(self):
+        """Total quantity per product"""
+        return {pid: line.qty for pid, line in self.lines.items()}
+
+    def subtotal(self):
+        """Exact subtotal (before any discount) as Decimal rupees"""
+        return from_minor(self.totals['gross'])
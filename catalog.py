@@ -0,0 +1,186 @@
+"""In-memory product catalog used by the POS search box."""
+import threading
+
+# Rows are kept in the same shape as `SELECT * FROM products`:
+# (id, name, category, price, stock, min_stock)
+GRAM_SIZE = 3
+
+
+def _haystack(row):
+    # NUL separators stop a query from matching across two fields
+    return f"{row[1]}\x00{row[2]}\x00{row[0]}".lower()
+
+
+def _at_risk(row):
+    # Same test as the products.is_low_stock column
+    return row[5] is not None and row[4] <= row[5]
+
+
+def _grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class CatalogIndex:
+    def __init__(self, listeners=None):
+        self.rows = {}        # pid -> product row
+        self.haystacks = {}   # pid -> lowercased searchable text
+        self.grams = {}       # trigram -> set of pids
+        self.row_versions = {}  # pid -> products.version the cached row was read at
+        self.version = 0        # bumped on every change, so views know to redraw
+        self.at_risk = set()    # pids with stock <= min_stock
+        # fn(pid, row, at_risk), called on every change to a product that is or was at risk
+        self.listeners = listeners if listeners is not None else []
+        self.lock = threading.RLock()  # Writes may come from worker threads
+
+        # Last search, reused when the query grows one keystroke at a time
+        self._last_query = None
+        self._last_version = -1
+        self._last_results = []
+
+    def load(self, rows, versions=None):
+        """Build the index from a full product listing (and {pid: row version})"""
+        with self.lock:
+            before = set(self.at_risk)
+            self.rows.clear()
+            self.haystacks.clear()
+            self.grams.clear()
+            self.at_risk.clear()
+            self.row_versions = dict(versions or {})
+            for row in rows:
+                self._add(row)
+            self.version += 1
+            for pid in before | self.at_risk:
+                self._notify(pid, pid in before)
+
+    def _add(self, row):
+        pid = row[0]
+        text = _haystack(row)
+        self.rows[pid] = row
+        self.haystacks[pid] = text
+        if _at_risk(row):
+            self.at_risk.add(pid)
+        for gram in _grams(text):
+            self.grams.setdefault(gram, set()).add(pid)
+
+    def _remove(self, pid):
+        text = self.haystacks.pop(pid, None)
+        self.rows.pop(pid, None)
+        self.row_versions.pop(pid, None)
+        self.at_risk.discard(pid)
+        if text is None:
+            return
+        for gram in _grams(text):
+            pids = self.grams.get(gram)
+            if pids is not None:
+                pids.discard(pid)
+                if not pids:
+                    del self.grams[gram]
+
+    def _notify(self, pid, was):
+        """Tell listeners about a change to `pid` if it is or was at risk (`was`: whether it was before)"""
+        now = pid in self.at_risk
+        if not (was or now):
+            return
+        for listener in self.listeners:
+            try:
+                listener(pid, self.rows.get(pid), now)
+            except Exception as e:
+                print(f"Error in stock listener: {e}")
+
+    def add_listener(self, fn):
+        with self.lock:
+            self.listeners.append(fn)
+
+    # --- Sync hooks (called by ShopDatabase after each write) ---
+    def upsert(self, row, version=None):
+        """Store a row read from the database; a read older than the cached row is ignored"""
+        with self.lock:
+            if version is not None and version < self.row_versions.get(row[0], -1):
+                return False
+            was = row[0] in self.at_risk
+            self._remove(row[0])
+            self._add(row)
+            if version is not None:
+                self.row_versions[row[0]] = version
+            self.version += 1
+            self._notify(row[0], was)
+            return True
+
+    def remove(self, pid):
+        with self.lock:
+            was = pid in self.at_risk
+            self._remove(pid)
+            self.version += 1
+            self._notify(pid, was)
+
+    def adjust_stock(self, pid, delta):
+        # Stock is not part of the searchable text, so the grams stay valid
+        with self.lock:
+            row = self.rows.get(pid)
+            if row is not None:
+                was = pid in self.at_risk
+                row = self.rows[pid] = row[:4] + (row[4] + delta,) + row[5:]
+                if _at_risk(row):
+                    self.at_risk.add(pid)
+                else:
+                    self.at_risk.discard(pid)
+                self.version += 1
+                self._notify(pid, was)
+
+    # --- Queries ---
+    def versions(self):
+        with self.lock:
+            return dict(self.row_versions)
+
+    def row_version(self, pid):
+        with self.lock:
+            return self.row_versions.get(pid, -1)
+
+    def get(self, pid):
+        return self.rows.get(pid)
+
+    def low_stock(self):
+        """At-risk rows, lowest stock first, without scanning the catalog"""
+        with self.lock:
+            return sorted((self.rows[pid] for pid in self.at_risk), key=lambda row: (row[4], row[0]))
+
+    def all(self):
+        with self.lock:
+            return [self.rows[pid] for pid in sorted(self.rows)]
+
+    def search(self, query):
+        """Return rows whose name, category or id contains the query"""
+        q = query.strip().lower()
+        if not q:
+            return self.all()
+        with self.lock:
+            return self._search(q)
+
+    def _search(self, q):
+        if (self._last_query and self._last_query in q
+                and self._last_version == self.version):
+            # Anything matching the longer query also matched the shorter one
+            candidates = self._last_results
+        elif len(q) >= GRAM_SIZE:
+            sets = []
+            for gram in _grams(q):
+                pids = self.grams.get(gram)
+                if not pids:
+                    sets = None
+                    break
+                sets.append(pids)
+            if sets:
+                sets.sort(key=len)
+                candidates = set(sets[0]).intersection(*sets[1:])
+            else:
+                candidates = ()
+        else:
+            candidates = self.haystacks
+
+        haystacks = self.haystacks
+        results = sorted(pid for pid in candidates if q in haystacks[pid])
+
+        self._last_query = q
+        self._last_version = self.version
+        self._last_results = results
+        return [self.rows[pid] for pid in results]
@@ -0,0 +1,71 @@
+import os
+
+# --- Shop Configuration ---
+SHOP_NAME = "Swapnil"
+SHOP_ADDRESS = "Sangli, Maharashtra, India"
+CURRENCY = "₹"
+
+# --- Pricing & GST ---
+# A bill pays the one tax rate typed at the till (0 by default). Typing GST
+# instead charges each line its category's rate from GST_RATES (matched
+# ignoring case); categories not listed pay DEFAULT_GST_RATE.
+GST_RATES = {}                 # e.g. {"Groceries": 5, "Books": 0, "Electronics": 18}
+DEFAULT_GST_RATE = 0
+PRICE_ROUNDING = "half_up"     # half_up, half_even, down or up; used for discounts, GST and round-off
+TAX_ROUNDING = "line"          # "line": GST rounded on each line; "bill": once on the bill's total
+ROUND_TOTAL_TO = 1             # Grand total rounded to a multiple of this many paise (100 = whole rupees)
+
+# --- Database ---
+# "mysql" for a shared server, "sqlite" for an embedded database on the till
+# itself. Every setting can be overridden from the environment (SHOP_DB_*).
+DB_BACKEND = os.environ.get("SHOP_DB_BACKEND", "mysql")
+DB_POOL_SIZE = int(os.environ.get("SHOP_DB_POOL_SIZE", "5"))
+
+MYSQL_HOST = os.environ.get("SHOP_DB_HOST", "localhost")
+MYSQL_PORT = int(os.environ.get("SHOP_DB_PORT", "3306"))
+MYSQL_USER = os.environ.get("SHOP_DB_USER", "root")
+MYSQL_PASSWORD = os.environ.get("SHOP_DB_PASSWORD", "852456")
+MYSQL_DATABASE = os.environ.get("SHOP_DB_NAME", "shop_inventory")
+
+SQLITE_PATH = os.environ.get("SHOP_DB_PATH", os.path.join("data", "shop_inventory.db"))
+
+# --- Product Cache & Stock Reservations ---
+CATALOG_REFRESH_SECONDS = 5.0   # How often a till picks up product changes made elsewhere
+RESERVATION_TTL = 600           # Seconds a cart keeps its stock on hold without activity
+RESERVATION_PURGE_SECONDS = 60  # Expired holds are deleted at most this often
+RESERVATION_WAIT = 1.0          # Seconds a hold may wait for a connection or a row lock (no retries)
+RESERVATION_RETRY_SECONDS = 30  # After a failed hold, tills go by cached stock this long
+RESERVATION_SOLD_TTL = 86400    # A journaled sale keeps its holds until the sync consumes them
+
+# --- Invoices ---
+# Give every till a different TILL_ID (0-99); it is part of each invoice id
+TILL_ID = int(os.environ.get("SHOP_TILL_ID", "1"))
+INVOICE_ID_DIR = os.path.join("data", "invoice_ids")
+INVOICE_DIR = "invoices"
+INVOICE_WORKERS = 2       # Background PDF render processes
+INVOICE_MAX_ATTEMPTS = 5  # Renders are retried with backoff before a job is marked failed
+
+# --- Sale Journal ---
+JOURNAL_DIR = "journal"
+JOURNAL_BATCH_SIZE = 200          # Sales written to the database per transaction
+JOURNAL_SYNC_INTERVAL = 1.0       # Seconds between sync attempts while idle
+JOURNAL_MAX_BACKOFF = 30.0        # Retry delay cap while the database is unreachable
+JOURNAL_COMPACT_BYTES = 1 << 20   # Truncate the journal once it is fully synced and this big
+
+# --- Reports ---
+REPORT_WORKERS = 2        # Report queries run on these threads, never on the Tk thread
+REPORT_CACHE_SIZE = 100   # Cached report results kept (by report and parameters)
+
+# --- Stock Alerts ---
+VELOCITY_DAYS = 28         # Sales history used for each product's units-per-day rate
+REORDER_LEAD_DAYS = 7      # Days a supplier takes to deliver
+REORDER_COVER_DAYS = 14    # Days of sales a reorder should cover once it arrives
+STOCK_ALERTS_KEPT = 200    # Unread low-stock alerts kept for the UI
+
+# --- Analytics Snapshot ---
+SNAPSHOT_DIR = os.path.join("data", "snapshot")  # Monthly Arrow files of closed months (Basket Trend, manage.py snapshot)
+
+# --- Diagnostics ---
+METRICS_ENABLED = os.environ.get("SHOP_METRICS", "1") != "0"   # Query timing and spans
+SLOW_QUERY_MS = float(os.environ.get("SHOP_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.path.join("data", "slow_queries.log")
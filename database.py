@@ -1,108 +1,194 @@
-import mysql.connector
 import hashlib
-import pandas as pd
-from datetime import datetime
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from catalog import CatalogIndex
+from config import (CATALOG_REFRESH_SECONDS, RESERVATION_TTL, RESERVATION_PURGE_SECONDS, RESERVATION_WAIT,
+                    RESERVATION_SOLD_TTL)
+from pool import ConnectionPool
+import backends
+import metrics
+import migrations
+
+# Product rows are always (id, name, category, price, stock, min_stock); the
+# table also has a generated is_low_stock column that callers never see
+PRODUCT_COLUMNS = "id, name, category, price, stock, min_stock"
+FULLTEXT_OPERATORS = '+-<>()~*"@'
+
+def date_filter(column, start=None, end=None):
+    """WHERE clause and params for an inclusive YYYY-MM-DD range on a DATE/DATETIME column"""
+    where, params = [], []
+    if start:
+        where.append(f"{column} >= %s")
+        params.append(str(start)[:10])
+    if end:
+        where.append(f"{column} < %s")
+        params.append((date.fromisoformat(str(end)[:10]) + timedelta(days=1)).isoformat())
+    return (f"WHERE {' AND '.join(where)}" if where else ""), params
+
+class InsufficientStockError(Exception):
+    """Raised when a cart line exceeds the stock on hand less other carts' holds"""
+
+class LockTimeout(Exception):
+    """Raised when a transaction gives up waiting on another connection's lock (see transaction)"""
 
 class ShopDatabase:
-    def __init__(self):
-        # Configuration for MySQL connection
-        self.host = "localhost"
-        self.user = "root"
-        self.password = "852456"
-        self.database = "shop_inventory"
-        
-        self.conn = None
-        self.cursor = None
-        
-        self.init_database()
+    def __init__(self, backend=None):
+        # MySQL or embedded SQLite, as chosen in config.py
+        self.backend = backend or backends.from_config()
+
+        self.pool = None
+        self.catalog = None
+        self.catalog_lock = threading.Lock()
+        self.stock_listeners = []  # Told when a product goes low on stock or recovers (see stock_watch.py)
+        self.refresh_stop = threading.Event()
+        self.refresh_thread = None
+        self.last_purge = 0.0
+        # Stamped on every write; cached reports compare against them (see report_engine.py)
+        self.change_counter = itertools.count(1)
+        self.data_versions = {'sales': 0, 'products': 0}
+
+        # Fast path: a single read on the first connection. When the schema
+        # is already current there is no CREATE DATABASE, lock or DDL at start-up.
         self.connect()
-        self.create_tables()
-        self.seed_default_user()
+        if not self.schema_is_current():
+            self.init_database()
+            self.migrate()
+            self.seed_default_user()
 
     def init_database(self):
-        """Connect to server and create database if it doesn't exist"""
+        """Create the database (or its directory) if it doesn't exist"""
         try:
-            temp_conn = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password
-            )
-            temp_cursor = temp_conn.cursor()
-            temp_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
-            temp_conn.close()
-        except mysql.connector.Error as err:
+            self.backend.create_database()
+        except Exception as err:
             print(f"Error initializing database: {err}")
 
+    def open_connection(self):
+        return self.backend.connect()
+
     def connect(self):
-        """Connect to the specific database"""
+        """Set up the connection pool (connections are opened on demand)"""
+        self.pool = ConnectionPool(
+            self.open_connection,
+            self.backend.is_alive,
+            size=self.backend.pool_size
+        )
+        metrics.registry.register_gauges("shop_db_pool", self.pool.metrics)
+
+    def _cursor(self, conn, buffered=True):
+        # Every statement is timed and fingerprinted (see metrics.py)
+        return metrics.registry.wrap_cursor(self.backend.cursor(conn, buffered))
+
+    @contextmanager
+    def cursor(self):
+        """Borrow a pooled connection and a cursor for reads"""
+        with self.pool.connection(broken_on=self.backend.connection_errors) as conn:
+            cur = self._cursor(conn)
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def transaction(self, retries=None, timeout=None, lock_wait=None):
+        """
+        Borrow a pooled connection and run the block as one transaction.
+        With lock_wait, a lock held by another connection is waited on for
+        at most that many seconds, then LockTimeout is raised.
+        """
+        with self.pool.connection(self.backend.connection_errors, retries, timeout) as conn:
+            if lock_wait is not None:
+                self.backend.set_lock_wait(conn, lock_wait)
+            cur = None
+            try:
+                self.backend.begin(conn)
+                cur = self._cursor(conn)
+                yield cur
+                conn.commit()
+            except Exception as e:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                if lock_wait is not None and self.backend.is_lock_timeout(e):
+                    raise LockTimeout(str(e)) from e
+                raise
+            finally:
+                if cur is not None:
+                    cur.close()
+                if lock_wait is not None:
+                    try:
+                        self.backend.set_lock_wait(conn, None)
+                    except Exception:
+                        pass  # A broken connection is dropped by the pool
+
+    @contextmanager
+    def connection(self):
+        with self.pool.connection(broken_on=self.backend.connection_errors) as conn:
+            yield conn
+
+    def query(self, sql, params=(), one=False):
+        """Run a read; retried once on a fresh connection if the link dropped"""
+        for attempt in range(2):
+            try:
+                with self.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchone() if one else cur.fetchall()
+            except self.backend.connection_errors:
+                if attempt:
+                    raise
+
+    def stream(self, sql, params=(), chunk_rows=5000):
+        """
+        Yield (columns, rows) chunks from an unbuffered cursor, so large
+        results are never held in memory at once. The first chunk is always
+        yielded, even when empty, so callers can see the column names.
+        """
+        with self.pool.connection(broken_on=self.backend.connection_errors) as conn:
+            cur = self._cursor(conn, buffered=False)
+            try:
+                cur.execute(sql, params)
+                columns = [d[0] for d in cur.description]
+                first = True
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    if rows or first:
+                        yield columns, rows
+                    first = False
+                    if len(rows) < chunk_rows:
+                        break
+            finally:
+                self.backend.finish_stream(conn)
+                cur.close()
+
+    def schema_is_current(self):
+        # Opened outside the pool so a missing database fails once instead
+        # of going through the pool's reconnect backoff
         try:
-            self.conn = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            # FIX: buffered=True prevents 'Unread result found' errors
-            # when previous queries don't consume all rows.
-            self.cursor = self.conn.cursor(buffered=True)
-        except mysql.connector.Error as err:
-            print(f"Error connecting: {err}")
-
-    def create_tables(self):
-        # Users Table (Using VARCHAR for Unique keys in MySQL)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role VARCHAR(50) NOT NULL
-            )
-        """)
-        
-        # Products Table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                category VARCHAR(100) NOT NULL,
-                price DECIMAL(10, 2) NOT NULL,
-                stock INT NOT NULL,
-                min_stock INT DEFAULT 10
-            )
-        """)
-        
-        # Sales Table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sales (
-                invoice_id VARCHAR(255) PRIMARY KEY,
-                date DATETIME NOT NULL,
-                subtotal DECIMAL(10, 2) NOT NULL,
-                tax DECIMAL(10, 2) NOT NULL,
-                discount DECIMAL(10, 2) NOT NULL,
-                grand_total DECIMAL(10, 2) NOT NULL
-            )
-        """)
-        
-        # Sale Items Table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sale_items (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                invoice_id VARCHAR(255),
-                product_id INT,
-                product_name VARCHAR(255),
-                quantity INT,
-                price DECIMAL(10, 2),
-                total DECIMAL(10, 2),
-                FOREIGN KEY(invoice_id) REFERENCES sales(invoice_id)
-            )
-        """)
-        self.conn.commit()
+            conn = self.open_connection()
+        except Exception:
+            return False
+        cur = self._cursor(conn)
+        try:
+            current = migrations.schema_is_current(cur)
+        finally:
+            cur.close()
+        self.pool.adopt(conn)
+        return current
+
+    def pool_metrics(self):
+        return self.pool.metrics()
+
+    def migrate(self):
+        """Create or upgrade the schema; a no-op when it is already current"""
+        return migrations.migrate(self)
 
     def seed_default_user(self):
         # Create a default admin if no users exist
         # FIX: Use LIMIT 1 to ensure we don't leave unread rows if multiple users exist
-        self.cursor.execute("SELECT * FROM users LIMIT 1")
-        if not self.cursor.fetchone():
+        if not self.query("SELECT * FROM users LIMIT 1", one=True):
             self.add_user("admin", "admin123", "Admin")
 
     def hash_password(self, password):
@@ -111,95 +197,583 @@ class ShopDatabase:
     def add_user(self, username, password, role):
         try:
             hashed_pw = self.hash_password(password)
-            # MySQL uses %s as placeholder
-            self.cursor.execute("INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
-                                (username, hashed_pw, role))
-            self.conn.commit()
+            with self.transaction() as cur:
+                cur.execute("INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+                            (username, hashed_pw, role))
             return True
-        except mysql.connector.IntegrityError:
+        except self.backend.integrity_errors:
             return False
 
     def verify_login(self, username, password):
         hashed_pw = self.hash_password(password)
-        self.cursor.execute("SELECT role FROM users WHERE username=%s AND password=%s", (username, hashed_pw))
-        result = self.cursor.fetchone()
+        result = self.query("SELECT role FROM users WHERE username=%s AND password=%s", (username, hashed_pw), one=True)
         return result[0] if result else None
 
     # --- Inventory Operations ---
+    def mark_changed(self, *tables):
+        for table in tables:
+            self.data_versions[table] = next(self.change_counter)
+
     def add_product(self, name, category, price, stock, min_stock):
         sql = "INSERT INTO products (name, category, price, stock, min_stock) VALUES (%s, %s, %s, %s, %s)"
         val = (name, category, price, stock, min_stock)
-        self.cursor.execute(sql, val)
-        self.conn.commit()
+        with self.transaction() as cur:
+            cur.execute(sql, val)
+            pid = cur.lastrowid
+        self.mark_changed("products")
+        self.sync_catalog(pid)
+        return pid
 
     def update_product(self, pid, name, category, price, stock, min_stock):
         sql = """
-            UPDATE products SET name=%s, category=%s, price=%s, stock=%s, min_stock=%s WHERE id=%s
+            UPDATE products SET name=%s, category=%s, price=%s, stock=%s, min_stock=%s, version = version + 1
+            WHERE id=%s
         """
         val = (name, category, price, stock, min_stock, pid)
-        self.cursor.execute(sql, val)
-        self.conn.commit()
+        with self.transaction() as cur:
+            cur.execute(sql, val)
+        self.mark_changed("products")
+        self.sync_catalog(pid)
 
     def delete_product(self, pid):
-        self.cursor.execute("DELETE FROM products WHERE id=%s", (pid,))
-        self.conn.commit()
+        with self.transaction() as cur:
+            cur.execute("DELETE FROM products WHERE id=%s", (pid,))
+        self.mark_changed("products")
+        if self.catalog is not None:
+            self.catalog.remove(int(pid))
+
+    def bulk_upsert_products(self, chunks):
+        """
+        Upsert product DataFrames (name, category, price, stock, min_stock[, id])
+        in one transaction, matching on id if given else name + category.
+        Each chunk costs one multi-row upsert for known products and one
+        multi-row INSERT for new ones.
+        Returns (inserted, updated).
+        """
+        def key(name, category):
+            # Mirror MySQL's case-insensitive, trailing-space-insensitive matching
+            return (name.strip().casefold(), category.strip().casefold())
+
+        import pandas as pd
+
+        upsert = self.backend.upsert("products", ("id", "name", "category", "price", "stock", "min_stock", "version"),
+                                     keys=("id",), add=("version",),
+                                     replace=("name", "category", "price", "stock", "min_stock"))
+        inserted = updated = 0
+        with self.transaction() as cur:
+            cur.execute("SELECT id, name, category FROM products")
+            ids = {key(name, category): pid for pid, name, category in cur.fetchall()}
+            known = set(ids.values())
+
+            for df in chunks:
+                if df.empty:
+                    continue
+                pids = df['id'].tolist() if 'id' in df else [None] * len(df)
+                # Later rows for the same product win, as they would row by row
+                with_id, new = {}, {}
+                for pid, name, category, price, stock, min_stock in zip(
+                        pids, df['name'].tolist(), df['category'].tolist(), df['price'].tolist(),
+                        df['stock'].tolist(), df['min_stock'].tolist()):
+                    pid = None if pd.isna(pid) else int(pid)
+                    if pid is None:
+                        pid = ids.get(key(name, category))
+                    row = (name, category, price, stock, min_stock)
+                    if pid is None:
+                        new[key(name, category)] = row
+                    else:
+                        with_id[pid] = (pid,) + row + (1,)
+
+                if with_id:
+                    cur.executemany(upsert, list(with_id.values()))
+                    fresh = with_id.keys() - known
+                    inserted += len(fresh)
+                    updated += len(with_id) - len(fresh)
+                    known.update(fresh)
+                    for pid, name, category, *rest in with_id.values():
+                        ids[key(name, category)] = pid
+
+                if new:
+                    cur.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+                    last_id = cur.fetchone()[0]
+                    cur.executemany("""
+                        INSERT INTO products (name, category, price, stock, min_stock)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, list(new.values()))
+                    inserted += len(new)
+                    # Learn the new ids so later chunks update instead of duplicating
+                    cur.execute("SELECT id, name, category FROM products WHERE id > %s", (last_id,))
+                    for pid, name, category in cur.fetchall():
+                        ids[key(name, category)] = pid
+                        known.add(pid)
+
+        self.mark_changed("products")
+        if self.catalog is not None:
+            self.refresh_catalog()
+        return inserted, updated
 
     def get_all_products(self):
-        self.cursor.execute("SELECT * FROM products")
-        return self.cursor.fetchall()
-    
+        return self.query(f"SELECT {PRODUCT_COLUMNS} FROM products")
+
     def search_products(self, query):
-        # Search by ID or Name
-        search_term = f"%{query}%"
-        self.cursor.execute("SELECT * FROM products WHERE name LIKE %s OR id LIKE %s", (search_term, search_term))
-        return self.cursor.fetchall()
+        # Search by ID or by text in name/category: a substring match on every
+        # backend. The FULLTEXT index (word prefixes) is tried first when the
+        # backend has one and every word is long enough for it; only if it
+        # finds nothing (e.g. "uice" for Juice) is the LIKE scan run.
+        query = query.strip()
+        words = [w for w in (w.strip(FULLTEXT_OPERATORS) for w in query.split()) if w]
+        if not query:
+            return self.get_all_products()
+        pid = int(query) if query.isdigit() else -1
+        if self.backend.supports_fulltext and words and all(len(w) >= 3 for w in words):
+            terms = " ".join(f"+{w}*" for w in words)
+            rows = self.query(f"""
+                SELECT {PRODUCT_COLUMNS} FROM products
+                WHERE MATCH(name, category) AGAINST (%s IN BOOLEAN MODE) OR id = %s
+            """, (terms, pid))
+            if rows:
+                return rows
+        term = f"%{query}%"
+        return self.query(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE name LIKE %s OR category LIKE %s OR id = %s",
+                          (term, term, pid))
 
     def get_product_by_id(self, pid):
-        self.cursor.execute("SELECT * FROM products WHERE id=%s", (pid,))
-        return self.cursor.fetchone()
+        return self.query(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id=%s", (pid,), one=True)
+
+    # --- Catalog Index ---
+    def get_catalog(self):
+        """Load the in-memory search index once, on first use"""
+        with self.catalog_lock:
+            if self.catalog is None:
+                # Listeners outlive a reload_catalog()
+                catalog = CatalogIndex(self.stock_listeners)
+                rows = self.query(f"SELECT {PRODUCT_COLUMNS}, version FROM products")
+                catalog.load([row[:6] for row in rows], {row[0]: row[6] for row in rows})
+                self.catalog = catalog
+            return self.catalog
+
+    def reload_catalog(self):
+        with self.catalog_lock:
+            self.catalog = None
+        return self.get_catalog()
+
+    def sync_catalog(self, pid):
+        # Re-read the row so the index holds exactly what the table holds
+        if self.catalog is None:
+            return
+        row = self.query(f"SELECT {PRODUCT_COLUMNS}, version FROM products WHERE id=%s", (pid,), one=True)
+        if row:
+            self.catalog.upsert(row[:6], version=row[6])
+        else:
+            self.catalog.remove(int(pid))
+
+    def refresh_catalog(self):
+        """
+        Pick up product changes made elsewhere (other tills, the API, imports).
+        Only ids and row versions are scanned; rows whose version moved past
+        the cached one are re-read. Returns the number of rows changed.
+        """
+        if self.catalog is None:
+            self.get_catalog()
+            return 0
+        catalog = self.catalog
+        current = dict(self.query("SELECT id, version FROM products"))
+        known = catalog.versions()
+        changed = [pid for pid, version in current.items() if version > known.get(pid, -1)]
+        gone = [pid for pid in known if pid not in current]
+        for pid in gone:
+            catalog.remove(pid)
+        for i in range(0, len(changed), 500):
+            chunk = changed[i:i + 500]
+            for row in self.query(f"SELECT {PRODUCT_COLUMNS}, version FROM products "
+                                  f"WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk):
+                catalog.upsert(row[:6], version=row[6])
+        if changed or gone:
+            # Another till's sale also bumps the row version, so its sales may have moved too
+            self.mark_changed("products", "sales")
+        return len(changed) + len(gone)
+
+    def start_catalog_refresh(self, interval=CATALOG_REFRESH_SECONDS):
+        """Refresh the catalog in the background; views redraw when catalog.version moves"""
+        if self.refresh_thread is not None:
+            return
+
+        def run():
+            while not self.refresh_stop.wait(interval):
+                try:
+                    self.refresh_catalog()
+                except Exception as e:
+                    print(f"Error refreshing catalog: {e}")
+
+        self.refresh_stop.clear()
+        self.refresh_thread = threading.Thread(target=run, daemon=True)
+        self.refresh_thread.start()
+
+    # --- Stock Reservations ---
+    def _set_hold(self, cur, cart_id, pid, quantity, now, ttl):
+        """
+        Lock a product row and set this cart's hold on it to `quantity`,
+        if stock on hand less every other live hold covers it.
+        Returns (ok, available, row), `available` being what this cart may hold.
+        """
+        # Lock the product row so two tills cannot both claim the last units
+        cur.execute(f"SELECT {PRODUCT_COLUMNS}, version FROM products WHERE id=%s{self.backend.for_update}",
+                    (pid,))
+        row = cur.fetchone()
+        if row is None:
+            return False, 0, None
+        cur.execute("""
+            SELECT cart_id, quantity FROM stock_reservations
+            WHERE product_id=%s AND expires_at > %s
+        """, (pid, now))
+        holds = dict(cur.fetchall())
+        mine = holds.pop(cart_id, 0)
+        available = int(row[4]) - sum(holds.values())
+
+        ok = quantity <= mine or quantity <= available
+        if ok and quantity > 0:
+            cur.execute(self.backend.upsert(
+                "stock_reservations", ("cart_id", "product_id", "quantity", "expires_at"),
+                keys=("cart_id", "product_id"), replace=("quantity", "expires_at")
+            ), (cart_id, pid, quantity, now + ttl))
+        elif ok:
+            cur.execute("DELETE FROM stock_reservations WHERE cart_id=%s AND product_id=%s", (cart_id, pid))
+        return ok, available, row
+
+    def _refresh_rows(self, rows):
+        # A row at the cached version does not yet include this till's journaled sales
+        if self.catalog is not None:
+            for row in rows:
+                if row is not None and row[6] > self.catalog.row_version(row[0]):
+                    self.catalog.upsert(row[:6], version=row[6])
+
+    def reserve_stock(self, cart_id, pid, quantity, ttl=RESERVATION_TTL):
+        """
+        Set a cart's hold on a product to `quantity` units (its total over all
+        lines) and extend the cart's holds by `ttl` seconds. The hold is only
+        raised if stock on hand less every other live hold covers it.
+        Returns (ok, available), `available` being what this cart may hold.
+        The product row is re-read under lock; the catalog takes it only if
+        its version moved. Holds are called from the UI thread, so a
+        connection is tried once, and neither it nor another till's lock on
+        the row is waited for longer than RESERVATION_WAIT seconds (then
+        LockTimeout); callers fall back to cached stock.
+        """
+        now = time.time()
+        with self.transaction(retries=0, timeout=RESERVATION_WAIT, lock_wait=RESERVATION_WAIT) as cur:
+            ok, available, row = self._set_hold(cur, cart_id, pid, quantity, now, ttl)
+            if row is not None:
+                cur.execute("UPDATE stock_reservations SET expires_at=%s WHERE cart_id=%s", (now + ttl, cart_id))
+
+            if now - self.last_purge > RESERVATION_PURGE_SECONDS:
+                self.last_purge = now
+                cur.execute("DELETE FROM stock_reservations WHERE expires_at < %s", (now,))
+
+        self._refresh_rows([row])
+        return ok, available
+
+    def hold_cart(self, cart_id, demand, ttl=RESERVATION_SOLD_TTL):
+        """
+        Confirm a cart's holds cover a sale about to be journaled: every
+        product in `demand` ({pid: qty}) is held for this cart, topped up
+        where a hold lapsed and stock allows, all in one transaction. The
+        holds then last `ttl` seconds, until the journal sync turns them
+        into the stock decrement (see apply_sales). Raises
+        InsufficientStockError, holding nothing new, if any line is short.
+        """
+        now = time.time()
+        rows, short = [], []
+        with self.transaction(retries=0, timeout=RESERVATION_WAIT, lock_wait=RESERVATION_WAIT) as cur:
+            # Rows are locked in id order so two tills checking out cannot deadlock
+            for pid in sorted(demand):
+                ok, available, row = self._set_hold(cur, cart_id, pid, demand[pid], now, ttl)
+                rows.append(row)
+                if not ok:
+                    short.append(f"{row[1] if row else pid} (only {max(available, 0)} available)")
+            if short:
+                raise InsufficientStockError(f"Insufficient stock for {', '.join(short)}")
+            cur.execute("UPDATE stock_reservations SET expires_at=%s WHERE cart_id=%s", (now + ttl, cart_id))
+        self._refresh_rows(rows)
+
+    def release_stock(self, cart_id):
+        """Drop every hold a cart has (cart cleared or abandoned)"""
+        with self.transaction(retries=0, timeout=RESERVATION_WAIT, lock_wait=RESERVATION_WAIT) as cur:
+            cur.execute("DELETE FROM stock_reservations WHERE cart_id=%s", (cart_id,))
 
     # --- Billing Operations ---
-    def process_sale(self, invoice_id, customer_data, cart_items, financials):
+    def process_sale(self, invoice_id, customer_data, cart_items, financials, cart_id=None):
         try:
-            date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Insert Sale Record
-            self.cursor.execute("""
-                INSERT INTO sales (invoice_id, date, subtotal, tax, discount, grand_total)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (invoice_id, date_str, financials['subtotal'], financials['tax'], financials['discount'], financials['grand_total']))
-
-            # Insert Sale Items and Update Stock
-            for item in cart_items:
-                # item: [pid, name, price, qty, total]
-                pid, name, price, qty, total = item
-                
-                self.cursor.execute("""
-                    INSERT INTO sale_items (invoice_id, product_id, product_name, quantity, price, total)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (invoice_id, pid, name, qty, price, total))
+            sale = {
+                'invoice_id': invoice_id,
+                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'items': cart_items,
+                'financials': financials,
+                'cart_id': cart_id,
+            }
+            if not self.apply_sales([sale]):
+                raise ValueError(f"Invoice {invoice_id} is already recorded")
 
-                # Deduct Stock
-                self.cursor.execute("UPDATE products SET stock = stock - %s WHERE id = %s", (qty, pid))
-            
-            self.conn.commit()
+            if self.catalog is not None:
+                for item in cart_items:
+                    self.catalog.adjust_stock(int(item[0]), -item[3])
             return True
         except Exception as e:
             print(f"Error processing sale: {e}")
-            self.conn.rollback()
             return False
 
+    def apply_sales(self, sales, check_stock=True):
+        """
+        Write a batch of sales (dicts with invoice_id, date, items, financials;
+        item: [pid, name, price, qty, total]) in one transaction.
+
+        Sales whose invoice_id is already recorded are skipped, so replaying
+        a batch is harmless. With check_stock, a line that exceeds the stock
+        on hand aborts the whole batch with InsufficientStockError. Journal
+        replays pass False because those sales have already happened; their
+        units were held for them at checkout (see hold_cart).
+        A sale may carry the 'cart_id' that reserved its stock: the guard then
+        leaves that cart's holds out of the count and the holds are consumed
+        in the same transaction.
+        Returns the invoice ids written.
+        """
+        with self.transaction() as cur:
+            ids = list(dict.fromkeys(sale['invoice_id'] for sale in sales))
+            cur.execute(f"SELECT invoice_id FROM sales WHERE invoice_id IN ({', '.join(['%s'] * len(ids))})", ids)
+            seen = {row[0] for row in cur.fetchall()}
+            fresh = []
+            for sale in sales:
+                if sale['invoice_id'] not in seen:
+                    seen.add(sale['invoice_id'])
+                    fresh.append(sale)
+            if not fresh:
+                return []
+
+            # Merge lines for the same product so each row is decremented once
+            demand = {}
+            days = {}   # day -> [revenue, tax, discount, invoices]
+            hours = {}  # (day, hour) -> [revenue, invoices]
+            lines = {}  # (pid, day) -> [name, qty, revenue] for the per-product rollup
+            for sale in fresh:
+                day = sale['date'][:10]
+                money = sale['financials']
+                totals = days.setdefault(day, [0, 0, 0, 0])
+                totals[0] += money['grand_total']
+                totals[1] += money['tax']
+                totals[2] += money['discount']
+                totals[3] += 1
+                slot = hours.setdefault((day, int(sale['date'][11:13] or 0)), [0, 0])
+                slot[0] += money['grand_total']
+                slot[1] += 1
+                for pid, name, price, qty, total in sale['items']:
+                    demand[pid] = demand.get(pid, 0) + qty
+                    line = lines.setdefault((pid, day), [name, 0, 0])
+                    line[1] += qty
+                    line[2] += total
+
+            # Deduct Stock: one set-based UPDATE for the whole batch. The
+            # guard (stock less what other carts hold >= qty) means a short
+            # row is simply not updated, so a rowcount mismatch is an
+            # oversell and aborts the sale.
+            case = " ".join(["WHEN %s THEN %s"] * len(demand))
+            pairs = [v for pid, qty in demand.items() for v in (pid, qty)]
+            ids = ", ".join(["%s"] * len(demand))
+            carts = list(dict.fromkeys(sale['cart_id'] for sale in fresh if sale.get('cart_id')))
+            own = f"AND r.cart_id NOT IN ({', '.join(['%s'] * len(carts))})" if carts else ""
+            if demand and check_stock:
+                cur.execute(f"""
+                    UPDATE products SET stock = stock - (CASE id {case} END), version = version + 1
+                    WHERE id IN ({ids}) AND stock - COALESCE((
+                        SELECT SUM(r.quantity) FROM stock_reservations r
+                        WHERE r.product_id = products.id AND r.expires_at > %s {own}
+                    ), 0) >= (CASE id {case} END)
+                """, pairs + list(demand) + [time.time()] + carts + pairs)
+                if cur.rowcount != len(demand):
+                    raise InsufficientStockError(
+                        f"Insufficient stock for invoice {', '.join(sale['invoice_id'] for sale in fresh)}")
+            elif demand:
+                cur.execute(f"""
+                    UPDATE products SET stock = stock - (CASE id {case} END), version = version + 1
+                    WHERE id IN ({ids})
+                """, pairs + list(demand))
+            if carts:
+                # The sold carts' holds turn into the stock decrement above
+                cur.execute(f"DELETE FROM stock_reservations WHERE cart_id IN ({', '.join(['%s'] * len(carts))})",
+                            carts)
+
+            # Insert Sale Records
+            cur.executemany("""
+                INSERT INTO sales (invoice_id, date, subtotal, tax, discount, grand_total)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(sale['invoice_id'], sale['date'], sale['financials']['subtotal'], sale['financials']['tax'],
+                   sale['financials']['discount'], sale['financials']['grand_total']) for sale in fresh])
+
+            # Roll the sales into their days' totals
+            cur.executemany(self.backend.upsert(
+                "daily_sales", ("day", "revenue", "tax", "discount", "invoices"), keys=("day",),
+                add=("revenue", "tax", "discount", "invoices")
+            ), [(day, *totals) for day, totals in days.items()])
+            cur.executemany(self.backend.upsert(
+                "hourly_sales", ("day", "hour", "revenue", "invoices"), keys=("day", "hour"),
+                add=("revenue", "invoices")
+            ), [(day, hour, *totals) for (day, hour), totals in hours.items()])
+            if lines:
+                cur.executemany(self.backend.upsert(
+                    "product_daily_sales", ("product_id", "day", "product_name", "quantity", "revenue"),
+                    keys=("product_id", "day"), add=("quantity", "revenue"), replace=("product_name",)
+                ), [(pid, day, name, qty, revenue) for (pid, day), (name, qty, revenue) in lines.items()])
+
+            # Insert Sale Items (mysql.connector folds this into one multi-row INSERT)
+            if lines:
+                cur.executemany("""
+                    INSERT INTO sale_items (invoice_id, product_id, product_name, quantity, price, total)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [(sale['invoice_id'], pid, name, qty, price, total)
+                      for sale in fresh for pid, name, price, qty, total in sale['items']])
+
+        self.mark_changed("sales", "products")
+        return [sale['invoice_id'] for sale in fresh]
+
+    def get_invoices(self, start=None, end=None):
+        """
+        Rebuild invoice dicts (as queued for PDF rendering) from sales and
+        sale_items, optionally limited to a date range (inclusive, YYYY-MM-DD).
+        """
+        clause, params = date_filter("s.date", start, end)
+
+        invoices = {}
+        for invoice_id, sold_at, subtotal, tax, discount, grand_total in self.query(f"""
+            SELECT s.invoice_id, s.date, s.subtotal, s.tax, s.discount, s.grand_total
+            FROM sales s {clause} ORDER BY s.date
+        """, params):
+            invoices[invoice_id] = {
+                'invoice_id': invoice_id,
+                'date': sold_at.strftime('%Y-%m-%d %H:%M'),
+                'items': [],
+                'subtotal': float(subtotal),
+                'discount': float(discount),
+                'tax': float(tax),
+                'grand_total': float(grand_total),
+            }
+
+        for invoice_id, name, price, qty, total in self.query(f"""
+            SELECT i.invoice_id, i.product_name, i.price, i.quantity, i.total
+            FROM sale_items i JOIN sales s ON s.invoice_id = i.invoice_id
+            {clause} ORDER BY i.id
+        """, params):
+            invoices[invoice_id]['items'].append((name, float(price), qty, float(total)))
+        return list(invoices.values())
+
+    # --- Rollups ---
+    def rebuild_daily_sales(self, start=None, end=None):
+        """Recompute daily_sales from the sales table, for all days or a date range"""
+        clause, params = date_filter("date", start, end)
+        day_clause, day_params = date_filter("day", start, end)
+
+        with self.transaction() as cur:
+            cur.execute(f"DELETE FROM daily_sales {day_clause}", day_params)
+            cur.execute(f"""
+                INSERT INTO daily_sales (day, revenue, tax, discount, invoices)
+                SELECT DATE(date), SUM(grand_total), SUM(tax), SUM(discount), COUNT(*)
+                FROM sales {clause}
+                GROUP BY DATE(date)
+            """, params)
+            days = cur.rowcount
+        self.mark_changed("sales")
+        return days
+
+    def rebuild_product_daily_sales(self, start=None, end=None):
+        """Recompute product_daily_sales from sale_items, for all days or a date range"""
+        clause, params = date_filter("s.date", start, end)
+        day_clause, day_params = date_filter("day", start, end)
+
+        with self.transaction() as cur:
+            cur.execute(f"DELETE FROM product_daily_sales {day_clause}", day_params)
+            cur.execute(f"""
+                INSERT INTO product_daily_sales (product_id, day, product_name, quantity, revenue)
+                SELECT i.product_id, DATE(s.date), MAX(i.product_name), SUM(i.quantity), SUM(i.total)
+                FROM sale_items i JOIN sales s ON s.invoice_id = i.invoice_id
+                {clause}
+                GROUP BY i.product_id, DATE(s.date)
+            """, params)
+            rows = cur.rowcount
+        self.mark_changed("sales")
+        return rows
+
+    def rebuild_hourly_sales(self, start=None, end=None):
+        """Recompute hourly_sales from the sales table, for all days or a date range"""
+        clause, params = date_filter("date", start, end)
+        day_clause, day_params = date_filter("day", start, end)
+        hour = self.backend.hour("date")
+
+        with self.transaction() as cur:
+            cur.execute(f"DELETE FROM hourly_sales {day_clause}", day_params)
+            cur.execute(f"""
+                INSERT INTO hourly_sales (day, hour, revenue, invoices)
+                SELECT DATE(date), {hour}, SUM(grand_total), COUNT(*)
+                FROM sales {clause}
+                GROUP BY DATE(date), {hour}
+            """, params)
+            rows = cur.rowcount
+        self.mark_changed("sales")
+        return rows
+
+    def get_top_products(self, n=10, start=None, end=None, by="quantity"):
+        """Top-N products by quantity or revenue over an optional date range, from the rollup"""
+        order = "revenue" if by == "revenue" else "quantity"
+        clause, params = date_filter("day", start, end)
+        return self.query(f"""
+            SELECT product_id, MAX(product_name) AS product_name,
+                   SUM(quantity) AS quantity, SUM(revenue) AS revenue
+            FROM product_daily_sales {clause}
+            GROUP BY product_id
+            ORDER BY {order} DESC
+            LIMIT %s
+        """, params + [int(n)])
+
     # --- Reporting Operations (Pandas) ---
+    def read_sql(self, sql, params=()):
+        # Fetch through a timed cursor, then build the frame as pandas.read_sql
+        # would, so database time and DataFrame time show up separately.
+        # pandas is imported here, on first report, not at start-up.
+        import pandas as pd
+
+        with self.cursor() as cur:
+            cur.execute(sql, params)
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        with metrics.span("dataframe"):
+            return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+    def get_daily_sales(self, start=None, end=None):
+        clause, params = date_filter("day", start, end)
+        return self.read_sql(f"SELECT * FROM daily_sales {clause} ORDER BY day", params)
+
+    def get_hourly_sales(self, start=None, end=None):
+        clause, params = date_filter("day", start, end)
+        return self.read_sql(f"SELECT day, hour, revenue, invoices FROM hourly_sales {clause} ORDER BY day, hour",
+                             params)
+
+    def get_category_sales(self, start=None, end=None):
+        """Revenue and units per product category over a date range, from the per-product rollup"""
+        clause, params = date_filter("r.day", start, end)
+        return self.read_sql(f"""
+            SELECT COALESCE(p.category, 'Uncategorised') AS category,
+                   SUM(r.quantity) AS quantity, SUM(r.revenue) AS revenue
+            FROM product_daily_sales r LEFT JOIN products p ON p.id = r.product_id
+            {clause}
+            GROUP BY COALESCE(p.category, 'Uncategorised')
+            ORDER BY revenue DESC
+        """, params)
+
     def get_sales_data(self):
-        # Pandas read_sql works with mysql connector connections
-        return pd.read_sql("SELECT * FROM sales", self.conn)
+        return self.read_sql("SELECT * FROM sales")
 
     def get_item_sales_data(self):
-        return pd.read_sql("SELECT * FROM sale_items", self.conn)
+        return self.read_sql("SELECT * FROM sale_items")
 
     def get_inventory_data(self):
-        return pd.read_sql("SELECT * FROM products", self.conn)
-    
+        return self.read_sql(f"SELECT {PRODUCT_COLUMNS} FROM products")
+
     def close(self):
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        self.refresh_stop.set()
+        if self.pool:
+            self.pool.close_all()
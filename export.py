@@ -0,0 +1,148 @@
+import csv
+import gzip
+import threading
+from database import date_filter
+
+EXPORT_CHUNK_ROWS = 5000
+
+SALES_SQL = """
+    SELECT s.invoice_id, s.date, s.subtotal, s.tax, s.discount, s.grand_total
+    FROM sales s {where}
+    ORDER BY s.date, s.invoice_id
+"""
+
+ITEMS_SQL = """
+    SELECT s.invoice_id, s.date, i.product_id, i.product_name, i.quantity, i.price, i.total,
+           s.subtotal, s.tax, s.discount, s.grand_total
+    FROM sales s JOIN sale_items i ON i.invoice_id = s.invoice_id {where}
+    ORDER BY s.date, s.invoice_id, i.id
+"""
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class CsvSink:
+    def __init__(self, path, compress=False):
+        if compress:
+            self.file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+
+    def write(self, columns, rows):
+        if columns is not None:
+            self.writer.writerow(columns)
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, columns, rows):
+        pa = self.pa
+        if self.writer is None:
+            cols = list(zip(*rows)) or [[] for _ in columns]
+            arrays = [pa.array(col) for col in cols]
+            # Decimal precision is inferred from the first chunk only; widen it
+            # so larger amounts later in the export still fit the schema
+            arrays = [a.cast(pa.decimal128(18, a.type.scale)) if pa.types.is_decimal(a.type) else a
+                      for a in arrays]
+            table = pa.Table.from_arrays(arrays, names=list(columns))
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        elif rows:
+            schema = self.writer.schema
+            table = pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)], schema=schema)
+        else:
+            return
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_sink(path, fmt=None):
+    """Pick the writer from `fmt` or the file extension (.csv, .csv.gz, .parquet)"""
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv.gz" if path.endswith(".gz") else "csv")
+    if fmt == "parquet":
+        return ParquetSink(path)
+    return CsvSink(path, compress=(fmt == "csv.gz"))
+
+
+def export_sales(db, path, start=None, end=None, include_items=False, fmt=None,
+                 chunk_rows=EXPORT_CHUNK_ROWS, progress=None, cancel=None):
+    """
+    Stream sales (optionally joined with their line items) to disk.
+
+    Rows are read from an unbuffered cursor `chunk_rows` at a time and
+    written straight out, so memory stays flat however long the history.
+    `progress(done, total)` is called after every chunk and `cancel()`
+    is checked between chunks. Returns the number of rows written.
+    """
+    clause, params = date_filter("s.date", start, end)
+    sql = (ITEMS_SQL if include_items else SALES_SQL).format(where=clause)
+    count_sql = (f"SELECT COUNT(*) FROM sales s JOIN sale_items i ON i.invoice_id = s.invoice_id {clause}"
+                 if include_items else f"SELECT COUNT(*) FROM sales s {clause}")
+    total = db.query(count_sql, params, one=True)[0]
+
+    sink = open_sink(path, fmt)
+    done = 0
+    try:
+        header_written = False
+        for columns, rows in db.stream(sql, params, chunk_rows):
+            if cancel and cancel():
+                raise ExportCancelled()
+            # The first chunk carries the header (it may be empty for an empty range)
+            sink.write(None if header_written else columns, rows)
+            header_written = True
+            done += len(rows)
+            if progress:
+                progress(done, total)
+    finally:
+        sink.close()
+    return done
+
+
+class ExportJob(threading.Thread):
+    """Runs export_sales off the Tk thread; the UI polls `done`, `progress` and `error`"""
+
+    def __init__(self, db, path, **options):
+        super().__init__(daemon=True)
+        self.db = db
+        self.path = path
+        self.options = options
+        self.progress = (0, 0)
+        self.rows = 0
+        self.error = None
+        self.done = False
+        self.cancelled = False
+
+    def run(self):
+        try:
+            self.rows = export_sales(self.db, self.path, progress=self._on_progress,
+                                     cancel=lambda: self.cancelled, **self.options)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _on_progress(self, done, total):
+        self.progress = (done, total)
+
+    def cancel(self):
+        self.cancelled = True
@@ -0,0 +1,137 @@
+import os
+import threading
+import pandas as pd
+
+IMPORT_CHUNK_ROWS = 5000
+REQUIRED_COLUMNS = ['name', 'category', 'price', 'stock']
+DEFAULT_MIN_STOCK = 10
+MAX_NAME = 255
+MAX_CATEGORY = 100
+
+
+def validate_chunk(df, first_line):
+    """
+    Split a raw CSV chunk into clean rows and rejects, column-wise.
+
+    Returns (good, rejects). `good` has typed name/category/price/stock/
+    min_stock (+ id when the file has one); `rejects` keeps the original
+    values plus the CSV line number and the reason.
+    """
+    df = df.copy()
+    df['line'] = range(first_line, first_line + len(df))
+
+    name = df['name'].astype('string').str.strip()
+    category = df['category'].astype('string').str.strip()
+    price = pd.to_numeric(df['price'], errors='coerce')
+    stock = pd.to_numeric(df['stock'], errors='coerce')
+    if 'min_stock' in df:
+        min_stock = pd.to_numeric(df['min_stock'], errors='coerce')
+        bad_min = min_stock.notna() & ((min_stock % 1 != 0) | (min_stock < 0))
+        min_stock = min_stock.fillna(DEFAULT_MIN_STOCK)
+    else:
+        min_stock = pd.Series(DEFAULT_MIN_STOCK, index=df.index)
+        bad_min = pd.Series(False, index=df.index)
+    if 'id' in df:
+        pid = pd.to_numeric(df['id'], errors='coerce')
+        bad_id = df['id'].notna() & (pid.isna() | (pid % 1 != 0) | (pid <= 0))
+    else:
+        pid = None
+        bad_id = pd.Series(False, index=df.index)
+
+    # First failing check wins, so each reject carries one clear reason
+    checks = [
+        (name.isna() | (name == ''), "missing name"),
+        (name.str.len() > MAX_NAME, f"name longer than {MAX_NAME} characters"),
+        (category.isna() | (category == ''), "missing category"),
+        (category.str.len() > MAX_CATEGORY, f"category longer than {MAX_CATEGORY} characters"),
+        (price.isna() | (price < 0), "price is not a non-negative number"),
+        (stock.isna() | (stock % 1 != 0) | (stock < 0), "stock is not a non-negative whole number"),
+        (bad_min, "min_stock is not a non-negative whole number"),
+        (bad_id, "id is not a positive whole number"),
+    ]
+    reason = pd.Series(pd.NA, index=df.index, dtype='string')
+    for mask, message in checks:
+        reason = reason.mask(reason.isna() & mask.fillna(False).astype(bool), message)
+
+    ok = reason.isna()
+    good = pd.DataFrame({
+        'name': name[ok],
+        'category': category[ok],
+        'price': price[ok].round(2),
+        'stock': stock[ok].astype('int64'),
+        'min_stock': min_stock[ok].astype('int64'),
+    })
+    if pid is not None:
+        good['id'] = pid[ok].astype('Int64')
+
+    rejects = df[~ok].copy()
+    rejects['reason'] = reason[~ok]
+    return good, rejects
+
+
+def import_products(db, path, chunk_rows=IMPORT_CHUNK_ROWS, reject_path=None, progress=None):
+    """
+    Bulk-import a product CSV (name, category, price, stock[, min_stock][, id]).
+
+    Rows are matched on id when the file provides one, otherwise on
+    name + category, and upserted in multi-row batches inside a single
+    transaction, so a failure leaves the catalog untouched. Invalid rows
+    are skipped and written to a reject report.
+    Returns a dict with inserted/updated/rejected counts and reject_path.
+    """
+    header = pd.read_csv(path, nrows=0)
+    header.columns = [c.strip().lower() for c in header.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in header.columns]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+    if reject_path is None:
+        reject_path = f"{os.path.splitext(path)[0]}.rejects.csv"
+    if os.path.exists(reject_path):
+        os.remove(reject_path)
+
+    result = {'inserted': 0, 'updated': 0, 'rejected': 0, 'reject_path': None}
+
+    def chunks():
+        line = 2  # line 1 is the header
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, skipinitialspace=True):
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            good, rejects = validate_chunk(chunk, line)
+            line += len(chunk)
+            if not rejects.empty:
+                rejects.to_csv(reject_path, mode='a', index=False, header=result['rejected'] == 0)
+                result['rejected'] += len(rejects)
+            if progress:
+                progress(line - 2, result['rejected'])
+            yield good
+
+    inserted, updated = db.bulk_upsert_products(chunks())
+    result['inserted'] = inserted
+    result['updated'] = updated
+    if result['rejected']:
+        result['reject_path'] = reject_path
+    return result
+
+
+class ImportJob(threading.Thread):
+    """Runs import_products off the Tk thread; the UI polls `done`, `progress` and `error`"""
+
+    def __init__(self, db, path):
+        super().__init__(daemon=True)
+        self.db = db
+        self.path = path
+        self.progress = (0, 0)
+        self.result = None
+        self.error = None
+        self.done = False
+
+    def run(self):
+        try:
+            self.result = import_products(self.db, self.path, progress=self._on_progress)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _on_progress(self, rows, rejected):
+        self.progress = (rows, rejected)
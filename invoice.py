@@ -0,0 +1,167 @@
+import os
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import SHOP_NAME, SHOP_ADDRESS, INVOICE_DIR
+from cart import CENT
+
+BATCH_CHUNK = 50  # Invoices per worker task in render_many; keeps pickling and scheduling overhead low
+
+
+def invoice_path(invoice_id, directory=INVOICE_DIR):
+    return os.path.join(directory, f"{invoice_id}.pdf")
+
+
+class InvoiceTemplate:
+    """
+    Page layout, fonts and table style shared by every invoice. Built once
+    per process (see get_template) and reused, so rendering an invoice only
+    lays out its own rows. Long bills flow onto further pages with the
+    header and the table's column titles repeated.
+    """
+
+    COL_WIDTHS = [200, 80, 100, 100]  # Total width: 480
+    TABLE_TOP = 650                   # The table hangs down from here on every page
+
+    def __init__(self):
+        # reportlab is only loaded by whoever renders (the PDF worker processes),
+        # not by the till at start-up
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.platypus import TableStyle
+        from xml.sax.saxutils import escape
+
+        self.pagesize = letter
+        self.style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),      # Header Background
+            ('TEXTCOLOR', (0,0), (-1,0), colors.black),           # Header Text Color
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),                  # Center Align Everything
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),        # Header Font
+            ('BOTTOMPADDING', (0,0), (-1,0), 12),                 # Header Padding
+            ('GRID', (0,0), (-1,-1), 1, colors.black),            # Grid Borders for All Cells
+            ('FONTNAME', (-2,-1), (-1,-1), 'Helvetica-Bold'),     # Bold Grand Total
+            ('BACKGROUND', (-1,-1), (-1,-1), colors.whitesmoke),  # Highlight Grand Total
+        ])
+        self.footer_style = ParagraphStyle("footer", fontName="Helvetica-Oblique", fontSize=10,
+                                           alignment=TA_CENTER, spaceBefore=40)
+        self.footer = escape(f"Thank you for shopping at {SHOP_NAME}! Please Visit Again.")
+
+    def draw_header(self, c, doc):
+        """Runs on every page; the invoice being drawn is doc.invoice"""
+        invoice = doc.invoice
+        c.saveState()
+        c.setFont("Helvetica-Bold", 20)
+        c.drawString(50, 750, SHOP_NAME)
+        c.setFont("Helvetica", 10)
+        c.drawString(50, 735, SHOP_ADDRESS)
+        c.drawString(50, 720, f"Date: {invoice['date']}")
+        c.drawString(50, 705, f"Invoice #: {invoice['invoice_id']}")
+        if doc.page > 1:
+            c.drawRightString(530, 705, f"Page {doc.page} (continued)")
+        c.line(50, 690, 550, 690)
+        c.restoreState()
+
+    def rows(self, invoice):
+        data = [['Item', 'Price', 'Qty', 'Total']]
+        gross = lines = Decimal(0)
+        for name, price, qty, total in invoice['items']:
+            data.append([name, f"{float(price):.2f}", str(qty), f"{float(total):.2f}"])
+            gross += Decimal(str(price)) * qty
+            lines += Decimal(str(total))
+
+        # Add Totals as rows in the table for alignment. Line totals are
+        # after their own discount, so the Discount row is the bill discount
+        # (the stored discount less what the lines already show); Discount
+        # and Round Off only appear when there is one, and the rows always
+        # add up to the Total Amount.
+        tax, grand_total = Decimal(str(invoice['tax'])), Decimal(str(invoice['grand_total']))
+        discount = (Decimal(str(invoice['discount'])) - (gross - lines)).quantize(CENT)
+        round_off = (grand_total - (lines - discount + tax)).quantize(CENT)
+        if discount:
+            data.append(['', '', 'Discount', f"-{discount:.2f}"])
+        data.append(['', '', 'GST', f"+{tax:.2f}"])
+        if round_off:
+            data.append(['', '', 'Round Off', f"{round_off:+.2f}"])
+        data.append(['', '', 'Total Amount', f"{grand_total:.2f}"])
+        return data
+
+    def render(self, invoice, filename):
+        from reportlab.platypus import SimpleDocTemplate, Table, Paragraph
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temp file first so a crash never leaves a half-written PDF
+        tmp_name = f"{filename}.tmp"
+        width, height = self.pagesize
+        doc = SimpleDocTemplate(tmp_name, pagesize=self.pagesize, leftMargin=50, rightMargin=width - 550,
+                                topMargin=height - self.TABLE_TOP, bottomMargin=50,
+                                title=f"Invoice {invoice['invoice_id']}", author=SHOP_NAME)
+        doc.invoice = invoice
+
+        # repeatRows: the column titles start every page the table spills onto
+        table = Table(self.rows(invoice), colWidths=self.COL_WIDTHS, repeatRows=1, hAlign='LEFT')
+        table.setStyle(self.style)
+
+        doc.build([table, Paragraph(self.footer, self.footer_style)],
+                  onFirstPage=self.draw_header, onLaterPages=self.draw_header)
+        os.replace(tmp_name, filename)
+        return filename
+
+
+_template = None
+
+
+def get_template():
+    global _template
+    if _template is None:
+        _template = InvoiceTemplate()
+    return _template
+
+
+def render_invoice(invoice, filename):
+    """
+    Draw one invoice PDF. `invoice` is a plain dict so it can be queued as
+    JSON and shipped to worker processes:
+        {'invoice_id', 'date', 'items': [(name, price, qty, total), ...],
+         'subtotal', 'discount', 'tax', 'grand_total'}
+    """
+    return get_template().render(invoice, filename)
+
+
+def render_batch(invoices, directory=INVOICE_DIR):
+    """Render a list of invoices in this process; returns [(invoice_id, error or None)]"""
+    results = []
+    for invoice in invoices:
+        try:
+            render_invoice(invoice, invoice_path(invoice['invoice_id'], directory))
+            results.append((invoice['invoice_id'], None))
+        except Exception as e:
+            print(f"Error rendering invoice {invoice['invoice_id']}: {e}")
+            results.append((invoice['invoice_id'], str(e)))
+    return results
+
+
+def render_many(invoices, directory=INVOICE_DIR, workers=None, chunk_size=BATCH_CHUNK, progress=None):
+    """
+    Render a large set of invoices (e.g. from ShopDatabase.get_invoices)
+    across a process pool, `chunk_size` per task. Each worker builds the
+    template once and reuses it for every invoice it is given.
+    `progress(rendered, failed, total)` is called as chunks finish.
+    Returns (rendered count, [(invoice_id, error), ...]).
+    """
+    rendered, failed = 0, []
+    chunks = [invoices[i:i + chunk_size] for i in range(0, len(invoices), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_batch, chunk, directory) for chunk in chunks]
+        for future in as_completed(futures):
+            for invoice_id, error in future.result():
+                if error is None:
+                    rendered += 1
+                else:
+                    failed.append((invoice_id, error))
+            if progress:
+                progress(rendered, len(failed), len(invoices))
+    return rendered, failed
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from config import TILL_ID, INVOICE_ID_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SLOTS = 10          # Processes that can issue ids at once on one till
+SEQ_PER_MS = 1000   # Ids per process per millisecond
+RESERVE_MS = 1000   # How far ahead of the clock the persisted high-water mark runs
+
+
+def _try_lock(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class InvoiceIdGenerator:
+    """
+    Unique, time-ordered invoice ids without a database round-trip.
+
+    Ids look like INV-20261018093015123-011042: UTC time to the
+    millisecond, then the till (2 digits), this process's slot (1 digit)
+    and a per-millisecond sequence (3 digits). Every field is fixed width,
+    so ids sort by time as plain strings.
+
+    The slot is claimed with an OS lock on a file under INVOICE_ID_DIR and
+    is freed automatically when the process exits. Before issuing ids for
+    a new second the generator persists a high-water mark one second
+    ahead, and a restarted process never goes below it. That keeps ids
+    unique across crashes and clocks that step backwards.
+    """
+
+    def __init__(self, till_id=TILL_ID, directory=INVOICE_ID_DIR, prefix="INV"):
+        if not 0 <= till_id < 100:
+            raise ValueError(f"TILL_ID must be between 0 and 99, got {till_id}")
+        self.till_id = till_id
+        self.directory = directory
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.lock_file = None
+        self.slot = None
+
+        os.makedirs(directory, exist_ok=True)
+        for slot in range(SLOTS):
+            f = open(os.path.join(directory, f"till-{till_id:02d}-slot-{slot}.lock"), "a+")
+            if _try_lock(f):
+                self.lock_file = f
+                self.slot = slot
+                break
+            f.close()
+        if self.lock_file is None:
+            raise RuntimeError(f"All {SLOTS} invoice id slots for till {till_id} are in use")
+
+        self.hwm_path = os.path.join(directory, f"till-{till_id:02d}-slot-{self.slot}.hwm")
+        try:
+            with open(self.hwm_path) as f:
+                self.reserved = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            self.reserved = 0
+        self.last_ms = self.reserved
+        self.seq = SEQ_PER_MS  # forces a fresh millisecond on the first id
+        self.worker = f"{till_id:02d}{self.slot}"
+        self.second = None
+        self.stamp = None
+
+    def _reserve(self, ms):
+        # Persist before use: nothing at or below the mark is issued after a restart
+        self.reserved = ms + RESERVE_MS
+        tmp = f"{self.hwm_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(self.reserved))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.hwm_path)
+
+    def next_id(self):
+        with self.lock:
+            now = time.time_ns() // 1_000_000
+            if now > self.last_ms:
+                self.last_ms = now
+                self.seq = 0
+            elif self.seq + 1 < SEQ_PER_MS:
+                self.seq += 1
+            else:
+                # Sequence used up (or the clock went back): borrow the next
+                # millisecond rather than wait, so ids stay monotonic
+                self.last_ms += 1
+                self.seq = 0
+            ms = self.last_ms
+            if ms >= self.reserved:
+                self._reserve(ms)
+
+            second = ms // 1000
+            if second != self.second:
+                self.second = second
+                self.stamp = datetime.fromtimestamp(second, timezone.utc).strftime("%Y%m%d%H%M%S")
+            return f"{self.prefix}-{self.stamp}{ms % 1000:03d}-{self.worker}{self.seq:03d}"
+
+    def close(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
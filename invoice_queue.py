@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import metrics
+from config import INVOICE_DIR, INVOICE_WORKERS, INVOICE_MAX_ATTEMPTS
+from invoice import render_invoice, invoice_path
+
+RETRY_BASE_DELAY = 2.0   # seconds; doubles with every failed attempt
+RETRY_MAX_DELAY = 300.0
+POLL_INTERVAL = 0.5
+
+
+class InvoiceQueue:
+    """
+    Persistent queue of invoice PDFs waiting to be rendered.
+
+    Jobs are stored in a small SQLite file next to the PDFs, so anything
+    queued before a crash or power cut is picked up on the next start.
+    Rendering runs in a process pool; a few dispatcher threads claim jobs
+    and wait on the workers, so the Tk main thread never blocks.
+    """
+
+    def __init__(self, directory=INVOICE_DIR, workers=INVOICE_WORKERS, max_attempts=INVOICE_MAX_ATTEMPTS):
+        self.directory = directory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.path = os.path.join(directory, "queue.db")
+        self.claim_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.threads = []
+        self.executor = None
+
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    invoice_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, next_attempt)")
+            # Jobs that were mid-render when the process died go back in line
+            conn.execute("UPDATE jobs SET status='pending' WHERE status='running'")
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit mode; multi-statement writes use explicit BEGIN/COMMIT
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            yield conn
+        finally:
+            conn.close()
+
+    # --- Producer side ---
+    def submit(self, invoice):
+        self.submit_many([invoice])
+
+    def submit_many(self, invoices):
+        """Queue invoices (dicts as accepted by render_invoice); re-submitting re-renders"""
+        now = time.time()
+        rows = [(inv['invoice_id'], json.dumps(inv, default=str), now, now) for inv in invoices]
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany("""
+                INSERT INTO jobs (invoice_id, payload, status, attempts, next_attempt, created, updated)
+                VALUES (?, ?, 'pending', 0, 0, ?, ?)
+                ON CONFLICT(invoice_id) DO UPDATE SET
+                    payload=excluded.payload, status='pending', attempts=0,
+                    next_attempt=0, last_error=NULL, updated=excluded.updated
+            """, rows)
+            conn.execute("COMMIT")
+        self.wake_event.set()
+
+    def retry_failed(self):
+        with self._connect() as conn:
+            cur = conn.execute("""
+                UPDATE jobs SET status='pending', attempts=0, next_attempt=0, updated=?
+                WHERE status='failed'
+            """, (time.time(),))
+            count = cur.rowcount
+        self.wake_event.set()
+        return count
+
+    # --- Status ---
+    def status(self, invoice_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, attempts, last_error FROM jobs WHERE invoice_id=?",
+                               (invoice_id,)).fetchone()
+        return row
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def finished_since(self, since):
+        """(invoice_id, status) of jobs that completed or failed after `since`"""
+        with self._connect() as conn:
+            return conn.execute("""
+                SELECT invoice_id, status FROM jobs
+                WHERE status IN ('done', 'failed') AND updated > ?
+                ORDER BY updated
+            """, (since,)).fetchall()
+
+    # --- Worker side ---
+    def _claim(self):
+        with self.claim_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""
+                SELECT invoice_id, payload, attempts FROM jobs
+                WHERE status='pending' AND next_attempt <= ?
+                ORDER BY created LIMIT 1
+            """, (time.time(),)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status='running', updated=? WHERE invoice_id=?",
+                             (time.time(), row[0]))
+            conn.execute("COMMIT")
+        return row
+
+    def _finish(self, invoice_id, attempts, error=None):
+        now = time.time()
+        with self._connect() as conn:
+            if error is None:
+                conn.execute("UPDATE jobs SET status='done', last_error=NULL, updated=? WHERE invoice_id=?",
+                             (now, invoice_id))
+                return
+            attempts += 1
+            status = 'failed' if attempts >= self.max_attempts else 'pending'
+            delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+            conn.execute("""
+                UPDATE jobs SET status=?, attempts=?, next_attempt=?, last_error=?, updated=?
+                WHERE invoice_id=?
+            """, (status, attempts, now + delay, str(error), now, invoice_id))
+
+    def _work(self):
+        while not self.stop_event.is_set():
+            job = self._claim()
+            if job is None:
+                self.wake_event.wait(POLL_INTERVAL)
+                self.wake_event.clear()
+                continue
+            invoice_id, payload, attempts = job
+            executor = self.executor
+            try:
+                invoice = json.loads(payload)
+                # Timed here: the render itself runs in another process
+                with metrics.span("generate_pdf"):
+                    future = executor.submit(render_invoice, invoice, invoice_path(invoice_id, self.directory))
+                    future.result()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed by the OS); start a fresh pool
+                with self.claim_lock:
+                    if self.executor is executor and not self.stop_event.is_set():
+                        executor.shutdown(wait=False)
+                        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._finish(invoice_id, attempts, e)
+            except Exception as e:
+                print(f"Error rendering invoice {invoice_id}: {e}")
+                self._finish(invoice_id, attempts, e)
+            else:
+                self._finish(invoice_id, attempts)
+
+    def start(self):
+        if self.threads:
+            return
+        self.stop_event.clear()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        metrics.registry.register_gauges("shop_invoice_queue", self.counts)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        self.wake_event.set()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        self.threads = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def wait_idle(self, progress=None, interval=1.0):
+        """Block until nothing is pending or running; used by bulk re-renders"""
+        while True:
+            counts = self.counts()
+            if progress:
+                progress(counts)
+            if counts['pending'] == 0 and counts['running'] == 0:
+                return counts
+            time.sleep(interval)
@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+import metrics
+from config import (JOURNAL_DIR, JOURNAL_BATCH_SIZE, JOURNAL_SYNC_INTERVAL, JOURNAL_MAX_BACKOFF,
+                    JOURNAL_COMPACT_BYTES)
+
+
+class SaleJournal:
+    """
+    Append-only write-ahead log of completed sales.
+
+    Checkout appends one JSON line and fsyncs it, which needs no database
+    at all; a background syncer then drains the journal into the database
+    in batches via ShopDatabase.apply_sales. `sales.offset` records how far
+    the database has caught up. Batches are idempotent by invoice_id, so a
+    crash between a commit and the offset update just replays a few sales
+    on the next start.
+    """
+
+    def __init__(self, db, directory=JOURNAL_DIR, batch_size=JOURNAL_BATCH_SIZE,
+                 interval=JOURNAL_SYNC_INTERVAL, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.db = db
+        self.directory = directory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.compact_bytes = compact_bytes
+        self.path = os.path.join(directory, "sales.jsonl")
+        self.offset_path = os.path.join(directory, "sales.offset")
+        self.reject_path = os.path.join(directory, "sales.rejected.jsonl")
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+        # Metrics
+        self.synced = 0
+        self.rejected = 0
+        self.last_sync = None
+        self.last_error = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "ab")
+        self._recover()
+        metrics.registry.register_gauges("shop_journal", self.lag)
+
+    def _recover(self):
+        """Drop a torn last line and load what is still waiting to sync"""
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != size:
+            # The process died mid-write; that sale was never confirmed to the cashier
+            self.file.truncate(end)
+        self.size = end
+
+        try:
+            with open(self.offset_path) as f:
+                self.offset = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            self.offset = 0
+        if self.offset > self.size:
+            # Crashed between compacting the journal and resetting the offset
+            self._save_offset(0)
+
+        # Journal time of every unsynced sale, oldest first, for the lag metric
+        self.pending = deque()
+        for line in data[self.offset:end].splitlines():
+            try:
+                self.pending.append(json.loads(line).get('journaled_at', time.time()))
+            except ValueError:
+                self.pending.append(time.time())
+
+    def _save_offset(self, offset):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+        self.offset = offset
+
+    # --- Checkout side ---
+    def record(self, invoice_id, cart_items, financials, date=None, cart_id=None):
+        """Durably journal a completed sale; returns once it is on disk"""
+        now = time.time()
+        entry = {
+            'invoice_id': invoice_id,
+            'date': date or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            'items': [list(item) for item in cart_items],
+            'financials': financials,
+            # The cart's stock holds stay in place until the sync consumes them
+            'cart_id': cart_id,
+            'journaled_at': now,
+        }
+        line = (json.dumps(entry, default=str) + "\n").encode()
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.size += len(line)
+            self.pending.append(now)
+
+        # The till's view of stock moves with the sale, not with the sync
+        if self.db.catalog is not None:
+            for item in cart_items:
+                self.db.catalog.adjust_stock(int(item[0]), -item[3])
+        self.wake_event.set()
+        return entry
+
+    # --- Sync side ---
+    def _read_batch(self):
+        with self.lock:
+            start, end = self.offset, self.size
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            while len(entries) < self.batch_size and f.tell() < end:
+                line = f.readline()
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    entries.append({'raw': line.decode(errors="replace")})
+            return entries, f.tell()
+
+    def _reject(self, entry, error):
+        # Set the sale aside so one bad line cannot hold up the rest
+        print(f"Error syncing sale {entry.get('invoice_id', '?')}: {error}")
+        with open(self.reject_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({'error': str(error), 'entry': entry}, default=str) + "\n")
+        self.rejected += 1
+
+    def sync_once(self):
+        """Write the next batch to the database; returns how many journal entries it consumed"""
+        entries, end = self._read_batch()
+        if not entries:
+            return 0
+
+        # Entries that cannot be a sale (or that the database refuses outright)
+        # are data errors; anything else (server down, lock timeout) is retried
+        data_errors = (KeyError, TypeError, ValueError) + self.db.backend.data_errors
+        try:
+            with metrics.span("journal_sync"):
+                self.db.apply_sales(entries, check_stock=False)
+        except data_errors:
+            for entry in entries:
+                try:
+                    self.db.apply_sales([entry], check_stock=False)
+                except data_errors as e:
+                    self._reject(entry, e)
+
+        with self.lock:
+            self._save_offset(end)
+            for _ in entries:
+                self.pending.popleft()
+            if self.offset == self.size and self.size >= self.compact_bytes:
+                self.file.truncate(0)
+                self.size = 0
+                self._save_offset(0)
+        self.synced += len(entries)
+        self.last_sync = time.time()
+        self.last_error = None
+        return len(entries)
+
+    def drain(self):
+        """Sync until the journal is empty (used by manage.py); returns the number of entries"""
+        total = 0
+        while True:
+            count = self.sync_once()
+            if not count:
+                return total
+            total += count
+
+    def _run(self):
+        delay = self.interval
+        while not self.stop_event.is_set():
+            try:
+                synced = self.sync_once()
+                delay = self.interval
+            except Exception as e:
+                if self.last_error is None:
+                    print(f"Error syncing sale journal: {e}")
+                self.last_error = str(e)
+                synced = 0
+                # Back off while the database is unreachable
+                delay = min(delay * 2, JOURNAL_MAX_BACKOFF)
+            if not synced:
+                self.wake_event.wait(delay)
+                self.wake_event.clear()
+
+    def start(self):
+        """Start syncing; anything journaled before the last shutdown is replayed first"""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.file.close()
+
+    # --- Status ---
+    def lag(self):
+        """How far the database is behind the journal"""
+        with self.lock:
+            pending = len(self.pending)
+            oldest = self.pending[0] if self.pending else None
+            pending_bytes = self.size - self.offset
+        return {
+            'pending': pending,
+            'pending_bytes': pending_bytes,
+            'lag_seconds': time.time() - oldest if oldest is not None else 0.0,
+            'synced': self.synced,
+            'rejected': self.rejected,
+            'last_sync': self.last_sync,
+            'last_error': self.last_error,
+        }
@@ -1,25 +1,59 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import os
-from datetime import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib import colors
+import threading
+import time
 from database import ShopDatabase
+import metrics
+from widgets import VirtualTreeview
+from invoice import invoice_path
+from invoice_queue import InvoiceQueue
+from journal import SaleJournal
+from report_engine import ReportEngine
+from stock_watch import StockWatcher
+from services import (BillingService, InventoryService, ReportService, ServiceError, Cart,
+                      REPORT_PERIODS)
+from config import SHOP_NAME, CURRENCY
 
 # --- Configuration ---
-SHOP_NAME = "Swapnil"
-SHOP_ADDRESS = "Sangli, Maharashtra, India"
-CURRENCY = "₹"
+SEARCH_DEBOUNCE_MS = 150 # Wait for a pause in typing before searching
+INVOICE_POLL_MS = 500    # How often the billing tab checks for finished PDFs
+EXPORT_POLL_MS = 200     # Progress refresh while an import/export runs
+SYNC_POLL_MS = 1000      # How often the billing tab refreshes the journal sync status
+DIAG_POLL_MS = 2000      # Diagnostics panel refresh while the Admin tab is open
+CATALOG_POLL_MS = 500    # How often the grids check for product changes from other tills
+REPORT_POLL_MS = 100     # How often the reports tab checks for a finished report
+STARTUP_POLL_MS = 100    # Login retry while the database is still opening
+STOCK_ALERT_POLL_MS = 1000  # How often the billing tab shows new low-stock alerts
+COMPARISONS = {"Previous Week": "week", "Previous Year": "year"}
+
+# pandas, matplotlib, reportlab and the import/export modules are imported
+# where they are first used, so the login window shows up straight away
+
+
+class Startup:
+    """Opens the database on a background thread while the login window is up"""
+
+    def __init__(self, open_db=ShopDatabase):
+        self.db = None
+        self.error = None
+        self.ready = threading.Event()
+        threading.Thread(target=self._open, args=(open_db,), daemon=True).start()
+
+    def _open(self, open_db):
+        try:
+            self.db = open_db()
+        except Exception as e:
+            print(f"Error opening database: {e}")
+            self.error = e
+        finally:
+            self.ready.set()
+
 
 class LoginWindow:
-    def __init__(self, root, db, on_success):
+    def __init__(self, root, startup, on_success):
         self.root = root
-        self.db = db
+        self.startup = startup
         self.on_success = on_success
         self.root.title(f"Login - {SHOP_NAME}")
         self.root.geometry("400x300")
@@ -38,18 +72,33 @@ class LoginWindow:
         self.pass_entry = tk.Entry(frame, show="*", width=30)
         self.pass_entry.pack(pady=5)
         
-        tk.Button(frame, text="Login", command=self.login, bg="#007bff", fg="white", width=20).pack(pady=15)
+        self.login_button = tk.Button(frame, text="Login", command=self.login, bg="#007bff", fg="white", width=20)
+        self.login_button.pack(pady=15)
+        self.status_label = tk.Label(frame, text="", fg="gray", bg="white")
+        self.status_label.pack()
         
         self.root.bind('<Return>', lambda event: self.login())
 
     def login(self):
+        if not self.startup.ready.is_set():
+            # Still connecting; try again once the database is open
+            self.status_label.config(text="Connecting to database...")
+            self.login_button.config(state=tk.DISABLED)
+            self.root.after(STARTUP_POLL_MS, self.login)
+            return
+        self.login_button.config(state=tk.NORMAL)
+        self.status_label.config(text="")
+        if self.startup.error is not None:
+            messagebox.showerror("Error", f"Could not open the database:\n{self.startup.error}")
+            return
+
         user = self.user_entry.get()
         pwd = self.pass_entry.get()
-        role = self.db.verify_login(user, pwd)
+        role = self.startup.db.verify_login(user, pwd)
         
         if role:
             self.root.withdraw()  # Hide login window
-            self.on_success(role, user)
+            self.on_success(self.startup.db, role, user)
         else:
             messagebox.showerror("Error", "Invalid Username or Password")
 
@@ -59,8 +108,10 @@ class MainApplication:
         self.db = db
         self.role = role
         self.username = username
-        self.cart = [] # List of tuples (id, name, price, qty, total)
-        self.current_financials = {'subtotal': 0.0, 'discount': 0.0, 'tax': 0.0, 'grand_total': 0.0}
+        self.cart = Cart() # One line per product, money in paise (see cart.py)
+        self.search_job = None # Pending debounced search (root.after id)
+        self.invoices_to_open = set() # Invoices rung up here, opened once rendered
+        self.invoice_poll_since = time.time()
         
         self.root.title(f"{SHOP_NAME} - Management System | Logged in as: {username} ({role})")
         self.root.geometry("1280x720")
@@ -68,6 +119,24 @@ class MainApplication:
         self.style = ttk.Style()
         self.style.theme_use('clam')
         
+        # PDFs render in background processes; anything left over from a
+        # previous run (e.g. after a crash) is picked up here
+        self.invoice_queue = InvoiceQueue()
+        self.invoice_queue.start()
+
+        # Sales are journaled locally at checkout and synced to the database
+        # in the background; sales journaled before a crash are replayed now
+        self.journal = SaleJournal(db)
+        self.journal.start()
+
+        # Business logic lives in the service layer; this class is only the UI
+        self.billing = BillingService(db, journal=self.journal, invoice_queue=self.invoice_queue)
+        self.inventory = InventoryService(db)
+        self.reports = ReportService(db)
+        # Report queries run on worker threads and are cached until sales or products change
+        self.report_engine = ReportEngine(db, self.reports, self.inventory)
+        self.report_job = None
+
         # Main Layout
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True)
@@ -79,6 +148,18 @@ class MainApplication:
         if role == 'Admin':
             self.create_admin_tab()
 
+        self.poll_invoice_queue()
+        self.poll_sync_status()
+
+        # Other tills' sales and edits reach the catalog in the background
+        self.catalog_version = self.db.get_catalog().version
+        self.db.start_catalog_refresh()
+        self.poll_catalog()
+
+        # Products crossing their minimum stock, from this till or any other
+        self.stock_watcher = StockWatcher(db)
+        self.poll_stock_alerts()
+
     def create_billing_tab(self):
         self.bill_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.bill_frame, text="  Billing (POS)  ")
@@ -95,12 +176,13 @@ class MainApplication:
         search_frame.pack(fill=tk.X, pady=5)
         tk.Label(search_frame, text="Search Product:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
-        self.search_var.trace("w", self.update_product_list)
+        self.search_var.trace("w", self.schedule_product_search)
         tk.Entry(search_frame, textvariable=self.search_var, width=30).pack(side=tk.LEFT, padx=5)
         
         # Product List Treeview
         cols = ("ID", "Name", "Category", "Price", "Stock")
-        self.prod_tree = ttk.Treeview(left_panel, columns=cols, show="headings", height=15)
+        self.prod_tree = VirtualTreeview(left_panel, cols, height=15, key=lambda p: p[0], format_row=lambda p: p[:5],
+                                         name="products")
         for col in cols:
             self.prod_tree.heading(col, text=col, anchor="center") # Centered Header
             self.prod_tree.column(col, width=80, anchor="center")  # Centered Data
@@ -115,6 +197,11 @@ class MainApplication:
         self.qty_entry = tk.Entry(control_frame, width=10)
         self.qty_entry.insert(0, "1")
         self.qty_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(control_frame, text="Line Disc (%):").pack(side=tk.LEFT)
+        self.line_disc_entry = tk.Entry(control_frame, width=6)
+        self.line_disc_entry.insert(0, "0")
+        self.line_disc_entry.pack(side=tk.LEFT, padx=5)
         
         tk.Button(control_frame, text="Add to Cart", command=self.add_to_cart, bg="#28a745", fg="white").pack(side=tk.LEFT, padx=10)
         
@@ -122,7 +209,9 @@ class MainApplication:
         tk.Label(right_panel, text="Current Bill", font=("Arial", 14, "bold"), bg="#f8f9fa").pack(pady=5)
         
         cart_cols = ("Name", "Qty", "Total")
-        self.cart_tree = ttk.Treeview(right_panel, columns=cart_cols, show="headings", height=15)
+        # item: (pid, name, price, qty, total); one row per product
+        self.cart_tree = VirtualTreeview(right_panel, cart_cols, height=15, name="cart", key=lambda item: item[0],
+                                         format_row=lambda item: (self.cart_label(item), item[3], f"{item[4]:.2f}"))
         self.cart_tree.heading("Name", text="Item", anchor="center")
         self.cart_tree.heading("Qty", text="Qty", anchor="center")
         self.cart_tree.heading("Total", text="Total", anchor="center")
@@ -140,9 +229,9 @@ class MainApplication:
         self.disc_entry.insert(0, "0")
         self.disc_entry.pack(fill=tk.X)
         
-        tk.Label(right_panel, text="Tax (%):", bg="#f8f9fa").pack(anchor="w")
+        tk.Label(right_panel, text="Tax (%, or GST for rates by category):", bg="#f8f9fa").pack(anchor="w")
         self.tax_entry = tk.Entry(right_panel)
-        self.tax_entry.insert(0, "0") 
+        self.tax_entry.insert(0, "0")
         self.tax_entry.pack(fill=tk.X)
         
         tk.Button(right_panel, text="Calculate Total", command=self.update_totals).pack(fill=tk.X, pady=5)
@@ -153,6 +242,19 @@ class MainApplication:
         tk.Button(right_panel, text="GENERATE BILL & PRINT", command=self.checkout, bg="#007bff", fg="white", font=("Arial", 10, "bold"), height=2).pack(fill=tk.X, pady=10)
         tk.Button(right_panel, text="Clear Cart", command=self.clear_cart, bg="gray", fg="white").pack(fill=tk.X)
 
+        # Invoice render status
+        self.invoice_lbl = tk.Label(right_panel, text="", bg="#f8f9fa", anchor="w", justify=tk.LEFT)
+        self.invoice_lbl.pack(fill=tk.X, pady=(10, 0))
+        self.retry_btn = tk.Button(right_panel, text="Retry Failed Invoices", command=self.retry_failed_invoices)
+
+        # Journal sync status
+        self.sync_lbl = tk.Label(right_panel, text="", bg="#f8f9fa", anchor="w", justify=tk.LEFT)
+        self.sync_lbl.pack(fill=tk.X)
+
+        # Low-stock alerts, pushed by the stock watcher as sales and edits land
+        self.stock_lbl = tk.Label(right_panel, text="", bg="#f8f9fa", anchor="w", justify=tk.LEFT, wraplength=360)
+        self.stock_lbl.pack(fill=tk.X)
+
         self.update_product_list()
 
     def create_inventory_tab(self):
@@ -164,12 +266,16 @@ class MainApplication:
         tools_frame.pack(fill=tk.X)
         
         tk.Button(tools_frame, text="Add New Item", command=self.popup_add_item).pack(side=tk.LEFT, padx=10)
-        tk.Button(tools_frame, text="Refresh", command=self.load_inventory_table).pack(side=tk.LEFT, padx=10)
-        tk.Button(tools_frame, text="Import CSV", command=self.import_csv).pack(side=tk.RIGHT, padx=10)
+        tk.Button(tools_frame, text="Refresh", command=self.refresh_products).pack(side=tk.LEFT, padx=10)
+        self.import_btn = tk.Button(tools_frame, text="Import CSV", command=self.import_csv)
+        self.import_btn.pack(side=tk.RIGHT, padx=10)
+        self.import_lbl = tk.Label(tools_frame, text="")
+        self.import_lbl.pack(side=tk.RIGHT, padx=10)
         
         # Inventory Table
         cols = ("ID", "Name", "Category", "Price", "Stock", "Min Stock")
-        self.inv_tree = ttk.Treeview(self.inv_frame, columns=cols, show="headings")
+        self.inv_tree = VirtualTreeview(self.inv_frame, cols, key=lambda p: p[0], row_tags=self.inventory_row_tags,
+                                        name="inventory")
         for col in cols:
             self.inv_tree.heading(col, text=col, anchor="center") # Centered Header
             self.inv_tree.column(col, anchor="center")            # Centered Data
@@ -195,10 +301,29 @@ class MainApplication:
         ctrl_frame = tk.Frame(self.rep_frame, pady=10, padx=10)
         ctrl_frame.pack(fill=tk.X)
         
+        tk.Label(ctrl_frame, text="Period:").pack(side=tk.LEFT)
+        self.report_period = ttk.Combobox(ctrl_frame, values=list(REPORT_PERIODS), state="readonly", width=12)
+        self.report_period.current(0)
+        self.report_period.pack(side=tk.LEFT, padx=5)
         tk.Button(ctrl_frame, text="Show Sales Summary", command=self.show_sales_summary).pack(side=tk.LEFT, padx=5)
         tk.Button(ctrl_frame, text="Show Top Selling Items", command=self.show_top_items).pack(side=tk.LEFT, padx=5)
         tk.Button(ctrl_frame, text="Low Stock Report", command=self.show_low_stock).pack(side=tk.LEFT, padx=5)
-        tk.Button(ctrl_frame, text="Export to Excel", command=self.export_report).pack(side=tk.RIGHT, padx=5)
+        self.export_btn = tk.Button(ctrl_frame, text="Export to Excel", command=self.export_report)
+        self.export_btn.pack(side=tk.RIGHT, padx=5)
+        self.export_items = tk.BooleanVar(value=False)
+        tk.Checkbutton(ctrl_frame, text="Include line items", variable=self.export_items).pack(side=tk.RIGHT)
+
+        # Time-series views over the same period
+        trend_frame = tk.Frame(self.rep_frame, padx=10)
+        trend_frame.pack(fill=tk.X)
+        tk.Button(trend_frame, text="Trends", command=self.show_trends).pack(side=tk.LEFT, padx=5)
+        tk.Button(trend_frame, text="Hourly Heatmap", command=self.show_heatmap).pack(side=tk.LEFT, padx=5)
+        tk.Button(trend_frame, text="Category Revenue", command=self.show_categories).pack(side=tk.LEFT, padx=5)
+        tk.Button(trend_frame, text="Basket Trend", command=self.show_baskets).pack(side=tk.LEFT, padx=5)
+        self.compare_against = ttk.Combobox(trend_frame, values=list(COMPARISONS), state="readonly", width=14)
+        self.compare_against.current(0)
+        self.compare_against.pack(side=tk.RIGHT, padx=5)
+        tk.Button(trend_frame, text="Compare With", command=self.show_comparison).pack(side=tk.RIGHT, padx=5)
         
         # Content Area (Text/Table + Graph)
         self.rep_content = tk.Frame(self.rep_frame)
@@ -243,188 +368,262 @@ class MainApplication:
                 
         tk.Button(form_frame, text="Create User", command=add_user_handler, bg="#28a745", fg="white").grid(row=3, columnspan=2, pady=10)
 
+        # --- Diagnostics ---
+        self.admin_frame = admin_frame
+        diag_frame = tk.LabelFrame(admin_frame, text="Diagnostics", padx=10, pady=5)
+        diag_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        diag_btns = tk.Frame(diag_frame)
+        diag_btns.pack(fill=tk.X)
+        tk.Button(diag_btns, text="Refresh", command=self.refresh_diagnostics).pack(side=tk.LEFT, padx=5)
+        tk.Button(diag_btns, text="Reset Timings", command=self.reset_diagnostics).pack(side=tk.LEFT, padx=5)
+        tk.Button(diag_btns, text="Export Metrics", command=self.export_metrics).pack(side=tk.LEFT, padx=5)
+
+        self.diag_text = tk.Text(diag_frame, height=20, font=("Courier", 9), wrap=tk.NONE)
+        self.diag_text.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.poll_diagnostics()
+
+    # --- Diagnostics Logic ---
+    def poll_diagnostics(self):
+        # Only redraw while someone is looking at the Admin tab
+        if self.notebook.select() == str(self.admin_frame):
+            self.refresh_diagnostics()
+        self.root.after(DIAG_POLL_MS, self.poll_diagnostics)
+
+    def refresh_diagnostics(self):
+        snap = metrics.registry.snapshot()
+        lines = [f"Up {snap['uptime_seconds'] / 60:.0f} min    (times in ms; slow query log: {metrics.registry.slow_log})", ""]
+
+        pool = self.db.pool_metrics()
+        lines.append(f"Connection pool: {pool['in_use']}/{pool['size']} in use, {pool['idle']} idle, "
+                     f"wait avg {pool['avg_wait_ms']:.1f} max {pool['max_wait_ms']:.1f}, "
+                     f"{pool['reconnects']} reconnects, {pool['failures']} failures")
+        lag = self.journal.lag()
+        lines.append(f"Sale journal: {lag['pending']} pending ({lag['pending_bytes']} bytes), "
+                     f"{lag['lag_seconds']:.1f}s behind, {lag['synced']} synced, {lag['rejected']} rejected"
+                     + (f", last error: {lag['last_error']}" if lag['last_error'] else ""))
+        lines.append("")
+
+        lines.append(f"{'Span':<34}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for s in snap['spans']:
+            name = " ".join([s['labels'].pop('span')] + [f"{k}={v}" for k, v in s['labels'].items()])
+            lines.append(f"{name:<34}{s['count']:>8}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+                         f"{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+        lines.append("")
+
+        lines.append(f"{'Top queries by total time':<34}{'calls':>8}{'total':>9}{'avg':>9}{'max':>9}{'slow':>6}")
+        for q in snap['queries'][:15]:
+            lines.append(f"{'[' + q['id'] + ']':<34}{q['calls']:>8}{q['total_ms']:>9.0f}{q['avg_ms']:>9.2f}"
+                         f"{q['max_ms']:>9.1f}{q['slow']:>6}")
+            lines.append(f"    {q['query'][:160]}")
+        lines.append("")
+
+        lines.append(f"Recent slow queries (>= {metrics.registry.slow_query_ms:.0f} ms):")
+        for q in reversed(snap['slow_queries'][-10:]):
+            lines.append(f"  {q['time']} {q['ms']:8.1f}  {q['query'][:120]}")
+
+        self.diag_text.delete(1.0, tk.END)
+        self.diag_text.insert(tk.END, "\n".join(lines))
+
+    def reset_diagnostics(self):
+        metrics.registry.reset()
+        self.refresh_diagnostics()
+
+    def export_metrics(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".prom", initialfile="shop_metrics.prom",
+                                                 filetypes=[("Prometheus text", "*.prom"), ("Text", "*.txt")])
+        if not file_path:
+            return
+        try:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(metrics.registry.prometheus_text())
+            messagebox.showinfo("Success", f"Metrics written to {file_path}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write metrics: {e}")
+
     # --- Billing Logic ---
+    def schedule_product_search(self, *args):
+        # Restart the timer on every keystroke so only the last one searches
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.update_product_list)
+
     def update_product_list(self, *args):
+        self.search_job = None
         query = self.search_var.get()
-        # Clear current list
-        for i in self.prod_tree.get_children():
-            self.prod_tree.delete(i)
-        
-        if query:
-            products = self.db.search_products(query)
-        else:
-            products = self.db.get_all_products()
-            
-        for p in products:
-            self.prod_tree.insert("", "end", values=p)
+        # Served from the in-memory index, no database round-trip per keystroke
+        products = self.billing.search(query)
+        self.prod_tree.set_rows(products)
 
     def add_to_cart(self):
-        selected = self.prod_tree.selection()
-        if not selected:
+        item_vals = self.prod_tree.selected_row()
+        if not item_vals:
             messagebox.showwarning("Warning", "Please select a product first.")
             return
-            
-        item_vals = self.prod_tree.item(selected[0])['values']
         
-        # Robust unpacking
-        try:
-            pid = item_vals[0]
-            name = item_vals[1]
-            price = float(item_vals[3]) 
-            stock = int(item_vals[4])   
-        except IndexError:
-            messagebox.showerror("Error", "Could not retrieve item data.")
-            return
-        except ValueError:
-            messagebox.showerror("Error", "Invalid price or stock data.")
-            return
-
         try:
-            qty = int(self.qty_entry.get())
-            if qty <= 0: raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Invalid Quantity")
+            self.billing.add_to_cart(self.cart, item_vals[0], self.qty_entry.get(),
+                                     discount_percent=self.line_disc_entry.get().strip() or 0)
+        except ServiceError as e:
+            messagebox.showerror("Error", str(e))
             return
-            
-        if qty > stock:
-            messagebox.showerror("Error", f"Insufficient Stock! Only {stock} available.")
-            return
-            
-        total = price * qty
-        self.cart.append((pid, name, price, qty, total))
         self.update_cart_display()
         self.update_totals()
 
     def update_cart_display(self):
-        for i in self.cart_tree.get_children():
-            self.cart_tree.delete(i)
-        for item in self.cart:
-            # item: (pid, name, price, qty, total)
-            self.cart_tree.insert("", "end", values=(item[1], item[3], f"{item[4]:.2f}"))
+        # Only the lines that changed since the last redraw are touched
+        changed = self.cart.take_changes()
+        if changed is None:
+            self.cart_tree.set_rows(self.cart.items)
+            return
+        for pid in changed:
+            line = self.cart.line(pid)
+            if line is None:
+                self.cart_tree.remove_row(pid)
+            else:
+                self.cart_tree.upsert_row(line.as_item())
+
+    def cart_label(self, item):
+        # Cart rows show the gross line; a line discount is noted next to the name
+        line = self.cart.line(item[0])
+        if line is None or not line.discount:
+            return item[1]
+        return f"{item[1]} (-{line.discount / 100:g}%)"
+
+    def bill_rates(self):
+        # The tax box takes a rate or "GST" (see services.CATEGORY_GST)
+        return self.disc_entry.get().strip() or 0, self.tax_entry.get().strip() or 0
 
     def update_totals(self):
-        subtotal = sum(item[4] for item in self.cart)
-        self.total_lbl.config(text=f"Subtotal: {CURRENCY} {subtotal:.2f}")
-        
         try:
-            disc_per = float(self.disc_entry.get())
-            tax_per = float(self.tax_entry.get())
-        except ValueError:
-            disc_per = 0
-            tax_per = 0
-            
-        discount = (subtotal * disc_per) / 100
-        tax = ((subtotal - discount) * tax_per) / 100
-        grand_total = subtotal - discount + tax
-        
-        self.current_financials = {
-            'subtotal': subtotal,
-            'discount': discount,
-            'tax': tax,
-            'grand_total': grand_total
-        }
-        
-        self.final_lbl.config(text=f"Grand Total: {CURRENCY} {grand_total:.2f}")
+            totals = self.billing.totals(self.cart, *self.bill_rates())
+        except ServiceError as e:
+            self.final_lbl.config(text=str(e))
+            return
+        self.total_lbl.config(text=f"Subtotal: {CURRENCY} {totals['subtotal']:.2f}   "
+                                   f"GST: {CURRENCY} {totals['tax']:.2f}")
+        self.final_lbl.config(text=f"Grand Total: {CURRENCY} {totals['grand_total']:.2f}")
 
     def clear_cart(self):
-        self.cart = []
+        try:
+            self.billing.clear_cart(self.cart)
+        except Exception as e:
+            # The holds expire on their own; the cart must still empty
+            print(f"Error releasing reserved stock: {e}")
+            self.cart.clear()
         self.update_cart_display()
         self.update_totals()
 
     def checkout(self):
-        if not self.cart:
+        if not len(self.cart):
             messagebox.showwarning("Empty Cart", "Cannot generate bill for empty cart.")
             return
-            
+
         self.update_totals()
-        invoice_id = f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        if self.db.process_sale(invoice_id, None, self.cart, self.current_financials):
-            self.generate_pdf(invoice_id)
-            messagebox.showinfo("Success", "Transaction Completed & Invoice Saved!")
-            self.clear_cart()
-            self.load_inventory_table() # Refresh inventory
-            self.update_product_list()
-        else:
+        try:
+            invoice = self.billing.checkout(self.cart, *self.bill_rates())
+        except ServiceError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        except Exception as e:
+            print(f"Error during checkout: {e}")
             messagebox.showerror("Error", "Transaction Failed.")
+            return
 
-    def generate_pdf(self, invoice_id):
-        if not os.path.exists("invoices"):
-            os.makedirs("invoices")
-            
-        filename = f"invoices/{invoice_id}.pdf"
-        c = canvas.Canvas(filename, pagesize=letter)
-        
-        # Header
-        c.setFont("Helvetica-Bold", 20)
-        c.drawString(50, 750, SHOP_NAME)
-        c.setFont("Helvetica", 10)
-        c.drawString(50, 735, SHOP_ADDRESS)
-        c.drawString(50, 720, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        c.drawString(50, 705, f"Invoice #: {invoice_id}")
-        
-        c.line(50, 690, 550, 690)
-        
-        # --- PDF Table Generation ---
-        # Data Preparation
-        data = [['Item', 'Price', 'Qty', 'Total']]
-        for item in self.cart:
-            # item: (pid, name, price, qty, total)
-            data.append([item[1], f"{item[2]:.2f}", str(item[3]), f"{item[4]:.2f}"])
-            
-        # Add Totals as rows in the table for alignment
-        # Only showing GST and Total Amount as requested
-        data.append(['', '', 'GST', f"+{self.current_financials['tax']:.2f}"])
-        data.append(['', '', 'Total Amount', f"{self.current_financials['grand_total']:.2f}"])
-
-        # Table Layout - Increased column widths for better spacing (Total width: 480)
-        table = Table(data, colWidths=[200, 80, 100, 100])
-        
-        # Table Style
-        style = TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),      # Header Background
-            ('TEXTCOLOR', (0,0), (-1,0), colors.black),           # Header Text Color
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),                  # Center Align Everything
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),        # Header Font
-            ('BOTTOMPADDING', (0,0), (-1,0), 12),                 # Header Padding
-            ('GRID', (0,0), (-1,-1), 1, colors.black),            # Grid Borders for All Cells
-            ('FONTNAME', (-2,-1), (-1,-1), 'Helvetica-Bold'),     # Bold Grand Total
-            ('BACKGROUND', (-1,-1), (-1,-1), colors.whitesmoke),  # Highlight Grand Total
-        ])
-        table.setStyle(style)
-        
-        # Draw Table on Canvas
-        w, h = table.wrapOn(c, 500, 500)
-        # Position: 50 from left, and top is at 650. 
-        # y = 650 - h ensures the table hangs down from y=650
-        table.drawOn(c, 50, 650-h)
-        
-        # Footer (Dynamic position based on table height)
-        footer_y = 650 - h - 50
-        c.setFont("Helvetica-Oblique", 10)
-        c.drawCentredString(300, footer_y, f"Thank you for shopping at {SHOP_NAME}! Please Visit Again.")
-        
-        c.save()
-        # On Windows, try to open the file
+        invoice_id = invoice['invoice_id']
+        self.invoices_to_open.add(invoice_id)
+        self.invoice_lbl.config(text=f"{invoice_id} saved, invoice rendering...", fg="black")
+        # checkout() already emptied the cart
+        self.update_cart_display()
+        self.update_totals()
+        self.load_inventory_table() # Refresh inventory
+        self.update_product_list()
+
+    def poll_invoice_queue(self):
         try:
-            os.startfile(os.path.abspath(filename))
-        except:
-            pass
+            since = self.invoice_poll_since
+            self.invoice_poll_since = time.time()
+            for invoice_id, status in self.invoice_queue.finished_since(since - 1):
+                if invoice_id not in self.invoices_to_open:
+                    continue
+                self.invoices_to_open.discard(invoice_id)
+                if status == 'done':
+                    self.invoice_lbl.config(text=f"Invoice {invoice_id} ready.", fg="green")
+                    # On Windows, try to open the file
+                    try:
+                        os.startfile(os.path.abspath(invoice_path(invoice_id)))
+                    except:
+                        pass
+                else:
+                    self.invoice_lbl.config(text=f"Invoice {invoice_id} failed to render.", fg="red")
+
+            counts = self.invoice_queue.counts()
+            if counts['failed']:
+                self.retry_btn.config(text=f"Retry Failed Invoices ({counts['failed']})")
+                self.retry_btn.pack(fill=tk.X, pady=5)
+            else:
+                self.retry_btn.pack_forget()
+        except Exception as e:
+            print(f"Error polling invoice queue: {e}")
+        self.root.after(INVOICE_POLL_MS, self.poll_invoice_queue)
+
+    def poll_sync_status(self):
+        lag = self.journal.lag()
+        if lag['last_error']:
+            self.sync_lbl.config(text=f"Offline: {lag['pending']} sale(s) waiting to sync "
+                                      f"({lag['lag_seconds']:.0f}s behind)", fg="red")
+        elif lag['pending']:
+            self.sync_lbl.config(text=f"Syncing {lag['pending']} sale(s)...", fg="black")
+        else:
+            self.sync_lbl.config(text="All sales synced.", fg="green")
+        self.root.after(SYNC_POLL_MS, self.poll_sync_status)
+
+    def poll_catalog(self):
+        # The refresh thread only touches the catalog; the grids redraw here, on the Tk thread
+        version = self.db.get_catalog().version
+        if version != self.catalog_version:
+            self.catalog_version = version
+            self.load_inventory_table()
+            self.update_product_list()
+        self.root.after(CATALOG_POLL_MS, self.poll_catalog)
+
+    def poll_stock_alerts(self):
+        alerts = self.stock_watcher.take_alerts()
+        if alerts:
+            latest = alerts[-1]
+            if latest['kind'] == 'out':
+                text, colour = f"Out of stock: {latest['name']}", "red"
+            elif latest['kind'] == 'low':
+                text, colour = f"Low stock: {latest['name']} ({latest['stock']} left)", "#cc6600"
+            else:
+                text, colour = f"Restocked: {latest['name']} ({latest['stock']} in stock)", "green"
+            at_risk = len(self.db.get_catalog().at_risk)
+            if at_risk:
+                text += f"  -  {at_risk} product(s) at or below minimum stock"
+            self.stock_lbl.config(text=text, fg=colour)
+        self.root.after(STOCK_ALERT_POLL_MS, self.poll_stock_alerts)
+
+    def retry_failed_invoices(self):
+        count = self.invoice_queue.retry_failed()
+        self.invoice_lbl.config(text=f"Retrying {count} invoice(s)...", fg="black")
 
     # --- Inventory Logic ---
+    def inventory_row_tags(self, p):
+        # The catalog keeps the low-stock set up to date as stock changes
+        if p[0] in self.db.get_catalog().at_risk:
+            return ('low_stock',)
+        return ()
+
     def load_inventory_table(self):
-        for i in self.inv_tree.get_children():
-            self.inv_tree.delete(i)
-        
-        products = self.db.get_all_products()
-        for p in products:
-            # Check for low stock
-            tags = ()
-            stock = p[4]
-            min_stock = p[5]
-            if stock <= min_stock:
-                tags = ('low_stock',)
-            self.inv_tree.insert("", "end", values=p, tags=tags)
+        # The catalog index is kept in sync by ShopDatabase, so a refresh
+        # only redraws the rows on screen that actually changed
+        self.inv_tree.set_rows(self.inventory.list_products())
+
+    def refresh_products(self):
+        # Pick up changes made from other tills
+        self.db.refresh_catalog()
+        self.load_inventory_table()
+        self.update_product_list()
 
     def popup_add_item(self):
         # Simple popup logic using simpledialog or a Toplevel
@@ -448,18 +647,17 @@ class MainApplication:
         
         def save():
             try:
-                self.db.add_product(e_name.get(), e_cat.get(), float(e_price.get()), int(e_stock.get()), int(e_min.get()))
+                self.inventory.add_product(e_name.get(), e_cat.get(), e_price.get(), e_stock.get(), e_min.get())
                 self.load_inventory_table()
                 top.destroy()
-            except ValueError:
-                messagebox.showerror("Error", "Invalid numeric values")
+            except ServiceError as e:
+                messagebox.showerror("Error", str(e))
                 
         tk.Button(top, text="Save", command=save).grid(row=5, columnspan=2, pady=10)
 
     def popup_update_item(self):
-        selected = self.inv_tree.selection()
-        if not selected: return
-        item_vals = self.inv_tree.item(selected[0])['values']
+        item_vals = self.inv_tree.selected_row()
+        if not item_vals: return
         
         top = tk.Toplevel(self.root)
         top.title("Update Product")
@@ -480,118 +678,333 @@ class MainApplication:
         e_min = tk.Entry(top); e_min.insert(0, item_vals[5]); e_min.grid(row=4, column=1)
         
         def save():
-            self.db.update_product(item_vals[0], e_name.get(), e_cat.get(), float(e_price.get()), int(e_stock.get()), int(e_min.get()))
+            try:
+                self.inventory.update_product(item_vals[0], e_name.get(), e_cat.get(), e_price.get(), e_stock.get(), e_min.get())
+            except ServiceError as e:
+                messagebox.showerror("Error", str(e))
+                return
             self.load_inventory_table()
             top.destroy()
             
         tk.Button(top, text="Update", command=save).grid(row=5, columnspan=2)
 
     def delete_item(self):
-        selected = self.inv_tree.selection()
-        if not selected: return
+        item_vals = self.inv_tree.selected_row()
+        if not item_vals: return
         if messagebox.askyesno("Confirm", "Delete selected item?"):
-            pid = self.inv_tree.item(selected[0])['values'][0]
-            self.db.delete_product(pid)
+            pid = item_vals[0]
+            self.inventory.delete_product(pid)
             self.load_inventory_table()
 
     def import_csv(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
         if file_path:
-            try:
-                df = pd.read_csv(file_path)
-                # Expected columns: name, category, price, stock, min_stock
-                count = 0
-                for index, row in df.iterrows():
-                    self.db.add_product(row['name'], row['category'], row['price'], row['stock'], row['min_stock'])
-                    count += 1
-                messagebox.showinfo("Success", f"Imported {count} items successfully.")
-                self.load_inventory_table()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to import CSV: {e}")
+            # Expected columns: name, category, price, stock, min_stock (optional: id)
+            from importer import ImportJob
+            self.import_job = ImportJob(self.db, file_path)
+            self.import_job.start()
+            self.import_btn.config(state=tk.DISABLED)
+            self.poll_import()
+
+    def poll_import(self):
+        job = self.import_job
+        if not job.done:
+            rows, rejected = job.progress
+            self.import_lbl.config(text=f"Importing... {rows} rows read, {rejected} rejected")
+            self.root.after(EXPORT_POLL_MS, self.poll_import)
+            return
+
+        self.import_btn.config(state=tk.NORMAL)
+        self.import_lbl.config(text="")
+        if job.error:
+            messagebox.showerror("Error", f"Failed to import CSV: {job.error}")
+            return
+
+        result = job.result
+        message = f"Imported {result['inserted']} new and updated {result['updated']} existing items."
+        if result['rejected']:
+            message += f"\n{result['rejected']} invalid rows were skipped; see {result['reject_path']}"
+        messagebox.showinfo("Success", message)
+        self.load_inventory_table()
+        self.update_product_list()
 
     # --- Reports Logic ---
+    def run_report(self, name, args, show, **kwargs):
+        """Run a report off the Tk thread; `show(result)` is called here once it is ready"""
+        job = self.report_engine.submit(name, *args, **kwargs)
+        self.report_job = job
+        if not job.done:
+            self.rep_text.delete(1.0, tk.END)
+            self.rep_text.insert(tk.END, "Loading report...")
+        self.poll_report(job, show)
+
+    def poll_report(self, job, show):
+        if job is not self.report_job:
+            return  # Another report was asked for since
+        if not job.done:
+            self.root.after(REPORT_POLL_MS, self.poll_report, job, show)
+            return
+        if job.error is not None:
+            self.rep_text.delete(1.0, tk.END)
+            self.rep_text.insert(tk.END, f"Report failed: {job.error}")
+            return
+        with metrics.span("report_view", report=job.name):
+            show(job.result)
+
     def show_sales_summary(self):
-        df = self.db.get_sales_data()
-        if df.empty:
+        start = self.reports.period_start(self.report_period.get())
+        self.run_report("sales_summary", (start,), self.render_sales_summary)
+
+    def render_sales_summary(self, summary):
+        if not summary['daily']:
             self.rep_text.delete(1.0, tk.END)
             self.rep_text.insert(tk.END, "No sales data found.")
             return
 
-        total_rev = df['grand_total'].sum()
-        count = len(df)
         self.rep_text.delete(1.0, tk.END)
-        self.rep_text.insert(tk.END, f"Total Invoices: {count}\n")
-        self.rep_text.insert(tk.END, f"Total Revenue: {CURRENCY} {total_rev:.2f}\n")
-        
-        # Plot
+        self.rep_text.insert(tk.END, f"Total Invoices: {summary['invoices']}\n")
+        self.rep_text.insert(tk.END, f"Total Revenue: {CURRENCY} {summary['revenue']:.2f}\n")
+        self.rep_text.insert(tk.END, f"Total GST: {CURRENCY} {summary['tax']:.2f}\n")
+        self.rep_text.insert(tk.END, f"Total Discount: {CURRENCY} {summary['discount']:.2f}\n")
+        
+        # Daily Sales
+        days = [str(d['day']) for d in summary['daily']]
+        revenue = [float(d['revenue']) for d in summary['daily']]
+
+        def plot(ax):
+            ax.bar(days, revenue, color='skyblue')
+            ax.set_title("Daily Sales Revenue")
+            ax.set_ylabel("Revenue")
+            ax.tick_params(axis='x', labelrotation=90)
+        self.draw_chart(plot)
+
+    def draw_chart(self, plot):
+        """Replace the report chart; matplotlib is only loaded the first time a chart is drawn"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         for widget in self.graph_frame.winfo_children():
             widget.destroy()
-            
-        # Group by Date (Daily Sales)
-        df['date'] = pd.to_datetime(df['date'])
-        daily = df.groupby(df['date'].dt.date)['grand_total'].sum()
-        
-        fig, ax = plt.subplots(figsize=(6, 4))
-        daily.plot(kind='bar', ax=ax, color='skyblue')
-        ax.set_title("Daily Sales Revenue")
-        ax.set_ylabel("Revenue")
-        
+        # A bare Figure rather than pyplot: no global figure registry to leak into
+        fig = Figure(figsize=(6, 4))
+        plot(fig.add_subplot())
+        fig.tight_layout()
         canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
     def show_top_items(self):
-        df = self.db.get_item_sales_data()
-        if df.empty:
-            return
-            
-        top_items = df.groupby('product_name')['quantity'].sum().sort_values(ascending=False).head(10)
-        
+        period = self.report_period.get()
+        self.run_report("top_products", (10, self.reports.period_start(period)),
+                        lambda rows: self.render_top_items(rows, period))
+
+    def render_top_items(self, rows, period):
         self.rep_text.delete(1.0, tk.END)
-        self.rep_text.insert(tk.END, "Top Selling Items:\n")
-        self.rep_text.insert(tk.END, top_items.to_string())
-        
-        for widget in self.graph_frame.winfo_children():
-            widget.destroy()
+        if not rows:
+            self.rep_text.insert(tk.END, f"No sales for {period.lower()}.")
+            return
             
-        fig, ax = plt.subplots(figsize=(6, 4))
-        top_items.plot(kind='barh', ax=ax, color='lightgreen')
-        ax.set_title("Top Selling Items (Qty)")
-        
-        canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        names = [row['name'] for row in rows]
+        quantities = [int(row['quantity']) for row in rows]
+        width = max(len(name) for name in names)
+
+        self.rep_text.insert(tk.END, f"Top Selling Items ({period}):\n")
+        self.rep_text.insert(tk.END, "\n".join(f"{name:<{width}}  {qty:>6}" for name, qty in zip(names, quantities)))
+
+        def plot(ax):
+            ax.barh(names, quantities, color='lightgreen')
+            ax.set_title(f"Top Selling Items (Qty) - {period}")
+        self.draw_chart(plot)
 
     def show_low_stock(self):
-        df = self.db.get_inventory_data()
-        low_stock = df[df['stock'] <= df['min_stock']]
-        
+        # Low now, plus whatever will run out before a reorder could arrive
+        self.run_report("reorder", (), self.render_low_stock)
+
+    def render_low_stock(self, rows):
         self.rep_text.delete(1.0, tk.END)
-        self.rep_text.insert(tk.END, "CRITICAL: Low Stock Items:\n\n")
-        if low_stock.empty:
+        self.rep_text.insert(tk.END, "CRITICAL: Low Stock Items and Reorder Suggestions:\n\n")
+        if not rows:
             self.rep_text.insert(tk.END, "All stock levels are healthy.")
         else:
-            self.rep_text.insert(tk.END, low_stock[['name', 'stock', 'min_stock']].to_string())
+            width = max(len('name'), *(len(row['name']) for row in rows))
+            lines = [f"{'name':<{width}}  {'stock':>6}  {'min_stock':>9}  {'per day':>8}  {'days left':>9}  "
+                     f"{'reorder':>7}"]
+            for row in rows:
+                days_left = "-" if row['days_left'] is None else f"{row['days_left']:.1f}"
+                lines.append(f"{row['name']:<{width}}  {row['stock']:>6}  {row['min_stock']:>9}  "
+                             f"{row['velocity']:>8.2f}  {days_left:>9}  {row['reorder_qty']:>7}")
+            self.rep_text.insert(tk.END, "\n".join(lines))
+
+    def show_trends(self):
+        period = self.report_period.get()
+        self.run_report("sales_trend", (self.reports.period_start(period),),
+                        lambda trend: self.render_trends(trend, period))
+
+    def render_trends(self, trend, period):
+        self.rep_text.delete(1.0, tk.END)
+        if not any(trend['revenue']):
+            self.rep_text.insert(tk.END, f"No sales for {period.lower()}.")
+            return
+
+        averages = [f"avg_{w}" for w in trend['windows']]
+        self.rep_text.insert(tk.END, f"Revenue Trend ({trend['start']} to {trend['end']}):\n")
+        self.rep_text.insert(tk.END, f"Total: {CURRENCY} {sum(trend['revenue']):.2f}\n")
+        for name, w in zip(averages, trend['windows']):
+            self.rep_text.insert(tk.END, f"Latest {w}-day average: {CURRENCY} {trend[name][-1]:.2f}\n")
+
+        def plot(ax):
+            ax.bar(range(len(trend['days'])), trend['revenue'], color='lightgrey', label="Daily")
+            for name, w, color in zip(averages, trend['windows'], ('tab:blue', 'tab:orange', 'tab:green')):
+                ax.plot(range(len(trend['days'])), trend[name], color=color, label=f"{w}-day average")
+            step = max(1, len(trend['days']) // 10)
+            ax.set_xticks(range(0, len(trend['days']), step))
+            ax.set_xticklabels(trend['days'][::step], rotation=90)
+            ax.set_title("Daily Revenue with Rolling Averages")
+            ax.legend()
+        self.draw_chart(plot)
+
+    def show_comparison(self):
+        against = COMPARISONS[self.compare_against.get()]
+        self.run_report("sales_compare", (self.reports.period_start(self.report_period.get()),),
+                        self.render_comparison, against=against)
+
+    def render_comparison(self, result):
+        self.rep_text.delete(1.0, tk.END)
+        current, previous = result['current'], result['previous']
+        self.rep_text.insert(tk.END, f"{result['start']} to {result['end']} vs "
+                                     f"{result['previous_start']} to {result['previous_end']}:\n")
+        for label, key in (("Revenue", 'revenue'), ("Invoices", 'invoices')):
+            change = result['change_pct'][key]
+            change = "n/a" if change is None else f"{change:+.1f}%"
+            self.rep_text.insert(tk.END, f"{label}: {current[key]} (was {previous[key]}, {change})\n")
+
+        days = [d['day'] for d in result['daily']]
+
+        def plot(ax):
+            ax.plot(range(len(days)), [d['revenue'] for d in result['daily']], label="This period")
+            ax.plot(range(len(days)), [d['previous'] for d in result['daily']], label="Previous", linestyle="--")
+            step = max(1, len(days) // 10)
+            ax.set_xticks(range(0, len(days), step))
+            ax.set_xticklabels(days[::step], rotation=90)
+            ax.set_title(f"Revenue vs previous {result['against']}")
+            ax.legend()
+        self.draw_chart(plot)
+
+    def show_heatmap(self):
+        period = self.report_period.get()
+        self.run_report("sales_heatmap", (self.reports.period_start(period),),
+                        lambda heatmap: self.render_heatmap(heatmap, period))
+
+    def render_heatmap(self, heatmap, period):
+        self.rep_text.delete(1.0, tk.END)
+        busiest = heatmap['busiest']
+        if busiest is None:
+            self.rep_text.insert(tk.END, f"No sales for {period.lower()}.")
+            return
+        self.rep_text.insert(tk.END, f"Sales by Hour ({period}):\n")
+        self.rep_text.insert(tk.END, f"Busiest slot: {busiest['weekday']} {busiest['hour']:02d}:00, "
+                                     f"{CURRENCY} {busiest['revenue']:.2f}\n")
+
+        def plot(ax):
+            image = ax.imshow(heatmap['grid'], aspect="auto", cmap="YlOrRd")
+            ax.set_yticks(range(7))
+            ax.set_yticklabels(heatmap['weekdays'])
+            ax.set_xticks(range(0, 24, 2))
+            ax.set_xlabel("Hour of day")
+            ax.set_title(f"Revenue by Weekday and Hour - {period}")
+            ax.figure.colorbar(image, ax=ax)
+        self.draw_chart(plot)
+
+    def show_categories(self):
+        period = self.report_period.get()
+        self.run_report("category_revenue", (self.reports.period_start(period),),
+                        lambda rows: self.render_categories(rows, period))
+
+    def render_categories(self, rows, period):
+        self.rep_text.delete(1.0, tk.END)
+        if not rows:
+            self.rep_text.insert(tk.END, f"No sales for {period.lower()}.")
+            return
+        width = max(len(row['category']) for row in rows)
+        self.rep_text.insert(tk.END, f"Revenue by Category ({period}):\n")
+        self.rep_text.insert(tk.END, "\n".join(f"{row['category']:<{width}}  {CURRENCY} {row['revenue']:>12.2f}  "
+                                               f"{row['share']:>5.1f}%" for row in rows))
+
+        def plot(ax):
+            ax.barh([row['category'] for row in rows][::-1], [row['revenue'] for row in rows][::-1], color='plum')
+            ax.set_title(f"Revenue by Category - {period}")
+        self.draw_chart(plot)
+
+    def show_baskets(self):
+        period = self.report_period.get()
+        self.run_report("basket_trend", (self.reports.period_start(period),),
+                        lambda rows: self.render_baskets(rows, period))
+
+    def render_baskets(self, rows, period):
+        self.rep_text.delete(1.0, tk.END)
+        if not rows:
+            self.rep_text.insert(tk.END, f"No sales for {period.lower()}.")
+            return
+        self.rep_text.insert(tk.END, f"Basket Trend ({period}):\n")
+        self.rep_text.insert(tk.END, f"{'month':<7}  {'bills':>7}  {'avg bill':>10}  {'lines':>5}  {'units':>5}\n")
+        self.rep_text.insert(tk.END, "\n".join(f"{row['month']:<7}  {row['invoices']:>7}  {row['avg_bill']:>10.2f}  "
+                                               f"{row['avg_lines']:>5.1f}  {row['avg_units']:>5.1f}" for row in rows))
+
+        def plot(ax):
+            months = [row['month'] for row in rows]
+            ax.bar(range(len(months)), [row['avg_bill'] for row in rows], color='lightblue')
+            step = max(1, len(months) // 12)
+            ax.set_xticks(range(0, len(months), step))
+            ax.set_xticklabels(months[::step], rotation=90)
+            ax.set_title(f"Average Bill by Month - {period}")
+        self.draw_chart(plot)
 
     def export_report(self):
-        df = self.db.get_sales_data()
-        if df.empty: return
-        
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
-        if file_path:
-            df.to_csv(file_path, index=False)
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[
+            ("CSV", "*.csv"), ("Compressed CSV", "*.csv.gz"), ("Parquet", "*.parquet")])
+        if not file_path:
+            return
+
+        # Streams in chunks on a worker thread; progress is polled below
+        start = self.reports.period_start(self.report_period.get())
+        from export import ExportJob
+        self.export_job = ExportJob(self.db, file_path, start=start, include_items=self.export_items.get())
+        self.export_job.start()
+        self.export_btn.config(state=tk.DISABLED)
+        self.poll_export()
+
+    def poll_export(self):
+        job = self.export_job
+        done, total = job.progress
+        if not job.done:
+            percent = (done * 100 // total) if total else 0
+            self.rep_text.delete(1.0, tk.END)
+            self.rep_text.insert(tk.END, f"Exporting... {done} of {total} rows ({percent}%)")
+            self.root.after(EXPORT_POLL_MS, self.poll_export)
+            return
+
+        self.export_btn.config(state=tk.NORMAL)
+        self.rep_text.delete(1.0, tk.END)
+        if job.error:
+            self.rep_text.insert(tk.END, f"Export failed: {job.error}")
+            messagebox.showerror("Error", f"Export failed: {job.error}")
+        else:
+            self.rep_text.insert(tk.END, f"Exported {job.rows} rows to {job.path}")
             messagebox.showinfo("Success", "Sales report exported successfully.")
 
 # --- Bootstrapper ---
-if __name__ == "__main__":
-    db = ShopDatabase()
-    
-    root = tk.Tk()
-    
-    def on_login_success(role, username):
-        app = MainApplication(root, db, role, username)
+def build_login(root):
+    """Login window first; the database opens behind it"""
+    startup = Startup()
+
+    def on_login_success(db, role, username):
+        MainApplication(root, db, role, username)
         root.deiconify() # Show main window
 
-    # Start with Login Window
-    login = LoginWindow(root, db, on_login_success)
+    return LoginWindow(root, startup, on_login_success)
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    login = build_login(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+Maintenance commands for the shop database.
+
+    python manage.py migrate
+    python manage.py check-plans
+    python manage.py rerender-invoices [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--workers N] [--chunk N]
+    python manage.py rebuild-rollups [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+    python manage.py reconcile [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--tax PCT]
+    python manage.py export FILE [--from ...] [--to ...] [--items]   (.csv, .csv.gz or .parquet)
+    python manage.py import-products FILE.csv [--chunk-rows N]
+    python manage.py snapshot [--dir DIR]
+    python manage.py sync-journal
+"""
+import argparse
+import time
+from database import ShopDatabase
+
+
+def migrate(db, args):
+    # ShopDatabase() has already applied anything pending on connect
+    from migrations import current_version, LATEST_VERSION
+    with db.cursor() as cur:
+        version = current_version(cur)
+    print(f"Schema is at version {version} (latest {LATEST_VERSION}).")
+
+
+def check_plans(db, args):
+    from migrations import check_query_plans
+    results = check_query_plans(db)
+    for description, status, detail in results:
+        print(f"  [{status.upper():4}] {description}: {detail}")
+    if any(status == 'fail' for _, status, _ in results):
+        raise SystemExit(1)
+
+
+def rerender_invoices(db, args):
+    from invoice import render_many
+
+    invoices = db.get_invoices(args.start, args.end)
+    if not invoices:
+        print("No invoices in that range.")
+        return
+    print(f"Rendering {len(invoices)} invoice(s) across {args.workers} process(es)...")
+
+    start = time.perf_counter()
+    rendered, failed = render_many(invoices, workers=args.workers, chunk_size=args.chunk,
+                                   progress=lambda done, bad, total: print(f"  {done + bad} / {total}", end="\r"))
+    elapsed = time.perf_counter() - start
+    print(f"\nDone. {rendered} rendered, {len(failed)} failed in {elapsed:.1f}s "
+          f"({rendered / elapsed if elapsed else 0:.0f} invoices/s).")
+    for invoice_id, error in failed[:10]:
+        print(f"  {invoice_id}: {error}")
+
+
+def rebuild_rollups(db, args):
+    days = db.rebuild_daily_sales(args.start, args.end)
+    print(f"daily_sales: rebuilt {days} day(s).")
+    rows = db.rebuild_product_daily_sales(args.start, args.end)
+    print(f"product_daily_sales: rebuilt {rows} product-day row(s).")
+    rows = db.rebuild_hourly_sales(args.start, args.end)
+    print(f"hourly_sales: rebuilt {rows} day-hour row(s).")
+
+
+def reconcile(db, args):
+    from pricing import reconcile as reconcile_invoices
+    start = time.perf_counter()
+    report = reconcile_invoices(db, start=args.start, end=args.end, tax_percent=args.tax)
+    print(f"Checked {len(report)} invoice(s) in {time.perf_counter() - start:.2f}s.")
+    for column, label in (("line_drift", "price x qty of the lines differs from the subtotal"),
+                          ("total_drift", "subtotal - discount + GST differs from the grand total"),
+                          ("tax_drift", "GST differs from the current rates")):
+        off = report[report[column] != 0]
+        print(f"  {len(off)} where {label}", end="")
+        print(f" (net {off[column].sum():+.2f})" if len(off) else "")
+        for invoice_id, drift in zip(off['invoice_id'][:5], off[column][:5]):
+            print(f"      {invoice_id}: {drift:+.2f}")
+    print(f"  {int(report['over_price'].sum())} with a line charged above price x qty")
+
+
+def export(db, args):
+    from export import export_sales
+
+    def progress(done, total):
+        print(f"  {done} / {total} rows", end="\r")
+
+    rows = export_sales(db, args.path, args.start, args.end, include_items=args.items, progress=progress)
+    print(f"\nWrote {rows} rows to {args.path}.")
+
+
+def import_products(db, args):
+    from importer import import_products as run_import
+
+    def progress(rows, rejected):
+        print(f"  {rows} rows read, {rejected} rejected", end="\r")
+
+    result = run_import(db, args.path, chunk_rows=args.chunk_rows, progress=progress)
+    print(f"\nInserted {result['inserted']}, updated {result['updated']}, rejected {result['rejected']}.")
+    if result['reject_path']:
+        print(f"Reject report: {result['reject_path']}")
+
+
+def sync_snapshot(db, args):
+    from snapshot import SalesSnapshot
+
+    snapshot = SalesSnapshot(args.directory) if args.directory else SalesSnapshot()
+    start = time.perf_counter()
+    written = snapshot.sync(db)
+    stats = snapshot.stats()
+    print(f"Rewrote {written} month(s) in {time.perf_counter() - start:.1f}s; "
+          f"{stats['months']} closed month(s) held, through {stats['through'] or '-'}.")
+
+
+def sync_journal(db, args):
+    from journal import SaleJournal
+
+    journal = SaleJournal(db)
+    try:
+        print(f"{journal.lag()['pending']} sale(s) waiting in the journal.")
+        count = journal.drain()
+        lag = journal.lag()
+    finally:
+        journal.close()
+    print(f"Synced {count} sale(s); {lag['rejected']} set aside in {journal.reject_path}." if lag['rejected']
+          else f"Synced {count} sale(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate", help="apply pending schema migrations and show the version")
+    cmd.set_defaults(handler=migrate)
+
+    cmd = commands.add_parser("check-plans", help="EXPLAIN the hot queries and check they use their indexes")
+    cmd.set_defaults(handler=check_plans)
+
+    cmd = commands.add_parser("rerender-invoices", help="re-render historical invoice PDFs in parallel")
+    cmd.add_argument("--from", dest="start", help="first sale date (YYYY-MM-DD)")
+    cmd.add_argument("--to", dest="end", help="last sale date (YYYY-MM-DD)")
+    cmd.add_argument("--workers", type=int, default=4, help="render processes")
+    cmd.add_argument("--chunk", type=int, default=50, help="invoices handed to a process at a time")
+    cmd.set_defaults(handler=rerender_invoices)
+
+    cmd = commands.add_parser("rebuild-rollups", help="recompute the report rollup tables from sales")
+    cmd.add_argument("--from", dest="start", help="first sale date (YYYY-MM-DD)")
+    cmd.add_argument("--to", dest="end", help="last sale date (YYYY-MM-DD)")
+    cmd.set_defaults(handler=rebuild_rollups)
+
+    cmd = commands.add_parser("reconcile", help="recompute invoices in paise and report totals that do not add up")
+    cmd.add_argument("--from", dest="start", help="first sale date (YYYY-MM-DD)")
+    cmd.add_argument("--to", dest="end", help="last sale date (YYYY-MM-DD)")
+    cmd.add_argument("--tax", type=float, help="check GST at this one rate instead of the category rates")
+    cmd.set_defaults(handler=reconcile)
+
+    cmd = commands.add_parser("export", help="stream sales to CSV, gzipped CSV or Parquet")
+    cmd.add_argument("path", help="output file; format is taken from the extension")
+    cmd.add_argument("--from", dest="start", help="first sale date (YYYY-MM-DD)")
+    cmd.add_argument("--to", dest="end", help="last sale date (YYYY-MM-DD)")
+    cmd.add_argument("--items", action="store_true", help="one row per line item instead of per invoice")
+    cmd.set_defaults(handler=export)
+
+    cmd = commands.add_parser("import-products", help="bulk upsert products from a CSV file")
+    cmd.add_argument("path", help="CSV with name, category, price, stock[, min_stock][, id]")
+    cmd.add_argument("--chunk-rows", type=int, default=5000, help="rows validated and written per batch")
+    cmd.set_defaults(handler=import_products)
+
+    cmd = commands.add_parser("snapshot", help="bring the columnar analytics snapshot up to date")
+    cmd.add_argument("--dir", dest="directory", help="snapshot directory (default from config.py)")
+    cmd.set_defaults(handler=sync_snapshot)
+
+    cmd = commands.add_parser("sync-journal", help="write journaled sales to the database now")
+    cmd.set_defaults(handler=sync_journal)
+
+    args = parser.parse_args()
+    db = ShopDatabase()
+    try:
+        args.handler(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
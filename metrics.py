@@ -0,0 +1,293 @@
+import bisect
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache, wraps
+from config import METRICS_ENABLED, SLOW_QUERY_MS, SLOW_QUERY_LOG
+
+# Latency buckets in seconds, from a fast index lookup to a stuck report
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_FINGERPRINTS = 200   # Distinct query shapes tracked; the rest are folded into "other"
+SLOW_QUERIES_KEPT = 100  # Recent slow queries kept in memory for the diagnostics panel
+
+COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+REPEATED_LIST_RE = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+REPEATED_WHEN_RE = re.compile(r"WHEN \? THEN \?(?: WHEN \? THEN \?)+", re.I)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    SQL with literals and placeholders replaced by ? and variable-length
+    lists collapsed, so every call of the same query shape groups together:
+        SELECT ... WHERE id IN (%s, %s, %s)  ->  SELECT ... WHERE id IN (?+)
+    """
+    text = COMMENT_RE.sub(" ", sql)
+    text = STRING_RE.sub("?", text)
+    text = text.replace("%s", "?")
+    text = NUMBER_RE.sub("?", text)
+    text = " ".join(text.split())
+    text = LIST_RE.sub("(?+)", text)
+    text = REPEATED_LIST_RE.sub("(?+), ...", text)
+    return REPEATED_WHEN_RE.sub("WHEN ? THEN ? ...", text)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus expects it"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate from the buckets (linear within a bucket); good enough to spot a slow path"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class QueryStats:
+    def __init__(self, text):
+        self.text = text
+        self.id = hashlib.md5(text.encode()).hexdigest()[:8]
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+
+
+class TimedCursor:
+    """Wraps a driver cursor and times every execute/executemany"""
+
+    def __init__(self, cur, registry):
+        self.cur = cur
+        self.registry = registry
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self.cur.execute(sql, params)
+        finally:
+            self.registry.observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return self.cur.executemany(sql, seq_of_params)
+        finally:
+            self.registry.observe_query(sql, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.cur, name)
+
+
+class Registry:
+    """
+    In-process metrics: latency histograms for spans and queries, per-query
+    fingerprint totals, a slow-query log and gauges read on demand (pool,
+    journal). Everything is kept in memory and exported as Prometheus text.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, slow_query_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.slow_log = slow_log
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.reset()
+        self.gauges = {}  # prefix -> callable returning {name: number}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}  # (metric, sorted label pairs) -> Histogram
+            self.errors = {}      # span label pairs -> count
+            self.queries = {}     # fingerprint -> QueryStats
+            self.slow = deque(maxlen=SLOW_QUERIES_KEPT)
+
+    # --- Recording ---
+    def observe(self, metric, seconds, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time a block as shop_span_seconds{span=name}; exceptions are counted and re-raised"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            key = tuple(sorted(dict(labels, span=name).items()))
+            with self.lock:
+                self.errors[key] = self.errors.get(key, 0) + 1
+            raise
+        finally:
+            self.observe("shop_span_seconds", time.perf_counter() - start, span=name, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of span()"""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def wrap_cursor(self, cur):
+        return TimedCursor(cur, self) if self.enabled else cur
+
+    def observe_query(self, sql, seconds):
+        shape = fingerprint(sql)
+        kind = shape.split(" ", 1)[0].upper() if shape else "?"
+        slow = seconds * 1000 >= self.slow_query_ms
+        with self.lock:
+            stats = self.queries.get(shape)
+            if stats is None:
+                key = shape if len(self.queries) < MAX_FINGERPRINTS else "other"
+                stats = self.queries.get(key)
+                if stats is None:
+                    stats = self.queries[key] = QueryStats(key)
+            stats.calls += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            if slow:
+                stats.slow += 1
+                self.slow.append((datetime.now(), seconds, shape))
+        self.observe("shop_query_seconds", seconds, kind=kind)
+        if slow:
+            self.log_slow_query(seconds, shape)
+
+    def log_slow_query(self, seconds, shape):
+        # Only the query shape is logged: parameters can hold customer data
+        try:
+            directory = os.path.dirname(self.slow_log)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.slow_log, "a", encoding="utf-8") as f:
+                f.write(f"{datetime.now().isoformat(timespec='milliseconds')} {seconds * 1000:.1f}ms {shape}\n")
+        except OSError as e:
+            print(f"Error writing slow query log: {e}")
+
+    def register_gauges(self, prefix, read):
+        """`read()` returns {name: number}; exported as {prefix}_{name}, read at export time"""
+        self.gauges[prefix] = read
+
+    # --- Reading ---
+    def read_gauges(self):
+        values = {}
+        for prefix, read in list(self.gauges.items()):
+            try:
+                for name, value in read().items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if isinstance(value, (int, float)):
+                        values[f"{prefix}_{name}"] = value
+            except Exception as e:
+                print(f"Error reading {prefix} metrics: {e}")
+        return values
+
+    def snapshot(self):
+        """Plain dicts for the diagnostics panel and the API"""
+        with self.lock:
+            spans = [{
+                'labels': dict(labels), 'count': h.count, 'total_ms': h.sum * 1000,
+                'p50_ms': h.quantile(0.5) * 1000, 'p95_ms': h.quantile(0.95) * 1000,
+                'p99_ms': h.quantile(0.99) * 1000, 'max_ms': h.max * 1000,
+            } for (metric, labels), h in self.histograms.items() if metric == "shop_span_seconds"]
+            queries = [{
+                'id': q.id, 'query': q.text, 'calls': q.calls, 'total_ms': q.total * 1000,
+                'avg_ms': q.total / q.calls * 1000, 'max_ms': q.max * 1000, 'slow': q.slow,
+            } for q in self.queries.values()]
+            slow = [{'time': stamp.isoformat(timespec="seconds"), 'ms': seconds * 1000, 'query': text}
+                    for stamp, seconds, text in self.slow]
+        spans.sort(key=lambda s: s['total_ms'], reverse=True)
+        queries.sort(key=lambda q: q['total_ms'], reverse=True)
+        return {'uptime_seconds': time.time() - self.started, 'spans': spans, 'queries': queries,
+                'slow_queries': slow, 'gauges': self.read_gauges()}
+
+    def prometheus_text(self):
+        """Everything in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            errors = sorted(self.errors.items())
+            queries = sorted(self.queries.values(), key=lambda q: q.id)
+
+        described = set()
+        for (metric, labels), h in histograms:
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            pairs = [f'{k}="{escape_label(v)}"' for k, v in labels]
+            cumulative = 0
+            for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                cumulative += n
+                le = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{metric}_bucket{{{le}}} {cumulative}")
+            suffix = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{metric}_sum{suffix} {h.sum:.6f}")
+            lines.append(f"{metric}_count{suffix} {h.count}")
+
+        if errors:
+            lines.append("# TYPE shop_span_errors_total counter")
+            for labels, n in errors:
+                pairs = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels)
+                lines.append(f"shop_span_errors_total{{{pairs}}} {n}")
+
+        if queries:
+            for metric, value_of in (("shop_query_fingerprint_seconds_total", lambda q: f"{q.total:.6f}"),
+                                     ("shop_query_fingerprint_calls_total", lambda q: q.calls),
+                                     ("shop_query_fingerprint_slow_total", lambda q: q.slow)):
+                lines.append(f"# TYPE {metric} counter")
+                for q in queries:
+                    value = value_of(q)
+                    lines.append(f'{metric}{{id="{q.id}",query="{escape_label(q.text[:200])}"}} {value}')
+
+        for name, value in sorted(self.read_gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        lines.append("# TYPE shop_uptime_seconds gauge")
+        lines.append(f"shop_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry everything records into
+registry = Registry()
+span = registry.span
+timed = registry.timed
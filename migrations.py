@@ -0,0 +1,277 @@
+"""
+Versioned schema migrations.
+
+Every step is idempotent (MySQL DDL commits implicitly, so a step that
+dies half-way must be safe to run again) and is recorded in
+schema_version once it completes. ShopDatabase runs `migrate` at start;
+steps at or below the recorded version are skipped. Steps are written
+once for every backend; `db.backend` fills in the dialect differences.
+"""
+from datetime import datetime
+
+
+# --- Helpers ---
+def add_index(db, cur, table, index, columns, kind="INDEX"):
+    if not db.backend.index_exists(cur, table, index):
+        cur.execute(f"CREATE {kind} {index} ON {table} ({columns})")
+
+
+# --- Steps ---
+def create_base_tables(db, cur):
+    pk = db.backend.autoincrement_pk
+
+    # Users Table (Using VARCHAR for Unique keys in MySQL)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS users (
+            id {pk},
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NOT NULL
+        )
+    """)
+
+    # Products Table
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS products (
+            id {pk},
+            name VARCHAR(255) NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            stock INT NOT NULL,
+            min_stock INT DEFAULT 10
+        )
+    """)
+
+    # Sales Table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            invoice_id VARCHAR(255) PRIMARY KEY,
+            date DATETIME NOT NULL,
+            subtotal DECIMAL(10, 2) NOT NULL,
+            tax DECIMAL(10, 2) NOT NULL,
+            discount DECIMAL(10, 2) NOT NULL,
+            grand_total DECIMAL(10, 2) NOT NULL
+        )
+    """)
+
+    # Sale Items Table
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS sale_items (
+            id {pk},
+            invoice_id VARCHAR(255),
+            product_id INT,
+            product_name VARCHAR(255),
+            quantity INT,
+            price DECIMAL(10, 2),
+            total DECIMAL(10, 2),
+            FOREIGN KEY(invoice_id) REFERENCES sales(invoice_id)
+        )
+    """)
+
+
+def create_rollup_tables(db, cur):
+    # Daily Sales Rollup (maintained by process_sale, one row per day)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            day DATE PRIMARY KEY,
+            revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            tax DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            discount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            invoices INT NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Per-product daily rollup (quantity & revenue), drives top sellers
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS product_daily_sales (
+            product_id INT NOT NULL,
+            day DATE NOT NULL,
+            product_name VARCHAR(255),
+            quantity INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, day)
+        )
+    """)
+    add_index(db, cur, "product_daily_sales", "idx_product_daily_day", "day, product_id")
+
+
+def backfill_rollups(db, cur):
+    # Databases that had sales before the rollups existed start with empty rollups
+    cur.execute("SELECT 1 FROM sales LIMIT 1")
+    if cur.fetchone() is None:
+        return
+    cur.execute("SELECT 1 FROM daily_sales LIMIT 1")
+    if cur.fetchone() is None:
+        db.rebuild_daily_sales()
+    cur.execute("SELECT 1 FROM product_daily_sales LIMIT 1")
+    if cur.fetchone() is None:
+        db.rebuild_product_daily_sales()
+
+
+def add_hot_path_indexes(db, cur):
+    # Report date ranges, rollup rebuilds and exports
+    add_index(db, cur, "sales", "idx_sales_date", "date")
+    # Per-product sales history (velocity, top sellers rebuild)
+    add_index(db, cur, "sale_items", "idx_sale_items_product", "product_id")
+    # Name prefix lookups and category browsing
+    add_index(db, cur, "products", "idx_products_name", "name")
+    add_index(db, cur, "products", "idx_products_category", "category, name")
+    # Word search over name and category (SQLite tills search the in-memory catalog)
+    if db.backend.supports_fulltext:
+        add_index(db, cur, "products", "ft_products_name", "name, category", kind="FULLTEXT INDEX")
+    # Low-stock check: `stock <= min_stock` compares two columns, so index a
+    # generated flag instead. Product reads select explicit columns, so the
+    # extra column does not change the shape of product rows.
+    if not db.backend.column_exists(cur, "products", "is_low_stock"):
+        cur.execute(f"ALTER TABLE products ADD COLUMN {db.backend.generated_column('is_low_stock', 'stock <= min_stock')}")
+    add_index(db, cur, "products", "idx_products_low_stock", "is_low_stock")
+
+
+def add_invoice_items_index(db, cur):
+    # MySQL indexes foreign keys implicitly (and drops that index once an
+    # explicit one exists); SQLite does not, so name it on every backend
+    add_index(db, cur, "sale_items", "idx_sale_items_invoice", "invoice_id")
+
+
+def add_stock_reservations(db, cur):
+    # Bumped by every write to a product, so tills re-read only the rows that moved
+    if not db.backend.column_exists(cur, "products", "version"):
+        cur.execute("ALTER TABLE products ADD COLUMN version INT NOT NULL DEFAULT 0")
+    add_index(db, cur, "products", "idx_products_version", "version")
+
+    # Stock held by carts that are still being rung up (one row per cart and product)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            cart_id VARCHAR(64) NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            expires_at DOUBLE NOT NULL,
+            PRIMARY KEY (cart_id, product_id)
+        )
+    """)
+    add_index(db, cur, "stock_reservations", "idx_reservations_product", "product_id, expires_at")
+    add_index(db, cur, "stock_reservations", "idx_reservations_expiry", "expires_at")
+
+
+def add_hourly_rollup(db, cur):
+    # Revenue per hour of each day (maintained by process_sale), drives the heatmap
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS hourly_sales (
+            day DATE NOT NULL,
+            hour INT NOT NULL,
+            revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            invoices INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour)
+        )
+    """)
+    cur.execute("SELECT 1 FROM hourly_sales LIMIT 1")
+    if cur.fetchone() is None:
+        cur.execute("SELECT 1 FROM sales LIMIT 1")
+        if cur.fetchone() is not None:
+            db.rebuild_hourly_sales()
+
+
+MIGRATIONS = [
+    (1, "base tables", create_base_tables),
+    (2, "report rollup tables", create_rollup_tables),
+    (3, "backfill report rollups", backfill_rollups),
+    (4, "hot path indexes", add_hot_path_indexes),
+    (5, "sale items invoice index", add_invoice_items_index),
+    (6, "stock reservations and product versions", add_stock_reservations),
+    (7, "hourly sales rollup", add_hourly_rollup),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    row = cur.fetchone()
+    return row[0] or 0
+
+
+def schema_is_current(cur):
+    """True when every migration is already applied; a plain read, no DDL and no lock"""
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+        row = cur.fetchone()
+    except Exception:
+        # No schema_version table yet (or no database at all)
+        return False
+    return (row[0] or 0) >= LATEST_VERSION
+
+
+def migrate(db):
+    """Apply pending migrations; returns the list of versions applied"""
+    applied = []
+    with db.cursor() as cur, db.backend.migration_lock(cur):
+        version = current_version(cur)
+        for step_version, description, step in MIGRATIONS:
+            if step_version <= version:
+                continue
+            print(f"Applying schema migration {step_version}: {description}")
+            step(db, cur)
+            cur.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                        (step_version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            applied.append(step_version)
+    return applied
+
+
+# --- Query plan checks ---
+# (description, SQL, params, table, expected index or tuple of acceptable names,
+#  backends the query applies to)
+ALL_BACKENDS = ("mysql", "sqlite")
+HOT_QUERIES = [
+    ("sales by date range", "SELECT invoice_id, grand_total FROM sales WHERE date >= %s AND date < %s",
+     ("2024-01-01", "2024-02-01"), "sales", "idx_sales_date", ALL_BACKENDS),
+    ("sales history of one product", "SELECT SUM(quantity) FROM sale_items WHERE product_id = %s",
+     (1,), "sale_items", "idx_sale_items_product", ALL_BACKENDS),
+    ("line items of one invoice", "SELECT * FROM sale_items WHERE invoice_id = %s",
+     ("INV-0",), "sale_items", "idx_sale_items_invoice", ALL_BACKENDS),
+    ("products in a category", "SELECT id, name FROM products WHERE category = %s",
+     ("Toys",), "products", "idx_products_category", ALL_BACKENDS),
+    ("product word search", "SELECT id FROM products WHERE MATCH(name, category) AGAINST (%s IN BOOLEAN MODE)",
+     ("+toy*",), "products", "ft_products_name", ("mysql",)),
+    ("low stock products", "SELECT id FROM products WHERE is_low_stock = 1",
+     (), "products", "idx_products_low_stock", ALL_BACKENDS),
+    ("daily rollup by date range", "SELECT * FROM daily_sales WHERE day >= %s AND day < %s",
+     ("2024-01-01", "2024-02-01"), "daily_sales", "PRIMARY", ALL_BACKENDS),
+    ("top sellers by date range",
+     "SELECT product_id, SUM(quantity) FROM product_daily_sales WHERE day >= %s AND day < %s GROUP BY product_id",
+     ("2024-01-01", "2024-02-01"), "product_daily_sales", "idx_product_daily_day", ALL_BACKENDS),
+    ("hourly rollup by date range", "SELECT * FROM hourly_sales WHERE day >= %s AND day < %s",
+     ("2024-01-01", "2024-02-01"), "hourly_sales", "PRIMARY", ALL_BACKENDS),
+    ("stock held on one product",
+     "SELECT SUM(quantity) FROM stock_reservations WHERE product_id = %s AND expires_at > %s",
+     (1, 0), "stock_reservations", "idx_reservations_product", ALL_BACKENDS),
+]
+
+
+def check_query_plans(db):
+    """
+    EXPLAIN each hot query and report whether it uses its index.
+    Returns [(description, status, detail)] where status is 'ok', 'warn'
+    (index considered but the optimizer preferred a scan, usually because
+    the table is still tiny) or 'fail' (index not even considered).
+    """
+    results = []
+    with db.cursor() as cur:
+        for description, sql, params, table, index, backends in HOT_QUERIES:
+            if db.backend.name not in backends:
+                continue
+            key, possible, access = db.backend.explain(cur, sql, params, table)
+            names = index if isinstance(index, tuple) else (index,)
+            if key in names:
+                results.append((description, 'ok', f"uses {key}"))
+            elif any(name in possible for name in names):
+                results.append((description, 'warn', f"{names[0]} considered, optimizer chose {key or 'a full scan'}"))
+            else:
+                results.append((description, 'fail', f"{names[0]} not used (key={key or 'none'}, type={access})"))
+    return results
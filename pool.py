@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections.
+
+    `connect` opens a new connection and `is_alive` checks (and may revive)
+    an idle one before it is handed out. Connections are opened lazily up
+    to `size`; after that callers wait for one to be released.
+    """
+
+    def __init__(self, connect, is_alive, size=5, timeout=10.0, retries=5, backoff=0.5, max_backoff=8.0):
+        self.connect = connect
+        self.is_alive = is_alive
+        self.size = size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+
+        # Metrics
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.reconnects = 0
+        self.failures = 0
+
+    def _open(self, retries=None):
+        """Open a connection, retrying with exponential backoff"""
+        retries = self.retries if retries is None else retries
+        delay = self.backoff
+        for attempt in range(retries + 1):
+            try:
+                return self.connect()
+            except Exception as err:
+                with self.lock:
+                    self.failures += 1
+                if attempt == retries:
+                    raise
+                print(f"Connection failed ({err}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def acquire(self, retries=None, timeout=None):
+        """`retries` and `timeout` override the pool's own for callers that must not wait long"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        conn = None
+        while conn is None:
+            try:
+                conn = self.idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self.lock:
+                can_open = self.created < self.size
+                if can_open:
+                    self.created += 1
+            if can_open:
+                try:
+                    conn = self._open(retries)
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise PoolTimeout(f"No database connection available after {timeout}s")
+            # Wake up now and then in case a broken connection freed a slot
+            try:
+                conn = self.idle.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                pass
+
+        if not self.is_alive(conn):
+            # Dropped while idle (server restart, network blip): replace it
+            self._discard(conn)
+            with self.lock:
+                self.reconnects += 1
+                self.created += 1
+            try:
+                conn = self._open(retries)
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    def adopt(self, conn):
+        """Take over a connection opened outside the pool (e.g. the start-up check)"""
+        with self.lock:
+            full = self.created >= self.size
+            if not full:
+                self.created += 1
+        if full:
+            conn.close()
+        else:
+            self.idle.put(conn)
+
+    def release(self, conn, broken=False):
+        with self.lock:
+            self.in_use -= 1
+        if broken:
+            self._discard(conn)
+        else:
+            self.idle.put(conn)
+
+    def _discard(self, conn):
+        with self.lock:
+            self.created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self, broken_on=(Exception,), retries=None, timeout=None):
+        """Borrow a connection; it is dropped instead of reused if `broken_on` is raised"""
+        conn = self.acquire(retries, timeout)
+        broken = False
+        try:
+            yield conn
+        except broken_on:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'open': self.created,
+                'in_use': self.in_use,
+                'idle': self.idle.qsize(),
+                'acquired': self.acquired,
+                'avg_wait_ms': (self.total_wait / self.acquired * 1000) if self.acquired else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'reconnects': self.reconnects,
+                'failures': self.failures,
+            }
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,339 @@
+"""
+Exact bill pricing: per-category GST, line and bill discounts, and
+configurable rounding.
+
+Everything is integer arithmetic: money in paise and percentages in
+basis points (hundredths of a percent, so 18% is 1800 and 2.5% is 250).
+A bill is worked out in this order:
+
+    gross      price x qty for each line
+    line disc  the line's own discount, rounded on the line
+    net        gross - line discount; the bill subtotal is the sum of these
+    discount   the bill discount on the subtotal, shared out over the lines
+               in proportion to their net (the largest lines take the odd
+               paise) so GST is charged on what the customer pays per line
+    tax        taxable x the line's GST rate, rounded per line or once per
+               bill (TAX_ROUNDING)
+    round off  the grand total rounded to a multiple of ROUND_TOTAL_TO
+
+price_bill() prices one bill in plain Python, for checkout. While a bill
+is rung up, cart_totals() keeps the till's totals from the cart's running
+sums, so each scan prices one line rather than the whole cart.
+price_lines() prices any number of bills at once on numpy arrays and
+agrees with price_bill to the paisa; price_carts() and reconcile() are
+built on it.
+"""
+from cart import from_minor, to_basis_points
+from config import GST_RATES, DEFAULT_GST_RATE, PRICE_ROUNDING, TAX_ROUNDING, ROUND_TOTAL_TO
+
+ROUNDING_MODES = ("half_up", "half_even", "down", "up")
+FULL = 10000  # 100% in basis points
+
+
+def divide(n, d, mode):
+    """
+    n / d rounded to a whole number by `mode`, for non-negative n and
+    positive d. Works on Python ints and on numpy integer arrays alike.
+    """
+    if mode == "down":
+        return n // d
+    if mode == "up":
+        return -(-n // d)
+    q, r = n // d, n % d
+    if mode == "half_up":
+        return q + (2 * r >= d)
+    # half_even: exact halves go to the even neighbour
+    return q + ((2 * r > d) | ((2 * r == d) & (q % 2 == 1)))
+
+
+def group_sum(np, groups, values, n):
+    """Per-group totals of an int64 array (np.bincount would go through float64)"""
+    out = np.zeros(n, dtype=np.int64)
+    np.add.at(out, groups, values)
+    return out
+
+
+class PricingEngine:
+    def __init__(self, gst_rates=GST_RATES, default_rate=DEFAULT_GST_RATE, rounding=PRICE_ROUNDING,
+                 tax_rounding=TAX_ROUNDING, round_total_to=ROUND_TOTAL_TO):
+        if rounding not in ROUNDING_MODES:
+            raise ValueError(f"Unknown rounding mode {rounding!r}")
+        if tax_rounding not in ("line", "bill"):
+            raise ValueError(f"Unknown tax rounding {tax_rounding!r}")
+        self.rates = {category.lower(): to_basis_points(rate) for category, rate in gst_rates.items()}
+        self.default_rate = to_basis_points(default_rate)
+        self.rounding = rounding
+        self.tax_rounding = tax_rounding
+        self.round_total_to = int(round_total_to)
+
+    def rate_for(self, category):
+        """GST rate in basis points for a product category"""
+        return self.rates.get((category or "").lower(), self.default_rate)
+
+    def _round_total(self, total):
+        step = self.round_total_to
+        return total if step <= 1 else divide(total, step, self.rounding) * step
+
+    # --- One bill ---
+    def price_bill(self, lines, discount_percent=0, tax_percent=None):
+        """
+        Price one bill. `lines` are (price paise, qty, line discount bp,
+        category); `tax_percent` None means GST by category. Returns a dict
+        of paise: gross, line_discount, subtotal, discount, tax, round_off,
+        grand_total, and 'lines' with each line's net, bill_discount,
+        taxable, rate and tax (None when tax is rounded on the bill).
+        """
+        mode = self.rounding
+        flat = None if tax_percent is None else to_basis_points(tax_percent)
+        priced = []
+        for price, qty, line_bp, category in lines:
+            gross = price * qty
+            line_discount = divide(gross * line_bp, FULL, mode)
+            priced.append({'gross': gross, 'line_discount': line_discount, 'net': gross - line_discount,
+                           'rate': self.rate_for(category) if flat is None else flat})
+        subtotal = sum(line['net'] for line in priced)
+        discount = divide(subtotal * to_basis_points(discount_percent), FULL, mode)
+
+        # Share the bill discount out; the remainder goes a paisa at a time to the largest lines
+        shared = 0
+        for line in priced:
+            line['bill_discount'] = discount * line['net'] // subtotal if subtotal else 0
+            shared += line['bill_discount']
+        for i in sorted(range(len(priced)), key=lambda i: (-priced[i]['net'], i))[:discount - shared]:
+            priced[i]['bill_discount'] += 1
+
+        for line in priced:
+            line['taxable'] = line['net'] - line['bill_discount']
+            line['tax'] = divide(line['taxable'] * line['rate'], FULL, mode) if self.tax_rounding == "line" else None
+        if self.tax_rounding == "line":
+            tax = sum(line['tax'] for line in priced)
+        else:
+            tax = divide(sum(line['taxable'] * line['rate'] for line in priced), FULL, mode)
+
+        total = subtotal - discount + tax
+        grand_total = self._round_total(total)
+        return {
+            'gross': sum(line['gross'] for line in priced),
+            'line_discount': sum(line['line_discount'] for line in priced),
+            'subtotal': subtotal,
+            'discount': discount,
+            'tax': tax,
+            'round_off': grand_total - total,
+            'grand_total': grand_total,
+            'lines': priced,
+        }
+
+    def price_cart(self, cart, discount_percent=0, tax_percent=None):
+        return self.price_bill([(line.price, line.qty, line.discount, line.category)
+                                for line in cart.lines.values()], discount_percent, tax_percent)
+
+    # --- Running totals ---
+    def line_pricer(self, tax_percent=None):
+        """
+        (pricer, key) for Cart.set_pricer. The pricer gives one cart line's
+        cart.FIGURES: gross, line discount, net, GST on the net rounded on
+        the line, and net x rate for GST rounded on the bill.
+        """
+        flat = None if tax_percent is None else to_basis_points(tax_percent)
+        mode = self.rounding
+
+        def price_line(line):
+            gross = line.price * line.qty
+            line_discount = divide(gross * line.discount, FULL, mode)
+            net = gross - line_discount
+            rate = self.rate_for(line.category) if flat is None else flat
+            return gross, line_discount, net, divide(net * rate, FULL, mode), net * rate
+        return price_line, (id(self), flat)
+
+    def cart_totals(self, cart, discount_percent=0, tax_percent=None):
+        """
+        The totals price_cart would give (without 'lines'). With no bill
+        discount they come straight from the cart's running sums; a bill
+        discount is shared out over every line, so the cart is then priced
+        in full.
+        """
+        if to_basis_points(discount_percent):
+            bill = self.price_cart(cart, discount_percent, tax_percent)
+            del bill['lines']
+            return bill
+        cart.set_pricer(*self.line_pricer(tax_percent))
+        sums = cart.totals
+        tax = sums['tax'] if self.tax_rounding == "line" else divide(sums['weighted'], FULL, self.rounding)
+        total = sums['net'] + tax
+        grand_total = self._round_total(total)
+        return {
+            'gross': sums['gross'],
+            'line_discount': sums['line_discount'],
+            'subtotal': sums['net'],
+            'discount': 0,
+            'tax': tax,
+            'round_off': grand_total - total,
+            'grand_total': grand_total,
+        }
+
+    # --- Many bills ---
+    def price_lines(self, bills, prices, qtys, line_discounts, rates, bill_discounts=None,
+                    bill_discount_minor=None, n_bills=None):
+        """
+        Price many bills in one vectorized pass. Each argument is an array
+        with one entry per line: bills (bill number 0..n-1), prices (paise),
+        qtys, line_discounts (bp) and rates (GST bp). The bill discount is
+        per bill, either as a rate (bill_discounts, bp) or as an amount
+        already charged (bill_discount_minor, paise). Returns a dict of
+        int64 arrays: per bill gross, line_discount, subtotal, discount,
+        tax, round_off and grand_total; per line net, taxable and tax.
+        """
+        import numpy as np
+
+        mode = self.rounding
+        bills = np.asarray(bills, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.int64)
+        qtys = np.asarray(qtys, dtype=np.int64)
+        line_discounts = np.asarray(line_discounts, dtype=np.int64)
+        rates = np.asarray(rates, dtype=np.int64)
+        n = int(n_bills if n_bills is not None else (bills.max() + 1 if len(bills) else 0))
+
+        gross = prices * qtys
+        line_discount = divide(gross * line_discounts, FULL, mode)
+        net = gross - line_discount
+        subtotal = group_sum(np, bills, net, n)
+        if bill_discount_minor is not None:
+            discount = np.asarray(bill_discount_minor, dtype=np.int64)
+        elif bill_discounts is not None:
+            discount = divide(subtotal * np.asarray(bill_discounts, dtype=np.int64), FULL, mode)
+        else:
+            discount = np.zeros(n, dtype=np.int64)
+
+        # Proportional shares, then the odd paise to each bill's largest lines (same rule as price_bill)
+        share = discount[bills] * net // np.maximum(subtotal, 1)[bills]
+        remainder = discount - group_sum(np, bills, share, n)
+        order = np.lexsort((np.arange(len(net)), -net, bills))
+        ordered_bills = bills[order]
+        rank = np.arange(len(net)) - np.searchsorted(ordered_bills, ordered_bills, side="left")
+        extra = np.zeros(len(net), dtype=np.int64)
+        extra[order] = rank < remainder[ordered_bills]
+        taxable = net - share - extra
+
+        if self.tax_rounding == "line":
+            line_tax = divide(taxable * rates, FULL, mode)
+            tax = group_sum(np, bills, line_tax, n)
+        else:
+            line_tax = None
+            tax = divide(group_sum(np, bills, taxable * rates, n), FULL, mode)
+
+        total = subtotal - discount + tax
+        grand_total = self._round_total(total)
+        return {
+            'gross': group_sum(np, bills, gross, n),
+            'line_discount': group_sum(np, bills, line_discount, n),
+            'subtotal': subtotal,
+            'discount': discount,
+            'tax': tax,
+            'round_off': grand_total - total,
+            'grand_total': grand_total,
+            'net': net,
+            'taxable': taxable,
+            'line_tax': line_tax,
+        }
+
+    def price_carts(self, carts, discount_percents=None, tax_percent=None):
+        """Re-price many carts at once (e.g. after a GST change); returns price_lines' per-bill arrays"""
+        flat = None if tax_percent is None else to_basis_points(tax_percent)
+        bills, prices, qtys, line_discounts, rates = [], [], [], [], []
+        for n, cart in enumerate(carts):
+            for line in cart.lines.values():
+                bills.append(n)
+                prices.append(line.price)
+                qtys.append(line.qty)
+                line_discounts.append(line.discount)
+                rates.append(self.rate_for(line.category) if flat is None else flat)
+        bill_discounts = [to_basis_points(pct) for pct in (discount_percents or [0] * len(carts))]
+        return self.price_lines(bills, prices, qtys, line_discounts, rates, bill_discounts, n_bills=len(carts))
+
+
+def financials(bill):
+    """
+    A priced bill as the rupee amounts stored with a sale. The subtotal is
+    before any discount and the discount is the line discounts plus the
+    bill discount, so subtotal - discount + tax + round_off = grand_total;
+    line_discount is the part taken on the lines.
+    """
+    money = {
+        'subtotal': bill['gross'],
+        'discount': bill['line_discount'] + bill['discount'],
+        'tax': bill['tax'],
+        'grand_total': bill['grand_total'],
+        'round_off': bill['round_off'],
+        'line_discount': bill['line_discount'],
+    }
+    return {key: float(from_minor(value)) for key, value in money.items()}
+
+
+RECONCILE_COLUMNS = ["invoice_id", "subtotal", "line_drift", "total_drift", "tax_drift", "over_price"]
+RECONCILE_SQL = """
+    SELECT i.invoice_id, i.price, i.quantity, i.total, p.category
+    FROM sale_items i JOIN sales s ON s.invoice_id = i.invoice_id
+    LEFT JOIN products p ON p.id = i.product_id
+    {clause}
+    ORDER BY i.id
+"""
+
+
+def reconcile(db, engine=None, start=None, end=None, tax_percent=None):
+    """
+    Recompute stored invoices in paise and report where they disagree, one
+    row per invoice:
+        line_drift   sum of price x qty over the lines - the stored subtotal
+        total_drift  subtotal - discount + tax - grand_total, beyond the
+                     round-off the current settings allow
+        tax_drift    GST under the current rates (or one `tax_percent`)
+                     applied to the stored lines and discount - stored tax
+        over_price   a line total above price x qty
+    Line totals are stored after their line discount, so what they fall
+    short of price x qty is the line discount and the rest of the stored
+    discount is the bill discount. Returns a DataFrame (empty when nothing
+    was sold in the range).
+    """
+    import numpy as np
+    import pandas as pd
+    from database import date_filter
+
+    engine = engine or PricingEngine()
+    clause, params = date_filter("s.date", start, end)
+    items = db.read_sql(RECONCILE_SQL.format(clause=clause), params)
+    sales = db.read_sql(f"""
+        SELECT s.invoice_id, s.subtotal, s.discount, s.tax, s.grand_total FROM sales s {clause}
+    """, params)
+    if sales.empty:
+        return pd.DataFrame(columns=RECONCILE_COLUMNS)
+
+    def paise(column):
+        return np.rint(column.astype(float).to_numpy() * 100).astype(np.int64)
+
+    sales = sales.sort_values("invoice_id").reset_index(drop=True)
+    bills = sales['invoice_id'].to_numpy()
+    bill_of_line = np.searchsorted(bills, items['invoice_id'].to_numpy())
+    price, qty, total = paise(items['price']), items['quantity'].to_numpy(dtype=np.int64), paise(items['total'])
+    gross = price * qty
+    if tax_percent is None:
+        rates = np.array([engine.rate_for(c) for c in items['category'].fillna("")], dtype=np.int64)
+    else:
+        rates = np.full(len(items), to_basis_points(tax_percent), dtype=np.int64)
+
+    subtotal, discount, tax, grand_total = (paise(sales[c]) for c in ("subtotal", "discount", "tax", "grand_total"))
+    gross_total = group_sum(np, bill_of_line, gross, len(sales))
+    line_discount = gross_total - group_sum(np, bill_of_line, total, len(sales))
+    repriced = engine.price_lines(bill_of_line, total, np.ones(len(items), dtype=np.int64),
+                                  np.zeros(len(items), dtype=np.int64), rates,
+                                  bill_discount_minor=np.maximum(discount - line_discount, 0), n_bills=len(sales))
+    allowed = engine.round_total_to // 2
+    total_drift = subtotal - discount + tax - grand_total
+    result = pd.DataFrame({
+        'invoice_id': bills,
+        'subtotal': subtotal / 100,
+        'line_drift': (gross_total - subtotal) / 100,
+        'total_drift': np.where(np.abs(total_drift) <= allowed, 0, total_drift) / 100,
+        'tax_drift': (repriced['tax'] - tax) / 100,
+        'over_price': group_sum(np, bill_of_line, (total > gross).astype(np.int64), len(sales)) > 0,
+    }, columns=RECONCILE_COLUMNS)
+    return result
@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import metrics
+from analytics import SalesAnalytics
+from stock_watch import reorder_suggestions
+from config import REPORT_WORKERS, REPORT_CACHE_SIZE
+
+
+class ReportJob:
+    """A report being worked out; the UI polls `done`, then reads `result` or `error`"""
+
+    def __init__(self, name, key, stamps):
+        self.name = name
+        self.key = key
+        self.stamps = stamps   # data versions the result is based on
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class ReportEngine:
+    """
+    Runs reports on a small thread pool and caches their results by report
+    name and arguments.
+
+    Each report names the tables it reads. ShopDatabase stamps
+    data_versions whenever sales or products change (a checkout, a product
+    edit, an import, or a change seen from another till), and a cached
+    result is only served while those stamps are unchanged. The stamps are
+    read before a report starts, so a sale landing mid-report leaves a
+    result that is recomputed on the next request. Asking again for a
+    report that is still running joins the running job.
+    """
+
+    def __init__(self, db, reports, inventory, workers=REPORT_WORKERS, cache_size=REPORT_CACHE_SIZE):
+        self.db = db
+        self.cache_size = cache_size
+        self.reports = {}   # name -> (function, tables)
+        self.cache = {}     # key -> (stamps, result), oldest first
+        self.running = {}   # key -> ReportJob
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self.hits = 0
+        self.misses = 0
+
+        self.register("sales_summary", reports.sales_summary, tables=("sales",))
+        self.register("top_products", reports.top_products, tables=("sales",))
+        self.register("low_stock", inventory.low_stock, tables=("products",))
+        self.register("reorder", partial(reorder_suggestions, db), tables=("sales", "products"))
+        analytics = SalesAnalytics(db)
+        self.register("sales_heatmap", analytics.heatmap, tables=("sales",))
+        self.register("sales_compare", analytics.compare, tables=("sales",))
+        self.register("sales_trend", analytics.rolling, tables=("sales",))
+        # Category comes from the product table, so a re-categorised product invalidates it too
+        self.register("category_revenue", analytics.category_revenue, tables=("sales", "products"))
+        self.register("basket_trend", analytics.basket_trend, tables=("sales",))
+        metrics.registry.register_gauges("shop_report_cache", self.stats)
+
+    def register(self, name, fn, tables=("sales",)):
+        self.reports[name] = (fn, tuple(tables))
+
+    def submit(self, name, *args, **kwargs):
+        """Start a report (or reuse a cached or running one); returns its ReportJob"""
+        fn, tables = self.reports[name]
+        key = (name, args, tuple(sorted(kwargs.items())))
+        stamps = tuple(self.db.data_versions[table] for table in tables)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == stamps:
+                self.hits += 1
+                job = ReportJob(name, key, stamps)
+                job.result, job.cached = cached[1], True
+                job.finished.set()
+                return job
+            job = self.running.get(key)
+            if job is not None and job.stamps == stamps:
+                return job
+            self.misses += 1
+            job = self.running[key] = ReportJob(name, key, stamps)
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, name, *args, **kwargs):
+        """Blocking form, for callers already off the UI thread (the API's workers)"""
+        job = self.submit(name, *args, **kwargs)
+        job.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            with metrics.span("report_job", report=job.name):
+                job.result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Error running {job.name} report: {e}")
+            job.error = e
+        with self.lock:
+            if self.running.get(job.key) is job:
+                del self.running[job.key]
+            if job.error is None:
+                self.cache.pop(job.key, None)
+                self.cache[job.key] = (job.stamps, job.result)
+                while len(self.cache) > self.cache_size:
+                    del self.cache[next(iter(self.cache))]
+        job.finished.set()
+
+    def clear(self):
+        with self.lock:
+            self.cache = {}
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.cache), 'running': len(self.running), 'hits': self.hits,
+                    'misses': self.misses}
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,302 @@
+"""
+Billing, inventory and report operations with no UI attached.
+
+The Tkinter app (main.py) and the HTTP API (api.py) both go through
+these classes, so a bill is rung up, totalled and saved the same way
+whichever client asks. Failures the user should see are raised as
+ServiceError with a message that is safe to display.
+"""
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from cart import Cart, from_minor
+from database import InsufficientStockError, LockTimeout
+import metrics
+from invoice_ids import InvoiceIdGenerator
+from pricing import PricingEngine, financials
+from pool import PoolTimeout
+from config import RESERVATION_RETRY_SECONDS
+
+# Report periods -> function returning the first day included (None = all time)
+REPORT_PERIODS = {
+    "This Week": lambda today: today - timedelta(days=today.weekday()),
+    "This Month": lambda today: today.replace(day=1),
+    "Last 30 Days": lambda today: today - timedelta(days=29),
+    "This Year": lambda today: today.replace(month=1, day=1),
+    "Last 365 Days": lambda today: today - timedelta(days=364),
+    "All Time": lambda today: None,
+}
+
+
+CATEGORY_GST = "GST"  # Given in place of a tax rate to charge GST by product category
+
+
+class ServiceError(Exception):
+    """A request the shop cannot carry out"""
+
+
+class NotFound(ServiceError):
+    pass
+
+
+class OutOfStock(ServiceError):
+    pass
+
+
+class BillingService:
+    """
+    Cart, totals and checkout. With a SaleJournal, checkout confirms the
+    cart's stock holds, then is recorded locally and synced in the
+    background; without one it is written to the database directly,
+    where the stock guard is authoritative.
+    """
+
+    def __init__(self, db, journal=None, invoice_ids=None, invoice_queue=None, pricing=None):
+        self.db = db
+        self.journal = journal
+        self.invoice_ids = invoice_ids or InvoiceIdGenerator()
+        self.invoice_queue = invoice_queue
+        self.pricing = pricing or PricingEngine()
+        self.holds_paused_until = 0.0
+
+    def search(self, query):
+        # Served from the in-memory index, no database round-trip
+        return self.db.get_catalog().search(query)
+
+    def add_to_cart(self, cart, pid, qty, reserve=True, discount_percent=None):
+        """
+        Add a line, holding the stock for this cart (see ShopDatabase.reserve_stock)
+        so another till cannot sell the same units before checkout.
+        A discount_percent replaces the line's discount.
+        """
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            raise ServiceError("Invalid Quantity")
+        if qty <= 0:
+            raise ServiceError("Invalid Quantity")
+        if discount_percent is not None:
+            discount_percent = self._percent(discount_percent, "Line discount", maximum=100)
+        row = self.db.get_catalog().get(int(pid))
+        if row is None:
+            raise NotFound(f"No product with id {pid}")
+        wanted = cart.quantity_of(row[0]) + qty
+        ok, available = wanted <= int(row[4]), int(row[4])
+        if reserve:
+            held = self._hold(self.db.reserve_stock, cart.id, row[0], wanted)
+            if held is not None:
+                ok, available = held
+        if not ok:
+            raise OutOfStock(f"Insufficient Stock! Only {max(available, 0)} available.")
+        cart.add(row[0], row[1], row[3], qty, category=row[2])
+        if discount_percent is not None:
+            cart.set_discount(row[0], discount_percent)
+
+    def remove_from_cart(self, cart, pid):
+        """Drop a product's line and give its held stock back"""
+        cart.remove(pid)
+        self._hold(self.db.reserve_stock, cart.id, pid, 0)
+
+    def clear_cart(self, cart):
+        """Empty the cart and give its held stock back"""
+        if len(cart):
+            self._hold(self.db.release_stock, cart.id)
+        cart.clear()
+
+    def _hold(self, write, *args, busy=None):
+        """
+        Run a stock hold write, or return None if the database cannot take it.
+        Holds are best effort (they expire anyway): with the database down the
+        till goes by cached stock, and stops trying for RESERVATION_RETRY_SECONDS
+        so scanning is never held up by reconnects. If another till has the
+        product locked past RESERVATION_WAIT, this one hold is skipped, or
+        refused with the `busy` message when one is given.
+        """
+        if time.monotonic() < self.holds_paused_until:
+            return None
+        try:
+            return write(*args)
+        except (PoolTimeout,) + self.db.backend.connection_errors as e:
+            self.holds_paused_until = time.monotonic() + RESERVATION_RETRY_SECONDS
+            print(f"Error holding stock: {e}")
+            return None
+        except LockTimeout as e:
+            if busy:
+                raise ServiceError(busy)
+            print(f"Error holding stock: {e}")
+            return None
+
+    def cart_from_lines(self, lines):
+        """
+        Build a cart from [{'id': pid, 'qty': n}, ...] (API request bodies).
+        Nothing is reserved: the cart is quoted or checked out in the same
+        request, and the sale's own stock guard covers that.
+        """
+        cart = Cart()
+        for line in lines:
+            try:
+                self.add_to_cart(cart, line['id'], line.get('qty', 1), reserve=False,
+                                 discount_percent=line.get('discount_percent'))
+            except (KeyError, TypeError, AttributeError):
+                raise ServiceError("Each item needs an 'id' and a 'qty'")
+        return cart
+
+    def _percent(self, value, label, maximum=None):
+        try:
+            value = Decimal(str(value or 0))
+        except ArithmeticError:
+            raise ServiceError(f"{label} must be a number")
+        if not value.is_finite() or value < 0 or (maximum is not None and value > maximum):
+            raise ServiceError(f"{label} must be between 0 and {maximum}" if maximum else
+                               f"{label} cannot be negative")
+        return value
+
+    def price(self, cart, discount_percent=0, tax_percent=0):
+        """
+        Price the cart exactly (see pricing.py). tax_percent is one rate for
+        the whole bill; CATEGORY_GST (or None) charges GST by product
+        category instead. Returns the bill in paise, with each line's
+        figures under 'lines'.
+        """
+        return self.pricing.price_cart(cart, *self._rates(discount_percent, tax_percent))
+
+    def totals(self, cart, discount_percent=0, tax_percent=0):
+        """The bill's totals as financials(), from the cart's running totals (see PricingEngine.cart_totals)"""
+        return financials(self.pricing.cart_totals(cart, *self._rates(discount_percent, tax_percent)))
+
+    def _rates(self, discount_percent, tax_percent):
+        discount_percent = self._percent(discount_percent, "Discount", maximum=100)
+        if tax_percent is None or str(tax_percent).strip().upper() == CATEGORY_GST:
+            return discount_percent, None
+        return discount_percent, self._percent(tax_percent, "Tax")
+
+    def priced_items(self, cart, bill):
+        """(pid, name, price, qty, total) per line, total after any line discount"""
+        return [(line.pid, line.name, float(from_minor(line.price)), line.qty, float(from_minor(priced['net'])))
+                for line, priced in zip(cart.lines.values(), bill['lines'])]
+
+    @metrics.timed("checkout")
+    def checkout(self, cart, discount_percent=0, tax_percent=0):
+        """
+        Save the sale, consuming the cart's stock holds, and queue its PDF.
+        The cart is emptied for the next bill; returns the invoice dict.
+        """
+        if not len(cart):
+            raise ServiceError("Cannot generate bill for empty cart.")
+        bill = self.price(cart, discount_percent, tax_percent)
+        totals = financials(bill)
+
+        # The same product may be on several lines, so check the merged demand
+        catalog = self.db.get_catalog()
+        for pid, qty in cart.demand().items():
+            row = catalog.get(int(pid))
+            if row is None or qty > row[4]:
+                raise OutOfStock(f"Insufficient Stock for {row[1] if row else pid}!")
+
+        items = self.priced_items(cart, bill)
+        invoice_id = self.invoice_ids.next_id()
+        now = datetime.now()
+        if self.journal is not None:
+            # The journal sync cannot refuse a sale, so the cart's holds must cover
+            # it first; with the database unreachable the till sells on cached stock
+            try:
+                self._hold(self.db.hold_cart, cart.id, cart.demand(),
+                           busy="Another till is selling the same items. Please try again.")
+            except InsufficientStockError as e:
+                raise OutOfStock(f"{e}: another till holds the last units.")
+            # Durable on local disk before the cashier moves on; the database catches up
+            self.journal.record(invoice_id, items, totals, date=now.strftime("%Y-%m-%d %H:%M:%S"),
+                                cart_id=cart.id)
+        else:
+            sale = {'invoice_id': invoice_id, 'date': now.strftime("%Y-%m-%d %H:%M:%S"),
+                    'items': items, 'financials': totals, 'cart_id': cart.id}
+            try:
+                self.db.apply_sales([sale])
+            except InsufficientStockError:
+                # Another till sold the last units since our catalog was loaded
+                raise OutOfStock("Insufficient Stock! Another sale took the last units.")
+            if self.db.catalog is not None:
+                for pid, qty in cart.demand().items():
+                    self.db.catalog.adjust_stock(int(pid), -qty)
+
+        invoice = {
+            'invoice_id': invoice_id,
+            'date': now.strftime('%Y-%m-%d %H:%M'),
+            # item: (pid, name, price, qty, total)
+            'items': [(item[1], item[2], item[3], item[4]) for item in items],
+            **totals,
+        }
+        if self.invoice_queue is not None:
+            # PDFs render in background processes so the next bill can start now
+            self.invoice_queue.submit(invoice)
+        cart.clear()
+        return invoice
+
+
+class InventoryService:
+    def __init__(self, db):
+        self.db = db
+
+    def list_products(self, query=""):
+        return self.db.get_catalog().search(query) if query else self.db.get_catalog().all()
+
+    def get_product(self, pid):
+        row = self.db.get_catalog().get(int(pid))
+        if row is None:
+            raise NotFound(f"No product with id {pid}")
+        return row
+
+    def _fields(self, name, category, price, stock, min_stock):
+        try:
+            fields = (str(name).strip(), str(category).strip(), float(price), int(stock), int(min_stock))
+        except (TypeError, ValueError):
+            raise ServiceError("Invalid numeric values")
+        if not fields[0] or not fields[1]:
+            raise ServiceError("Name and category are required")
+        if fields[2] < 0 or fields[3] < 0 or fields[4] < 0:
+            raise ServiceError("Price and stock cannot be negative")
+        return fields
+
+    def add_product(self, name, category, price, stock, min_stock=10):
+        return self.db.add_product(*self._fields(name, category, price, stock, min_stock))
+
+    def update_product(self, pid, name, category, price, stock, min_stock):
+        self.get_product(pid)
+        self.db.update_product(int(pid), *self._fields(name, category, price, stock, min_stock))
+
+    def delete_product(self, pid):
+        self.get_product(pid)
+        self.db.delete_product(int(pid))
+
+    def low_stock(self):
+        # The catalog keeps the at-risk set as stock changes; nothing is scanned
+        return self.db.get_catalog().low_stock()
+
+
+class ReportService:
+    def __init__(self, db):
+        self.db = db
+
+    @metrics.timed("report", report="sales_summary")
+    def sales_summary(self, start=None, end=None):
+        # One row per day from the daily_sales rollup, not the whole sales table
+        df = self.db.get_daily_sales(start=start, end=end)
+        return {
+            'invoices': int(df['invoices'].sum()) if not df.empty else 0,
+            'revenue': float(df['revenue'].sum()) if not df.empty else 0.0,
+            'tax': float(df['tax'].sum()) if not df.empty else 0.0,
+            'discount': float(df['discount'].sum()) if not df.empty else 0.0,
+            'daily': [{'day': str(day)[:10], 'revenue': float(revenue), 'invoices': int(invoices)}
+                      for day, revenue, invoices in zip(df['day'], df['revenue'], df['invoices'])],
+        }
+
+    @metrics.timed("report", report="top_products")
+    def top_products(self, n=10, start=None, end=None, by="quantity"):
+        # Answered from the per-product daily rollup, not a sale_items scan
+        return [{'id': pid, 'name': name, 'quantity': int(qty), 'revenue': float(revenue)}
+                for pid, name, qty, revenue in self.db.get_top_products(n, start=start, end=end, by=by)]
+
+    def period_start(self, period, today=None):
+        if period not in REPORT_PERIODS:
+            raise ServiceError(f"Unknown report period {period!r}")
+        return REPORT_PERIODS[period](today or date.today())
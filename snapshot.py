@@ -0,0 +1,284 @@
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from database import date_filter
+from config import SNAPSHOT_DIR
+
+SNAPSHOT_FLUSH_ROWS = 200_000  # Rows read from the database and written out per batch
+
+SQL = {
+    'items': """
+        SELECT i.id, i.invoice_id, s.date, i.product_id, i.product_name, p.category, i.quantity, i.price, i.total
+        FROM sale_items i JOIN sales s ON s.invoice_id = i.invoice_id
+        LEFT JOIN products p ON p.id = i.product_id
+        {clause}
+        ORDER BY s.date, i.id
+    """,
+    'sales': "SELECT invoice_id, date, subtotal, tax, discount, grand_total FROM sales {clause} ORDER BY date",
+}
+DATE_COLUMN = {'items': "s.date", 'sales': "date"}
+COLUMNS = {
+    'items': ["item_id", "invoice_id", "date", "product_id", "product_name", "category", "quantity", "price",
+              "total"],
+    'sales': ["invoice_id", "date", "subtotal", "tax", "discount", "grand_total"],
+}
+MONEY = {"price", "total", "subtotal", "tax", "discount", "grand_total"}
+
+
+def month_range(month):
+    """First and last day of a YYYY-MM month"""
+    first = date.fromisoformat(f"{month}-01")
+    return first, (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+
+class SalesSnapshot:
+    """
+    Columnar copy of the sales history for trend analysis, so bulk reads
+    never page through the transactional tables.
+
+    Two datasets, each one uncompressed Arrow IPC (Feather v2) file per
+    month under {directory}/{kind}/month=YYYY-MM/:
+        items  one row per line: item_id, invoice_id, date, product_id,
+               product_name, category, quantity, price, total
+        sales  one row per invoice: invoice_id, date, subtotal, tax,
+               discount, grand_total
+    Money is float64: this is for trends, the database stays the ledger.
+
+    Only closed months (before the current one) are copied. sync() compares
+    each month's daily_sales totals with those it was last written with and
+    rewrites just the months that moved, read back by date; a late journal
+    replay or a sale committed out of id order changes its month's totals,
+    so nothing is missed. history() syncs first, so readers never run it
+    by hand. Rewritten months get a new file name and state.json is
+    swapped last, so readers never see a half-written month and files
+    still mapped by a reader are left alone. Readers memory-map the files,
+    so loads are zero-copy; load() prunes months outside the date range
+    and pushes the date filter into the scan.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.schemas = None
+        self.state = self._read_state()
+
+    @property
+    def pa(self):
+        # Imported on first use, so the rest of the app never needs it
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError("The sales snapshot needs pyarrow (pip install pyarrow)")
+        return pyarrow
+
+    def schema(self, kind):
+        if self.schemas is None:
+            pa = self.pa
+            money, stamp = pa.float64(), pa.timestamp("s")
+            types = {
+                'items': [pa.int64(), pa.string(), stamp, pa.int64(), pa.string(), pa.string(), pa.int64(),
+                          money, money],
+                'sales': [pa.string(), stamp, money, money, money, money],
+            }
+            self.schemas = {kind: pa.schema(list(zip(COLUMNS[kind], types[kind]))) for kind in types}
+        return self.schemas[kind]
+
+    # --- State ---
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, "state.json")
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {'seq': 0, 'files': {'items': {}, 'sales': {}}}
+        # months: YYYY-MM -> the daily_sales totals the month was written with
+        state.setdefault('months', {})
+        return state
+
+    def _write_state(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def month_path(self, kind, month, name):
+        return os.path.join(self.directory, kind, f"month={month}", name)
+
+    # --- Writing ---
+    @staticmethod
+    def open_month(today=None):
+        """The month still taking sales (YYYY-MM); the snapshot holds the months before it"""
+        return (today or date.today()).strftime("%Y-%m")
+
+    def _totals(self, db, before):
+        """[invoices, revenue] per closed month, from the daily rollup"""
+        totals = {}
+        for day, invoices, revenue in db.query(
+                "SELECT day, invoices, revenue FROM daily_sales WHERE day < %s", (f"{before}-01",)):
+            month = totals.setdefault(str(day)[:7], [0, 0])
+            month[0] += int(invoices)
+            month[1] += revenue
+        return {month: [invoices, str(revenue)] for month, (invoices, revenue) in totals.items()}
+
+    def sync(self, db, today=None):
+        """Rewrite the closed months whose sales changed since they were copied; returns how many"""
+        with self.lock:
+            self.state = self._read_state()
+            totals = self._totals(db, self.open_month(today))
+            stale = [month for month in sorted(totals) if self.state['months'].get(month) != totals[month]]
+            for month in stale:
+                self._write_month(db, month, totals[month])
+            written = set(self.state['months']).union(*self.state['files'].values())
+            gone = [month for month in written if month not in totals]
+            if gone:
+                for month in gone:
+                    self.state['months'].pop(month, None)
+                    for files in self.state['files'].values():
+                        files.pop(month, None)
+                self._write_state()
+            self._remove_stale_files()
+            return len(stale)
+
+    def _table(self, kind, rows):
+        pa = self.pa
+        schema = self.schema(kind)
+        columns = list(zip(*rows)) or [()] * len(schema)
+        return pa.Table.from_arrays(
+            [pa.array([float(v) for v in col] if field.name in MONEY else col, type=field.type)
+             for col, field in zip(columns, schema)], schema=schema)
+
+    def _write_month(self, db, month, totals):
+        pa = self.pa
+        seq = self.state['seq'] + 1
+        start, end = month_range(month)
+        for kind, sql in SQL.items():
+            clause, params = date_filter(DATE_COLUMN[kind], start, end)
+            name = f"part-{seq:06d}.arrow"
+            path = self.month_path(kind, month, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Uncompressed so readers can map it without copying
+            with pa.OSFile(f"{path}.tmp", "wb") as sink, pa.ipc.new_file(sink, self.schema(kind)) as writer:
+                for _, rows in db.stream(sql.format(clause=clause), params, SNAPSHOT_FLUSH_ROWS):
+                    writer.write_table(self._table(kind, rows))
+            os.replace(f"{path}.tmp", path)
+            self.state['files'][kind][month] = name
+        self.state['months'][month] = totals
+        self.state['seq'] = seq
+        self._write_state()
+
+    def _remove_stale_files(self):
+        """Delete month files that state.json no longer points at"""
+        for kind, files in self.state['files'].items():
+            root = os.path.join(self.directory, kind)
+            if not os.path.isdir(root):
+                continue
+            for entry in os.listdir(root):
+                month = entry.split("=", 1)[-1]
+                for name in os.listdir(os.path.join(root, entry)):
+                    if name != files.get(month):
+                        try:
+                            os.remove(os.path.join(root, entry, name))
+                        except OSError:
+                            pass  # Still mapped by a reader (Windows); next sync tries again
+
+    # --- Reading ---
+    def months(self, kind="items"):
+        return sorted(self._read_state()['files'][kind])
+
+    def read_month(self, kind, month):
+        """One month as a Table backed by a memory map of its file (zero-copy)"""
+        pa = self.pa
+        name = self._read_state()['files'][kind][month]
+        return pa.ipc.open_file(pa.memory_map(self.month_path(kind, month, name))).read_all()
+
+    def dataset(self, kind="items"):
+        """A pyarrow Dataset over the current month files, memory-mapped, partitioned by month"""
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        pa = self.pa
+        files = self._read_state()['files'][kind]
+        paths = [self.month_path(kind, month, name) for month, name in sorted(files.items())]
+        schema = self.schema(kind).append(pa.field("month", pa.string()))
+        return ds.dataset(paths, schema=schema, format="ipc", filesystem=fs.LocalFileSystem(use_mmap=True),
+                          partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"),
+                          partition_base_dir=os.path.join(self.directory, kind))
+
+    def load(self, kind="items", start=None, end=None, columns=None, filter=None):
+        """
+        Rows sold between `start` and `end` (inclusive dates, YYYY-MM-DD or
+        date) as a pyarrow Table. Months outside the range are skipped
+        without being opened. `filter` is an extra pyarrow.dataset expression.
+        """
+        import pyarrow.dataset as ds
+
+        pa = self.pa
+        conditions = []
+        if start:
+            start = date.fromisoformat(str(start)[:10])
+            conditions += [ds.field("month") >= start.strftime("%Y-%m"),
+                           ds.field("date") >= pa.scalar(datetime.combine(start, datetime.min.time()),
+                                                         pa.timestamp("s"))]
+        if end:
+            end = date.fromisoformat(str(end)[:10])
+            conditions += [ds.field("month") <= end.strftime("%Y-%m"),
+                           ds.field("date") < pa.scalar(datetime.combine(end + timedelta(days=1),
+                                                                     datetime.min.time()), pa.timestamp("s"))]
+        if filter is not None:
+            conditions.append(filter)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return self.dataset(kind).to_table(columns=columns, filter=expression)
+
+    def to_pandas(self, kind="items", start=None, end=None, columns=None, filter=None):
+        return self.load(kind, start, end, columns, filter).to_pandas()
+
+    def stats(self):
+        months = sorted(self._read_state()['months'])
+        return {'months': len(months), 'through': months[-1] if months else None}
+
+    def history(self, db, kind="items", start=None, end=None, columns=None, today=None):
+        """
+        Rows sold between `start` and `end` as a DataFrame with the snapshot's
+        columns: closed months from the snapshot (synced first), the open
+        month from the database. Without pyarrow it is all read from the
+        database.
+        """
+        import pandas as pd
+
+        start = str(start)[:10] if start else None
+        end = str(end)[:10] if end else None
+        columns = columns or COLUMNS[kind]
+        try:
+            self.pa
+        except RuntimeError:
+            split = None  # The database answers for every month
+        else:
+            split = f"{self.open_month(today)}-01"
+        parts = []
+        if split is not None and (start is None or start < split):
+            self.sync(db, today)
+            last_closed = (date.fromisoformat(split) - timedelta(days=1)).isoformat()
+            parts.append(self.to_pandas(kind, start, min(end or last_closed, last_closed), columns))
+        if split is None or end is None or end >= split or not parts:
+            if split is not None:
+                start = max(start or split, split)
+            parts.append(self._from_database(db, kind, start, end, columns))
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+    def _from_database(self, db, kind, start, end, columns):
+        import pandas as pd
+
+        clause, params = date_filter(DATE_COLUMN[kind], start, end)
+        df = db.read_sql(SQL[kind].format(clause=clause), params)
+        df.columns = COLUMNS[kind]
+        for name in MONEY.intersection(df.columns):
+            df[name] = df[name].astype(float)
+        df['date'] = pd.to_datetime(df['date'])
+        return df[columns]
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+import metrics
+from config import VELOCITY_DAYS, REORDER_LEAD_DAYS, REORDER_COVER_DAYS, STOCK_ALERTS_KEPT
+
+PRODUCT_FIELDS = ["id", "name", "category", "price", "stock", "min_stock"]
+
+
+def forecast(db, days=VELOCITY_DAYS, lead_days=REORDER_LEAD_DAYS, cover_days=REORDER_COVER_DAYS):
+    """
+    Every product with its sales velocity (units/day over the last `days`),
+    days until it runs out at that rate, and a reorder quantity that covers
+    `lead_days + cover_days` of sales on top of min_stock. One grouped read
+    of the per-product rollup and whole-column numpy arithmetic; most
+    urgent first.
+    """
+    import numpy as np
+    import pandas as pd
+
+    products = pd.DataFrame.from_records(db.get_catalog().all(), columns=PRODUCT_FIELDS)
+    since = date.today() - timedelta(days=days - 1)
+    sold = db.read_sql("""
+        SELECT product_id AS id, SUM(quantity) AS sold FROM product_daily_sales
+        WHERE day >= %s GROUP BY product_id
+    """, (since.isoformat(),))
+    df = products.merge(sold, on="id", how="left") if not sold.empty else products.assign(sold=0)
+
+    sold = df['sold'].fillna(0).to_numpy(dtype=float)
+    stock = df['stock'].to_numpy(dtype=float)
+    min_stock = df['min_stock'].fillna(0).to_numpy(dtype=float)
+    velocity = sold / days
+    days_left = np.divide(np.maximum(stock, 0), velocity, out=np.full(len(df), np.inf), where=velocity > 0)
+    reorder = np.maximum(np.ceil(velocity * (lead_days + cover_days) + min_stock - stock), 0)
+
+    df['sold'] = sold.astype(int)
+    df['velocity'] = velocity.round(2)
+    df['days_left'] = days_left.round(1)
+    df['reorder_qty'] = reorder.astype(int)
+    return df.sort_values(["days_left", "stock"], kind="stable").reset_index(drop=True)
+
+
+def reorder_suggestions(db, days=VELOCITY_DAYS, lead_days=REORDER_LEAD_DAYS, cover_days=REORDER_COVER_DAYS):
+    """Products that are low or will be before a reorder arrives, as plain dicts"""
+    df = forecast(db, days, lead_days, cover_days)
+    df = df[(df['reorder_qty'] > 0) | (df['stock'] <= df['min_stock'])]
+    return [{'id': int(pid), 'name': name, 'stock': int(stock), 'min_stock': int(min_stock),
+             'velocity': float(velocity), 'days_left': None if days_left == float("inf") else float(days_left),
+             'reorder_qty': int(qty)}
+            for pid, name, stock, min_stock, velocity, days_left, qty in zip(
+                df['id'], df['name'], df['stock'], df['min_stock'], df['velocity'], df['days_left'],
+                df['reorder_qty'])]
+
+
+def stock_state(row):
+    if row is None or row[5] is None or row[4] > row[5]:
+        return None
+    return "out" if row[4] <= 0 else "low"
+
+
+class StockWatcher:
+    """
+    Raises an alert when a product drops to its minimum stock, when it
+    runs out, and when it is restocked; each state change is raised once.
+
+    The at-risk set itself is kept by the CatalogIndex, which every stock
+    change already passes through (checkouts, journal replays, product
+    edits, imports, and other tills' changes picked up by
+    refresh_catalog), so nothing here re-reads the products table. The
+    catalog calls back on the thread that made the change; alerts are
+    queued until the UI collects them with take_alerts().
+    """
+
+    def __init__(self, db, keep=STOCK_ALERTS_KEPT):
+        self.db = db
+        self.lock = threading.Lock()
+        self.alerts = deque(maxlen=keep)
+        catalog = db.get_catalog()
+        with catalog.lock:
+            # Products already low when the till starts are shown by the report, not alerted
+            self.states = {row[0]: stock_state(row) for row in catalog.low_stock()}
+            catalog.add_listener(self.on_change)
+        metrics.registry.register_gauges("shop_low_stock", self.stats)
+
+    def on_change(self, pid, row, at_risk):
+        state = stock_state(row)
+        with self.lock:
+            previous = self.states.pop(pid, None)
+            if state is not None:
+                self.states[pid] = state
+            if state == previous or row is None:
+                return  # No news, or a deleted product that needs no restocking
+            self.alerts.append({'id': pid, 'name': row[1], 'stock': row[4], 'min_stock': row[5],
+                                'kind': state or "restocked", 'at': time.time()})
+
+    def take_alerts(self):
+        """Alerts raised since the last call, oldest first"""
+        with self.lock:
+            alerts = list(self.alerts)
+            self.alerts.clear()
+        return alerts
+
+    def at_risk(self):
+        return self.db.get_catalog().low_stock()
+
+    def forecast(self, **kwargs):
+        return forecast(self.db, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {'at_risk': len(self.db.get_catalog().at_risk), 'unread_alerts': len(self.alerts)}
@@ -0,0 +1,50 @@
+"""
+Fixtures shared by the tests. Every database test runs once per backend:
+SQLite on a temporary file, and MySQL on a throwaway database (dropped
+afterwards) when a server is reachable with the SHOP_DB_* settings.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import MySQLBackend, SQLiteBackend
+from database import ShopDatabase
+
+
+def mysql_backend():
+    backend = MySQLBackend(database=f"shop_test_{uuid.uuid4().hex[:8]}")
+    try:
+        backend.create_database()
+    except Exception as e:
+        pytest.skip(f"MySQL not reachable: {e}")
+    return backend
+
+
+def drop_mysql_database(backend):
+    conn = backend.connector.connect(host=backend.host, port=backend.port, user=backend.user,
+                                     password=backend.password)
+    try:
+        conn.cursor().execute(f"DROP DATABASE IF EXISTS {backend.database}")
+    finally:
+        conn.close()
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteBackend(str(tmp_path / "shop.db"))
+    else:
+        backend = mysql_backend()
+        yield backend
+        drop_mysql_database(backend)
+
+
+@pytest.fixture
+def db(backend):
+    db = ShopDatabase(backend)
+    yield db
+    db.close()
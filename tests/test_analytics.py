@@ -0,0 +1,82 @@
+"""
+SalesAnalytics from the rollup tables: the weekday-by-hour heatmap,
+period comparisons, rolling averages and revenue by category.
+"""
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from analytics import SalesAnalytics, year_before
+from services import ServiceError
+
+from test_database import make_sale
+
+
+@pytest.fixture
+def shop(db):
+    tea = db.add_product("Green Tea", "Groceries", 100, 1000, 5)
+    pen = db.add_product("Ball Pen", "Stationery", 10, 1000, 20)
+    db.apply_sales([
+        make_sale("INV-1", "2024-03-04 09:15:00", [(tea, "Green Tea", 100, 2)]),   # Monday
+        make_sale("INV-2", "2024-03-04 09:45:00", [(pen, "Ball Pen", 10, 5)]),
+        make_sale("INV-3", "2024-03-06 18:00:00", [(tea, "Green Tea", 100, 1)]),   # Wednesday
+        make_sale("INV-4", "2024-03-11 09:30:00", [(tea, "Green Tea", 100, 3)]),   # Monday after
+        make_sale("INV-5", "2023-03-11 12:00:00", [(pen, "Ball Pen", 10, 1)]),     # A year before
+    ])
+    return SalesAnalytics(db)
+
+
+def test_heatmap(shop):
+    heatmap = shop.heatmap("2024-03-01", "2024-03-31")
+    grid = heatmap['grid']
+    assert (len(grid), len(grid[0])) == (7, 24)
+    assert grid[0][9] == 550.0   # Mondays at 9
+    assert grid[2][18] == 100.0  # Wednesday at 18
+    assert sum(map(sum, grid)) == 650.0
+    assert heatmap['busiest'] == {'weekday': "Mon", 'hour': 9, 'revenue': 550.0}
+    assert shop.heatmap("2024-03-01", "2024-03-31", value="invoices")['grid'][0][9] == 3.0
+    with pytest.raises(ServiceError):
+        shop.heatmap(value="profit")
+
+
+def test_heatmap_of_a_quiet_period(shop):
+    heatmap = shop.heatmap("2025-01-01", "2025-01-31")
+    assert heatmap['busiest'] is None
+    assert not any(map(any, heatmap['grid']))
+
+
+def test_compare_against_the_week_before(shop):
+    result = shop.compare("2024-03-11", "2024-03-13", against="week")
+    assert (result['previous_start'], result['previous_end']) == ("2024-03-04", "2024-03-06")
+    assert result['current']['revenue'] == 300.0
+    assert result['previous'] == {'revenue': 350.0, 'tax': 0.0, 'discount': 0.0, 'invoices': 3}
+    assert result['change_pct'] == {'revenue': -14.3, 'invoices': -66.7}
+    assert [day['previous'] for day in result['daily']] == [250.0, 0.0, 100.0]
+
+
+def test_compare_against_the_year_before(shop):
+    result = shop.compare("2024-03-11", "2024-03-11", against="year")
+    assert result['previous_start'] == "2023-03-11"
+    assert (result['current']['revenue'], result['previous']['revenue']) == (300.0, 10.0)
+    assert year_before(date(2024, 2, 29)) == date(2023, 2, 28)
+    with pytest.raises(ServiceError):
+        shop.compare(against="month")
+
+
+def test_rolling_averages_reach_back_before_the_start(shop):
+    trend = shop.rolling("2024-03-10", "2024-03-11", windows=(7,))
+    assert trend['days'] == ["2024-03-10", "2024-03-11"]
+    assert trend['revenue'] == [0.0, 300.0]
+    # 4 to 10 March, then 5 to 11 March
+    assert trend['avg_7'] == [round(350 / 7, 2), round(400 / 7, 2)]
+
+
+def test_category_revenue(shop):
+    rows = shop.category_revenue("2024-03-01", "2024-03-31")
+    assert rows == [
+        {'category': "Groceries", 'quantity': 6, 'revenue': 600.0, 'share': 92.3},
+        {'category': "Stationery", 'quantity': 5, 'revenue': 50.0, 'share': 7.7},
+    ]
+    assert shop.category_revenue("2025-01-01", "2025-01-31") == []
@@ -0,0 +1,122 @@
+"""
+The asyncio JSON API end to end over a real socket: auth, routing, and
+how service errors map onto HTTP statuses.
+"""
+import asyncio
+import base64
+import json
+
+import pytest
+
+from api import ShopApi
+from invoice_ids import InvoiceIdGenerator
+from services import BillingService, InventoryService, ReportService
+
+ADMIN = ("admin", "admin123")
+STAFF = ("cashier", "till")
+
+
+@pytest.fixture
+def api(db, tmp_path):
+    db.add_user(*STAFF, "Staff")
+    billing = BillingService(db, invoice_ids=InvoiceIdGenerator(0, str(tmp_path / "ids")))
+    api = ShopApi(db, billing, InventoryService(db), ReportService(db), workers=2)
+    yield api
+    api.executor.shutdown()
+    api.report_engine.shutdown()
+    billing.invoice_ids.close()
+
+
+def request(method, path, body=None, auth=ADMIN, raw=None):
+    head = [f"{method} {path} HTTP/1.1", "Host: test"]
+    if auth:
+        head.append("Authorization: Basic " + base64.b64encode(":".join(auth).encode()).decode())
+    payload = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+    head.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + payload
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode()
+        if line == "\r\n":
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return status, (json.loads(body) if body and headers.get('content-type') == "application/json" else body)
+
+
+def exchange(api, *requests):
+    """Send requests over one keep-alive connection; returns [(status, payload)]"""
+    async def run():
+        server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for raw in requests:
+            writer.write(raw)
+            await writer.drain()
+            responses.append(await read_response(reader))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return responses
+    return asyncio.run(run())
+
+
+def test_products_and_checkout(api, db):
+    (status, product), (_, quote), (status_out, invoice), (_, after) = exchange(
+        api,
+        request("POST", "/products", {"name": "Green Tea", "category": "Groceries", "price": 120.5, "stock": 5}),
+        request("POST", "/quote", {"items": [{"id": 1, "qty": 2}], "tax_percent": 18}),
+        request("POST", "/checkout", {"items": [{"id": 1, "qty": 2}], "tax_percent": 18}),
+        request("GET", "/products/1"),
+    )
+    assert status == 201 and product['id'] == 1
+    assert (quote['subtotal'], quote['tax'], quote['grand_total']) == (241.0, 43.38, 284.38)
+    assert status_out == 201
+    assert invoice['grand_total'] == 284.38
+    assert invoice['items'] == [{'name': "Green Tea", 'price': 120.5, 'qty': 2, 'total': 241.0}]
+    assert after['stock'] == 3
+
+
+@pytest.mark.parametrize("raw, status", [
+    (request("GET", "/products", auth=None), 401),
+    (request("GET", "/products", auth=("admin", "wrong")), 401),
+    (request("GET", "/nowhere"), 404),
+    (request("PATCH", "/products/1"), 405),
+    (request("POST", "/products", {"name": "Pen"}, auth=STAFF), 403),
+    (request("POST", "/products", raw=b"{not json"), 400),
+    (request("POST", "/products", raw=b"[1, 2]"), 400),
+    (request("POST", "/products", {"name": "Pen"}), 400),                            # Missing field
+    (request("POST", "/products", {"name": "Pen", "category": "S", "price": -1, "stock": 1}), 400),
+    (request("GET", "/products/99"), 404),                                           # NotFound
+    (request("POST", "/quote", {"items": [{"id": 1, "qty": 0}]}), 400),              # ServiceError
+    (request("POST", "/quote", {"items": [{"qty": 1}]}), 400),
+    (request("POST", "/quote", {"items": "tea"}), 400),
+    (request("POST", "/checkout", {"items": [{"id": 1, "qty": 6}]}), 409),           # OutOfStock
+    (request("POST", "/quote", {"items": [{"id": 1, "qty": 1}], "discount_percent": 101}), 400),
+    (request("GET", "/reports/top-products?n=ten"), 400),
+    (request("GET", "/analytics/compare?against=month"), 400),
+])
+def test_errors_map_to_http_statuses(api, db, raw, status):
+    db.add_product("Green Tea", "Groceries", 120.5, 5, 1)
+    (got, payload), = exchange(api, raw)
+    assert got == status
+    assert payload['error']
+
+
+def test_an_unexpected_error_is_a_500_without_details(api):
+    def broken(request):
+        raise RuntimeError("secret table name")
+    api.routes[0] = (api.routes[0][0], api.routes[0][1], broken, False)
+    (status, payload), = exchange(api, request("GET", "/health"))
+    assert (status, payload) == (500, {'error': "Internal error"})
+
+
+def test_a_malformed_request_closes_the_connection(api):
+    (status, payload), = exchange(api, b"NONSENSE\r\n\r\n")
+    assert status == 400
@@ -0,0 +1,114 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from cart import Cart, to_minor, from_minor
+from pricing import PricingEngine, ROUNDING_MODES
+
+RATES = {"Groceries": 5, "Books": 0, "Electronics": 28}
+
+
+def test_money_is_kept_in_paise():
+    assert to_minor("19.995") == 2000
+    assert to_minor(0.1) == 10
+    assert from_minor(1999) == Decimal("19.99")
+
+
+def test_scanning_again_merges_into_one_line():
+    cart = Cart()
+    cart.add(1, "Tea", 120.50, 2)
+    cart.add(2, "Pen", 10, 1)
+    cart.add(1, "Tea (new label)", 99, 3)
+    assert len(cart) == 2
+    assert cart.items == [(1, "Tea", 120.5, 5, 602.5), (2, "Pen", 10.0, 1, 10.0)]
+    assert cart.demand() == {1: 5, 2: 1}
+    assert cart.subtotal() == Decimal("612.50")
+
+
+def test_set_quantity_and_remove():
+    cart = Cart()
+    cart.add(1, "Tea", 120.50, 2)
+    cart.add(2, "Pen", 10, 4)
+    cart.set_quantity(2, 1)
+    assert cart.quantity_of(2) == 1
+    cart.set_quantity(1, 0)
+    assert cart.line(1) is None
+    cart.remove(2)
+    cart.remove(99)
+    assert len(cart) == 0
+    assert cart.subtotal() == Decimal("0.00")
+
+
+def test_clear_renews_the_cart_id():
+    cart = Cart()
+    first = cart.id
+    cart.add(1, "Tea", 120.50, 2)
+    cart.clear()
+    assert cart.id != first
+    assert len(cart) == 0
+    assert cart.subtotal() == 0
+
+
+def test_take_changes_reports_touched_lines():
+    cart = Cart()
+    cart.add(1, "Tea", 120.50, 1)
+    assert cart.take_changes() is None  # First draw: everything
+    assert cart.take_changes() == set()
+    cart.add(1, "Tea", 120.50, 1)
+    cart.add(2, "Pen", 10, 1)
+    cart.remove(3)
+    assert cart.take_changes() == {1, 2}
+    cart.remove(1)
+    assert cart.take_changes() == {1}
+    cart.clear()
+    assert cart.take_changes() is None
+
+
+# --- Running totals against a full re-price ---
+def full_totals(engine, cart, tax_percent):
+    bill = engine.price_cart(cart, 0, tax_percent)
+    del bill['lines']
+    return bill
+
+
+@pytest.mark.parametrize("rounding", ROUNDING_MODES)
+@pytest.mark.parametrize("tax_rounding", ["line", "bill"])
+@pytest.mark.parametrize("tax_percent", [None, 18, "2.5"])
+def test_running_totals_match_a_full_reprice(rounding, tax_rounding, tax_percent):
+    engine = PricingEngine(RATES, 12, rounding, tax_rounding, round_total_to=100)
+    rng = random.Random(f"{rounding}{tax_rounding}{tax_percent}")
+    cart = Cart()
+    for step in range(300):
+        pid = rng.randrange(40)
+        action = rng.random()
+        if action < 0.6:
+            cart.add(pid, f"Item {pid}", round(rng.uniform(0.01, 999), 2), rng.randint(1, 7),
+                     rng.choice(list(RATES) + ["Toys", None]))
+        elif action < 0.75:
+            cart.set_discount(pid, rng.choice([0, 5, 12.5, 33.33]))
+        elif action < 0.9:
+            cart.set_quantity(pid, rng.randint(-1, 9))
+        else:
+            cart.remove(pid)
+        assert engine.cart_totals(cart, 0, tax_percent) == full_totals(engine, cart, tax_percent), step
+
+
+def test_changing_the_tax_setting_reprices_every_line():
+    engine = PricingEngine(RATES, 12)
+    cart = Cart()
+    cart.add(1, "Rice", 100, 1, "Groceries")
+    cart.add(2, "Phone", 1000, 1, "Electronics")
+    assert engine.cart_totals(cart, 0, None)['tax'] == 500 + 28000
+    assert engine.cart_totals(cart, 0, 18)['tax'] == 1800 + 18000
+    assert engine.cart_totals(cart, 0, None)['tax'] == 500 + 28000
+
+
+def test_bill_discount_is_priced_in_full():
+    engine = PricingEngine(RATES, 12)
+    cart = Cart()
+    for pid in range(3):
+        cart.add(pid, "Biscuits", 33.33, 1, "Groceries")
+    bill = engine.price_cart(cart, 10, None)
+    del bill['lines']
+    assert engine.cart_totals(cart, 10, None) == bill
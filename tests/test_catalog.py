@@ -0,0 +1,121 @@
+"""
+CatalogIndex search: trigram narrowing, short queries, reuse of the last
+result while a query grows, and the sync hooks keeping it current.
+"""
+from catalog import CatalogIndex
+
+ROWS = [
+    (1, "Apple Juice", "Drinks", 50.0, 10, 2),
+    (2, "Orange Juice", "Drinks", 55.0, 10, 2),
+    (3, "Ball Pen", "Stationery", 10.0, 100, 10),
+    (4, "Abcbcd", "Misc", 1.0, 5, 0),
+    (12, "Notebook", "Stationery", 40.0, 30, 5),
+]
+
+
+def catalog():
+    index = CatalogIndex()
+    index.load(ROWS)
+    return index
+
+
+def names(rows):
+    return [row[1] for row in rows]
+
+
+def test_trigrams_narrow_the_candidates():
+    index = catalog()
+    assert index.grams["jui"] == {1, 2}
+    assert names(index.search("juice")) == ["Apple Juice", "Orange Juice"]
+    assert names(index.search("  ORANGE ")) == ["Orange Juice"]
+    # Every trigram of "abcd" is in "abcbcd", but the text is not
+    assert index.search("abcd") == []
+    assert index.search("zzz") == []
+
+
+def test_short_queries_scan_every_row():
+    index = catalog()
+    assert names(index.search("pe")) == ["Ball Pen"]
+    assert names(index.search("12")) == ["Notebook"]  # The id is searchable
+    assert len(index.search("")) == len(ROWS)
+
+
+def test_a_query_does_not_match_across_fields():
+    # "pen stat" would only match if name and category were joined by a space
+    assert catalog().search("pen stat") == []
+
+
+def test_a_growing_query_reuses_the_last_result():
+    index = catalog()
+    index.search("ju")
+    assert index._last_results == [1, 2]
+    assert names(index.search("jui")) == ["Apple Juice", "Orange Juice"]
+    # A change in between means the last result cannot be trusted
+    index.upsert((5, "Juicer", "Kitchen", 900.0, 3, 1))
+    assert names(index.search("juic")) == ["Apple Juice", "Orange Juice", "Juicer"]
+
+
+def test_sync_hooks_keep_the_index_current():
+    index = catalog()
+    version = index.version
+    index.upsert((3, "Gel Pen", "Stationery", 12.0, 100, 10))
+    assert index.search("ball") == []
+    assert names(index.search("gel")) == ["Gel Pen"]
+    assert "bal" not in index.grams
+
+    index.adjust_stock(3, -40)
+    assert index.get(3)[4] == 60
+    assert names(index.search("gel")) == ["Gel Pen"]
+
+    index.remove(3)
+    assert index.search("pen") == []
+    assert index.get(3) is None
+    assert index.version == version + 3
+
+
+def test_an_older_read_does_not_replace_a_newer_row():
+    index = CatalogIndex()
+    index.load(ROWS, versions={1: 5})
+    assert not index.upsert((1, "Apple Juice", "Drinks", 45.0, 10, 2), version=4)
+    assert index.get(1)[3] == 50.0
+    assert index.upsert((1, "Apple Juice", "Drinks", 45.0, 8, 2), version=6)
+    assert index.row_version(1) == 6
+    assert index.get(1)[3] == 45.0
+
+
+def test_at_risk_follows_stock_and_tells_listeners():
+    calls = []
+    index = catalog()
+    index.add_listener(lambda pid, row, at_risk: calls.append((pid, row and row[4], at_risk)))
+    assert index.at_risk == set()
+
+    index.adjust_stock(1, -7)   # 3 left, still above 2
+    index.adjust_stock(3, -5)   # Never near its minimum, so no call
+    assert calls == []
+    index.adjust_stock(1, -1)
+    index.adjust_stock(1, -2)
+    assert index.at_risk == {1}
+    assert names(index.low_stock()) == ["Apple Juice"]
+    index.upsert((1, "Apple Juice", "Drinks", 50.0, 20, 2))
+    index.remove(2)  # Was never at risk
+    assert calls == [(1, 2, True), (1, 0, True), (1, 20, False)]
+    assert index.at_risk == set()
+
+
+def test_a_reload_tells_listeners_what_changed():
+    calls = []
+    index = CatalogIndex(listeners=[lambda pid, row, at_risk: calls.append((pid, at_risk))])
+    index.load(ROWS)
+    index.load([(1, "Apple Juice", "Drinks", 50.0, 1, 2)] + ROWS[1:])
+    index.load(ROWS[1:])
+    assert calls == [(1, True), (1, False)]
+
+
+def test_a_failing_listener_does_not_stop_the_change(capsys):
+    def broken(pid, row, at_risk):
+        raise RuntimeError("listener bug")
+    index = catalog()
+    index.add_listener(broken)
+    index.adjust_stock(1, -10)
+    assert index.get(1)[4] == 0 and index.at_risk == {1}
+    assert "Error in stock listener" in capsys.readouterr().out
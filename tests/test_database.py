@@ -0,0 +1,307 @@
+"""
+ShopDatabase against each backend: the migrations, the sale write path and
+the rollups it maintains, and the upserts, which are where the MySQL and
+SQLite dialects differ (backends.upsert, hour, index lookups).
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import migrations
+from database import InsufficientStockError, LockTimeout, ShopDatabase
+
+TABLES = ("users", "products", "sales", "sale_items", "daily_sales", "product_daily_sales",
+          "hourly_sales", "stock_reservations", "schema_version")
+INDEXES = [
+    ("sales", "idx_sales_date"),
+    ("sale_items", "idx_sale_items_product"),
+    ("sale_items", "idx_sale_items_invoice"),
+    ("products", "idx_products_category"),
+    ("products", "idx_products_low_stock"),
+    ("product_daily_sales", "idx_product_daily_day"),
+    ("stock_reservations", "idx_reservations_product"),
+]
+
+
+def money(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def make_sale(invoice_id, when, items, discount=0, tax=0):
+    """A sale dict as process_sale builds it; items are (pid, name, price, qty)"""
+    lines = [[pid, name, price, qty, round(price * qty, 2)] for pid, name, price, qty in items]
+    subtotal = round(sum(line[4] for line in lines), 2)
+    return {
+        'invoice_id': invoice_id,
+        'date': when,
+        'items': lines,
+        'financials': {'subtotal': subtotal, 'discount': discount, 'tax': tax,
+                       'grand_total': round(subtotal - discount + tax, 2)},
+    }
+
+
+@pytest.fixture
+def shop(db):
+    """Two products and three sales over two days"""
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    pen = db.add_product("Ball Pen", "Stationery", 10, 200, 20)
+    db.apply_sales([
+        make_sale("INV-1", "2024-03-01 09:15:00", [(tea, "Green Tea", 120.50, 2), (pen, "Ball Pen", 10, 5)],
+                  discount=10, tax=18.45),
+        make_sale("INV-2", "2024-03-01 09:40:00", [(pen, "Ball Pen", 10, 3)], tax=1.5),
+        make_sale("INV-3", "2024-03-02 18:05:00", [(tea, "Green Tea", 120.50, 1)]),
+    ])
+    return db, tea, pen
+
+
+def rows(db, sql):
+    return [tuple(row) for row in db.query(sql)]
+
+
+# --- Migrations ---
+def test_fresh_database_is_migrated(db):
+    assert db.schema_is_current()
+    with db.cursor() as cur:
+        assert migrations.current_version(cur) == migrations.LATEST_VERSION
+        for table in TABLES:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            cur.fetchone()
+        for table, index in INDEXES:
+            assert db.backend.index_exists(cur, table, index), index
+        assert db.backend.column_exists(cur, "products", "is_low_stock")
+        assert db.backend.column_exists(cur, "products", "version")
+        assert not db.backend.column_exists(cur, "products", "no_such_column")
+
+
+def test_migrate_again_is_a_no_op(db):
+    assert db.migrate() == []
+    assert db.query("SELECT COUNT(*) FROM schema_version", one=True)[0] == migrations.LATEST_VERSION
+
+
+def test_generated_low_stock_column(db):
+    low = db.add_product("Soap", "Household", 30, 2, 5)
+    db.add_product("Rice", "Groceries", 60, 40, 5)
+    assert rows(db, "SELECT id FROM products WHERE is_low_stock = 1") == [(low,)]
+
+
+def test_hourly_rollup_backfilled_by_migration(db):
+    pid = db.add_product("Green Tea", "Groceries", 100, 10, 1)
+    db.apply_sales([make_sale("INV-1", "2024-03-01 13:30:00", [(pid, "Green Tea", 100, 1)])])
+    with db.transaction() as cur:
+        cur.execute("DELETE FROM hourly_sales")
+        cur.execute("DELETE FROM schema_version WHERE version = %s", (7,))
+    assert db.migrate() == [7]
+    assert rows(db, "SELECT hour, revenue, invoices FROM hourly_sales") == [(13, money(100), 1)]
+
+
+def test_query_plans_use_their_indexes(db):
+    statuses = {description: status for description, status, detail in migrations.check_query_plans(db)}
+    assert statuses
+    assert "fail" not in statuses.values(), statuses
+
+
+# --- apply_sales ---
+def test_apply_sales_records_sales_and_takes_stock(shop):
+    db, tea, pen = shop
+    assert rows(db, "SELECT id, stock FROM products ORDER BY id") == [(tea, 47), (pen, 192)]
+    assert rows(db, "SELECT invoice_id, subtotal, discount, tax, grand_total FROM sales ORDER BY invoice_id") == [
+        ("INV-1", money(291), money(10), money(18.45), money(299.45)),
+        ("INV-2", money(30), money(0), money(1.5), money(31.5)),
+        ("INV-3", money(120.5), money(0), money(0), money(120.5)),
+    ]
+    assert rows(db, "SELECT invoice_id, product_id, quantity, total FROM sale_items ORDER BY id") == [
+        ("INV-1", tea, 2, money(241)), ("INV-1", pen, 5, money(50)),
+        ("INV-2", pen, 3, money(30)), ("INV-3", tea, 1, money(120.5)),
+    ]
+
+
+def test_apply_sales_skips_recorded_invoices(shop):
+    db, tea, pen = shop
+    assert db.apply_sales([make_sale("INV-1", "2024-03-01 09:15:00", [(tea, "Green Tea", 120.50, 2)])]) == []
+    assert db.query("SELECT COUNT(*) FROM sales", one=True)[0] == 3
+    assert db.query("SELECT stock FROM products WHERE id = %s", (tea,), one=True)[0] == 47
+
+
+def test_oversell_aborts_the_whole_batch(shop):
+    db, tea, pen = shop
+    with pytest.raises(InsufficientStockError):
+        db.apply_sales([
+            make_sale("INV-4", "2024-03-03 10:00:00", [(pen, "Ball Pen", 10, 1)]),
+            make_sale("INV-5", "2024-03-03 10:05:00", [(tea, "Green Tea", 120.50, 48)]),
+        ])
+    assert db.query("SELECT COUNT(*) FROM sales", one=True)[0] == 3
+    assert rows(db, "SELECT id, stock FROM products ORDER BY id") == [(tea, 47), (pen, 192)]
+
+
+def test_other_carts_holds_count_against_stock(shop):
+    db, tea, pen = shop
+    assert db.reserve_stock("till-2", tea, 45) == (True, 47)
+    assert db.reserve_stock("till-1", tea, 3) == (False, 2)
+    with pytest.raises(InsufficientStockError):
+        db.apply_sales([make_sale("INV-4", "2024-03-03 10:00:00", [(tea, "Green Tea", 120.50, 3)])])
+    # The cart holding the stock sells it, and its holds are used up
+    sale = make_sale("INV-4", "2024-03-03 10:00:00", [(tea, "Green Tea", 120.50, 45)])
+    sale['cart_id'] = "till-2"
+    assert db.apply_sales([sale]) == ["INV-4"]
+    assert db.query("SELECT COUNT(*) FROM stock_reservations", one=True)[0] == 0
+    assert db.query("SELECT stock FROM products WHERE id = %s", (tea,), one=True)[0] == 2
+
+
+def test_hold_cart_confirms_a_journaled_sale(shop):
+    db, tea, pen = shop
+    assert db.reserve_stock("till-1", tea, 40) == (True, 47)
+    assert db.reserve_stock("till-2", tea, 5) == (True, 7)
+    # Short on one line: nothing is held and the other line's hold is untouched
+    with pytest.raises(InsufficientStockError):
+        db.hold_cart("till-2", {pen: 2, tea: 8})
+    assert rows(db, "SELECT cart_id, product_id, quantity FROM stock_reservations ORDER BY cart_id") == [
+        ("till-1", tea, 40), ("till-2", tea, 5)]
+    # A lapsed hold is topped up if stock allows
+    db.hold_cart("till-2", {pen: 2, tea: 7})
+    assert rows(db, "SELECT product_id, quantity FROM stock_reservations WHERE cart_id = 'till-2' "
+                    "ORDER BY product_id") == [(tea, 7), (pen, 2)]
+    # The journal sync skips the guard, and the held units are what it takes
+    sale = make_sale("INV-4", "2024-03-03 10:00:00", [(tea, "Green Tea", 120.50, 7), (pen, "Ball Pen", 10, 2)])
+    sale['cart_id'] = "till-2"
+    assert db.apply_sales([sale], check_stock=False) == ["INV-4"]
+    assert rows(db, "SELECT id, stock FROM products ORDER BY id") == [(tea, 40), (pen, 190)]
+    assert rows(db, "SELECT cart_id, quantity FROM stock_reservations") == [("till-1", 40)]
+
+
+def test_a_hold_gives_up_quickly_on_another_tills_lock(shop, backend):
+    db, tea, pen = shop
+    other = ShopDatabase(backend)
+    try:
+        with other.transaction() as cur:
+            cur.execute(f"SELECT stock FROM products WHERE id = %s{backend.for_update}", (tea,))
+            cur.fetchone()
+            started = time.monotonic()
+            with pytest.raises(LockTimeout):
+                db.reserve_stock("till-1", tea, 1)
+            assert time.monotonic() - started < 5
+    finally:
+        other.close()
+    # The pooled connection is back to the normal wait and holds work again
+    assert db.reserve_stock("till-1", tea, 1) == (True, 47)
+
+
+# --- Rollups ---
+def test_daily_rollup(shop):
+    db, tea, pen = shop
+    assert rows(db, "SELECT day, revenue, tax, discount, invoices FROM daily_sales ORDER BY day") == [
+        (date(2024, 3, 1), money(330.95), money(19.95), money(10), 2),
+        (date(2024, 3, 2), money(120.5), money(0), money(0), 1),
+    ]
+
+
+def test_product_daily_rollup(shop):
+    db, tea, pen = shop
+    assert rows(db, """
+        SELECT product_id, quantity, revenue FROM product_daily_sales ORDER BY day, product_id
+    """) == [(tea, 2, money(241)), (pen, 8, money(80)), (tea, 1, money(120.5))]
+    assert [tuple(row[:3]) for row in db.get_top_products(by="quantity")] == [
+        (pen, "Ball Pen", 8), (tea, "Green Tea", 3)]
+
+
+def test_hourly_rollup(shop):
+    db, tea, pen = shop
+    assert rows(db, "SELECT hour, revenue, invoices FROM hourly_sales ORDER BY day, hour") == [
+        (9, money(330.95), 2), (18, money(120.5), 1)]
+
+
+def test_rebuilds_match_the_maintained_rollups(shop):
+    db, tea, pen = shop
+    tables = {
+        "daily_sales": ("SELECT day, revenue, tax, discount, invoices FROM daily_sales ORDER BY day",
+                        db.rebuild_daily_sales),
+        "product_daily_sales": ("SELECT product_id, day, product_name, quantity, revenue FROM product_daily_sales "
+                                "ORDER BY product_id, day", db.rebuild_product_daily_sales),
+        "hourly_sales": ("SELECT day, hour, revenue, invoices FROM hourly_sales ORDER BY day, hour",
+                         db.rebuild_hourly_sales),
+    }
+    for table, (sql, rebuild) in tables.items():
+        maintained = rows(db, sql)
+        with db.transaction() as cur:
+            cur.execute(f"DELETE FROM {table}")
+        assert rebuild() > 0
+        assert rows(db, sql) == maintained, table
+
+
+def test_rebuild_of_a_range_leaves_other_days(shop):
+    db, tea, pen = shop
+    with db.transaction() as cur:
+        cur.execute("UPDATE daily_sales SET revenue = 0")
+    assert db.rebuild_daily_sales("2024-03-02", "2024-03-02") == 1
+    assert [revenue for revenue, in rows(db, "SELECT revenue FROM daily_sales ORDER BY day")] == [
+        money(0), money(120.5)]
+
+
+def test_reports_read_the_rollups(shop):
+    db, tea, pen = shop
+    hourly = db.get_hourly_sales("2024-03-01", "2024-03-01")
+    assert hourly['hour'].tolist() == [9]
+    categories = db.get_category_sales()
+    assert categories['category'].tolist() == ["Groceries", "Stationery"]
+    assert categories['revenue'].astype(float).tolist() == [361.5, 80.0]
+
+
+# --- Upserts ---
+def test_rollup_upserts_add_to_existing_rows(shop):
+    db, tea, pen = shop
+    db.apply_sales([make_sale("INV-4", "2024-03-01 09:55:00", [(pen, "Ball Pen", 10, 2)])])
+    assert rows(db, "SELECT revenue, invoices FROM daily_sales WHERE day = '2024-03-01'") == [(money(350.95), 3)]
+    assert rows(db, "SELECT revenue, invoices FROM hourly_sales WHERE day = '2024-03-01' AND hour = 9") == [
+        (money(350.95), 3)]
+    assert rows(db, "SELECT quantity, revenue FROM product_daily_sales "
+                    f"WHERE day = '2024-03-01' AND product_id = {pen}") == [(10, money(100))]
+
+
+def test_bulk_upsert_products(db):
+    pd = pytest.importorskip("pandas")
+    tea = db.add_product("Green Tea", "Groceries", 120, 10, 2)
+    version = db.query("SELECT version FROM products WHERE id = %s", (tea,), one=True)[0]
+
+    inserted, updated = db.bulk_upsert_products([
+        pd.DataFrame({'name': ["green tea", "Ball Pen"], 'category': ["Groceries", "Stationery"],
+                      'price': [125, 10], 'stock': [30, 100], 'min_stock': [5, 10]}),
+        pd.DataFrame({'name': ["Ball Pen"], 'category': ["Stationery"], 'price': [12], 'stock': [90],
+                      'min_stock': [10]}),
+    ])
+    assert (inserted, updated) == (1, 2)
+    assert rows(db, "SELECT name, price, stock FROM products ORDER BY id") == [
+        ("green tea", money(125), 30), ("Ball Pen", money(12), 90)]
+    assert db.query("SELECT version FROM products WHERE id = %s", (tea,), one=True)[0] == version + 1
+
+    # By id, including an id that is not in the table yet
+    inserted, updated = db.bulk_upsert_products([
+        pd.DataFrame({'id': [tea, 500], 'name': ["Green Tea", "Notebook"], 'category': ["Groceries", "Stationery"],
+                      'price': [130, 45], 'stock': [25, 60], 'min_stock': [5, 10]}),
+    ])
+    assert (inserted, updated) == (1, 1)
+    assert rows(db, "SELECT id, name, price FROM products WHERE id IN (%s, 500) ORDER BY id" % tea) == [
+        (tea, "Green Tea", money(130)), (500, "Notebook", money(45))]
+    assert db.get_catalog().get(500)[1] == "Notebook"
+
+
+def test_reservation_upsert_replaces_the_hold(db):
+    tea = db.add_product("Green Tea", "Groceries", 120, 10, 2)
+    assert db.reserve_stock("till-1", tea, 2) == (True, 10)
+    assert db.reserve_stock("till-1", tea, 6) == (True, 10)
+    assert rows(db, "SELECT cart_id, quantity FROM stock_reservations") == [("till-1", 6)]
+    assert db.reserve_stock("till-1", tea, 0) == (True, 10)
+    assert rows(db, "SELECT cart_id, quantity FROM stock_reservations") == []
+
+
+def test_search_matches_substrings(db):
+    db.add_product("Apple Juice", "Drinks", 50, 10, 2)
+    db.add_product("Orange Juice", "Drinks", 55, 10, 2)
+    db.add_product("Ball Pen", "Stationery", 10, 100, 10)
+    assert sorted(row[1] for row in db.search_products("Juice")) == ["Apple Juice", "Orange Juice"]
+    assert [row[1] for row in db.search_products("Pen")] == ["Ball Pen"]
+    # Mid-word text: no FULLTEXT word starts with it, so MySQL falls back to LIKE too
+    assert sorted(row[1] for row in db.search_products("uice")) == ["Apple Juice", "Orange Juice"]
+    assert [row[1] for row in db.search_products("all Pe")] == ["Ball Pen"]
+    assert [row[1] for row in db.search_products("Stationery")] == ["Ball Pen"]
+    assert db.search_products("Tea") == []
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from invoice import InvoiceTemplate, render_invoice
+
+
+def amounts(rows, label):
+    return [Decimal(row[3]) for row in rows if row[2] == label]
+
+
+def printed_total_adds_up(rows):
+    lines = sum(Decimal(row[3]) for row in rows[1:] if row[0])
+    extras = sum(Decimal(row[3]) for row in rows if row[2] in ("Discount", "GST", "Round Off"))
+    return lines + extras == amounts(rows, "Total Amount")[0]
+
+
+def test_plain_bill_shows_gst_and_total():
+    rows = InvoiceTemplate().rows({'items': [("Tea", 120.5, 2, 241.0)], 'subtotal': 241.0, 'discount': 0.0,
+                                   'tax': 12.05, 'grand_total': 253.05})
+    assert [row[2] for row in rows[2:]] == ["GST", "Total Amount"]
+    assert printed_total_adds_up(rows)
+
+
+def test_bill_discount_and_round_off_are_printed():
+    # Line totals are after their line discount (Kettle 12.5% off); the stored
+    # discount also holds that, so only the bill discount is printed
+    rows = InvoiceTemplate().rows({
+        'items': [("Kettle", 200.0, 1, 175.0), ("Mug", 100.0, 1, 100.0)],
+        'subtotal': 300.0, 'discount': 52.5, 'tax': 44.55, 'grand_total': 292.0,
+    })
+    assert amounts(rows, "Discount") == [Decimal("-27.50")]
+    assert amounts(rows, "Round Off") == [Decimal("-0.05")]
+    assert printed_total_adds_up(rows)
+
+
+def test_render_writes_a_pdf(tmp_path):
+    items = [(f"Item {n}", 10.0, 1, 10.0) for n in range(120)]  # Flows onto a second page
+    path = render_invoice({'invoice_id': "INV-1", 'date': "2024-03-01 10:00", 'items': items,
+                           'subtotal': 1200.0, 'discount': 0.0, 'tax': 0.0, 'grand_total': 1200.0},
+                          str(tmp_path / "INV-1.pdf"))
+    with open(path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
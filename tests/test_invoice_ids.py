@@ -0,0 +1,70 @@
+"""
+InvoiceIdGenerator: ids are unique and sort by time, per-process slots
+keep two generators apart, and the high-water mark survives a restart.
+"""
+import threading
+
+import pytest
+
+import invoice_ids
+from invoice_ids import InvoiceIdGenerator, RESERVE_MS
+
+
+def test_ids_are_unique_and_sorted(tmp_path):
+    generator = InvoiceIdGenerator(7, str(tmp_path))
+    ids = [generator.next_id() for _ in range(5000)]  # Past SEQ_PER_MS in a millisecond it borrows the next
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert ids[0].startswith("INV-") and ids[0].endswith("000") and ids[0][-6:-3] == "070"
+    generator.close()
+
+
+def test_threads_never_share_an_id(tmp_path):
+    generator = InvoiceIdGenerator(1, str(tmp_path))
+    ids = []
+
+    def issue():
+        batch = [generator.next_id() for _ in range(500)]
+        ids.extend(batch)
+
+    threads = [threading.Thread(target=issue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 4000
+    generator.close()
+
+
+def test_each_generator_takes_its_own_slot(tmp_path):
+    first = InvoiceIdGenerator(3, str(tmp_path))
+    second = InvoiceIdGenerator(3, str(tmp_path))
+    assert (first.slot, second.slot) == (0, 1)
+    assert first.next_id()[-6:-3] != second.next_id()[-6:-3]
+    first.close()
+    # A closed generator's slot is free again
+    third = InvoiceIdGenerator(3, str(tmp_path))
+    assert third.slot == 0
+    second.close()
+    third.close()
+
+
+def test_the_high_water_mark_survives_a_restart_with_the_clock_behind(tmp_path, monkeypatch):
+    clock = [1_700_000_000_000 * 1_000_000]
+    monkeypatch.setattr(invoice_ids.time, "time_ns", lambda: clock[0])
+    generator = InvoiceIdGenerator(2, str(tmp_path))
+    before = [generator.next_id() for _ in range(3)]
+    generator.close()  # The process dies
+
+    # It restarts after the clock was stepped back a minute
+    clock[0] -= 60_000 * 1_000_000
+    generator = InvoiceIdGenerator(2, str(tmp_path))
+    after = generator.next_id()
+    assert after > before[-1]
+    assert generator.last_ms >= 1_700_000_000_000 + RESERVE_MS
+    generator.close()
+
+
+def test_till_id_is_checked(tmp_path):
+    with pytest.raises(ValueError):
+        InvoiceIdGenerator(100, str(tmp_path))
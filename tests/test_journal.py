@@ -0,0 +1,94 @@
+"""
+SaleJournal: sales survive a crash before they reach the database,
+replays are idempotent, and bad entries are set aside.
+"""
+import json
+import os
+
+from journal import SaleJournal
+
+from test_database import make_sale
+
+
+def record(journal, sale):
+    return journal.record(sale['invoice_id'], sale['items'], sale['financials'], date=sale['date'])
+
+
+def count(db, table):
+    return db.query(f"SELECT COUNT(*) FROM {table}", one=True)[0]
+
+
+def test_sales_are_synced_in_batches(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    journal = SaleJournal(db, directory=str(tmp_path), batch_size=2)
+    for n in range(5):
+        record(journal, make_sale(f"INV-{n}", "2024-03-01 10:00:00", [(tea, "Green Tea", 120.50, 1)]))
+    assert journal.lag()['pending'] == 5
+    assert journal.sync_once() == 2
+    assert journal.drain() == 3
+    assert count(db, "sales") == 5
+    assert db.query("SELECT stock FROM products WHERE id = %s", (tea,), one=True)[0] == 45
+    assert journal.lag()['pending'] == journal.lag()['pending_bytes'] == 0
+    journal.close()
+
+
+def test_unsynced_sales_are_replayed_after_a_crash(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    journal = SaleJournal(db, directory=str(tmp_path))
+    record(journal, make_sale("INV-1", "2024-03-01 10:00:00", [(tea, "Green Tea", 120.50, 2)]))
+    record(journal, make_sale("INV-2", "2024-03-01 10:05:00", [(tea, "Green Tea", 120.50, 1)]))
+    journal.file.close()  # The till dies before the sync runs
+    # ...mid-way through writing a third sale, which the cashier never saw confirmed
+    with open(os.path.join(str(tmp_path), "sales.jsonl"), "ab") as f:
+        f.write(b'{"invoice_id": "INV-3", "ite')
+
+    journal = SaleJournal(db, directory=str(tmp_path))
+    assert journal.lag()['pending'] == 2
+    assert journal.drain() == 2
+    assert [row[0] for row in db.query("SELECT invoice_id FROM sales ORDER BY invoice_id")] == ["INV-1", "INV-2"]
+    journal.close()
+
+
+def test_a_batch_replayed_after_its_commit_is_not_written_twice(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    journal = SaleJournal(db, directory=str(tmp_path))
+    record(journal, make_sale("INV-1", "2024-03-01 10:00:00", [(tea, "Green Tea", 120.50, 2)]))
+    journal.drain()
+    # Crash between the database commit and saving the offset
+    journal._save_offset(0)
+    journal.file.close()
+
+    journal = SaleJournal(db, directory=str(tmp_path))
+    assert journal.drain() == 1
+    assert count(db, "sales") == 1
+    assert count(db, "sale_items") == 1
+    assert db.query("SELECT stock FROM products WHERE id = %s", (tea,), one=True)[0] == 48
+    assert db.query("SELECT invoices FROM daily_sales", one=True)[0] == 1
+    journal.close()
+
+
+def test_a_bad_entry_is_set_aside(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    journal = SaleJournal(db, directory=str(tmp_path))
+    record(journal, make_sale("INV-1", "2024-03-01 10:00:00", [(tea, "Green Tea", 120.50, 1)]))
+    journal.record("INV-2", [[tea, "Green Tea"]], {'grand_total': 1})  # Item too short
+    record(journal, make_sale("INV-3", "2024-03-01 10:10:00", [(tea, "Green Tea", 120.50, 1)]))
+    assert journal.drain() == 3
+    assert [row[0] for row in db.query("SELECT invoice_id FROM sales ORDER BY invoice_id")] == ["INV-1", "INV-3"]
+    assert journal.lag()['rejected'] == 1
+    with open(journal.reject_path, encoding="utf-8") as f:
+        assert [json.loads(line)['entry']['invoice_id'] for line in f] == ["INV-2"]
+    journal.close()
+
+
+def test_a_synced_journal_is_compacted(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 50, 5)
+    journal = SaleJournal(db, directory=str(tmp_path), compact_bytes=1)
+    record(journal, make_sale("INV-1", "2024-03-01 10:00:00", [(tea, "Green Tea", 120.50, 1)]))
+    journal.drain()
+    assert os.path.getsize(journal.path) == 0
+    assert journal.offset == 0
+    record(journal, make_sale("INV-2", "2024-03-01 10:05:00", [(tea, "Green Tea", 120.50, 1)]))
+    assert journal.drain() == 1
+    assert count(db, "sales") == 2
+    journal.close()
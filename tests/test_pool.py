@@ -0,0 +1,143 @@
+"""
+ConnectionPool with stand-in connections: the size bound and timeout,
+reuse, dropping broken or dead connections, and reconnect retries.
+"""
+import threading
+import time
+
+import pytest
+
+from pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Server:
+    """Hands out numbered connections; `down` makes the next connects fail"""
+
+    def __init__(self):
+        self.opened = []
+        self.down = 0
+
+    def connect(self):
+        if self.down:
+            self.down -= 1
+            raise ConnectionError("server down")
+        conn = FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+
+def make_pool(server, **kwargs):
+    kwargs.setdefault("backoff", 0.001)
+    return ConnectionPool(server.connect, lambda conn: conn.alive, **kwargs)
+
+
+def test_connections_are_reused():
+    server = Server()
+    pool = make_pool(server, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+    assert len(server.opened) == 1
+    assert pool.metrics()['acquired'] == 2
+
+
+def test_a_full_pool_times_out():
+    pool = make_pool(Server(), size=1)
+    held = pool.acquire()
+    started = time.perf_counter()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.2)
+    assert 0.2 <= time.perf_counter() - started < 2
+    pool.release(held)
+    assert pool.metrics()['in_use'] == 0
+
+
+def test_a_waiting_borrower_gets_a_released_connection():
+    pool = make_pool(Server(), size=1)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(held)
+    waiter.join()
+    assert got == [held]
+    assert pool.metrics()['max_wait_ms'] >= 40
+
+
+def test_a_broken_connection_is_dropped():
+    server = Server()
+    pool = make_pool(server, size=1)
+    with pytest.raises(ConnectionError):
+        with pool.connection(broken_on=(ConnectionError,)) as conn:
+            raise ConnectionError("link dropped")
+    assert conn.closed
+    assert pool.metrics()['open'] == 0
+    # Other errors leave the connection in the pool
+    with pytest.raises(ValueError):
+        with pool.connection(broken_on=(ConnectionError,)) as fresh:
+            raise ValueError("bad data")
+    assert not fresh.closed and fresh is not conn
+    with pool.connection() as reused:
+        assert reused is fresh
+
+
+def test_a_dead_idle_connection_is_replaced():
+    server = Server()
+    pool = make_pool(server, size=1)
+    with pool.connection() as conn:
+        pass
+    conn.alive = False
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert conn.closed
+    assert pool.metrics()['reconnects'] == 1
+    assert pool.metrics()['open'] == 1
+
+
+def test_connect_is_retried_with_backoff():
+    server = Server()
+    pool = make_pool(server, retries=3)
+    server.down = 2
+    with pool.connection():
+        pass
+    assert pool.metrics()['failures'] == 2
+
+    # With no retries left the error reaches the caller and frees the slot
+    server.down = 1
+    pool.close_all()
+    with pytest.raises(ConnectionError):
+        pool.acquire(retries=0)
+    assert pool.metrics()['open'] == 0
+
+
+def test_threads_share_the_database_pool(db):
+    errors = []
+
+    def reads():
+        try:
+            for _ in range(20):
+                assert db.query("SELECT COUNT(*) FROM products", one=True)[0] == 0
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reads) for _ in range(db.pool.size * 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    metrics = db.pool_metrics()
+    assert metrics['open'] <= metrics['size']
+    assert metrics['in_use'] == 0
@@ -0,0 +1,190 @@
+"""
+PricingEngine in exact paise: rounding modes, line and bill discounts,
+the bill discount shared over the lines, category GST and round-off,
+plus reconcile() against stored sales.
+"""
+import random
+
+import pytest
+
+from cart import Cart
+from pricing import PricingEngine, ROUNDING_MODES, RECONCILE_COLUMNS, divide, financials, reconcile
+from services import BillingService
+
+RATES = {"Groceries": 5, "Electronics": 28}
+
+
+def biscuits(qty_per_line=1, lines=3):
+    cart = Cart()
+    for pid in range(lines):
+        cart.add(pid, "Biscuits", 33.33, qty_per_line, "Groceries")
+    return cart
+
+
+def check_adds_up(bill):
+    """Σ line net + tax − bill discount + round-off is the grand total"""
+    nets = sum(line['net'] for line in bill['lines'])
+    assert nets == bill['subtotal']
+    assert nets + bill['tax'] - bill['discount'] + bill['round_off'] == bill['grand_total']
+    assert sum(line['bill_discount'] for line in bill['lines']) == bill['discount']
+
+
+@pytest.mark.parametrize("n, d, expected", [
+    (25, 10, {"half_up": 3, "half_even": 2, "down": 2, "up": 3}),
+    (35, 10, {"half_up": 4, "half_even": 4, "down": 3, "up": 4}),
+    (24, 10, {"half_up": 2, "half_even": 2, "down": 2, "up": 3}),
+    (20, 10, {"half_up": 2, "half_even": 2, "down": 2, "up": 2}),
+])
+def test_divide(n, d, expected):
+    np = pytest.importorskip("numpy")
+    for mode, value in expected.items():
+        assert divide(n, d, mode) == value
+        assert divide(np.array([n]), d, mode).tolist() == [value]
+
+
+def test_three_times_33_33_with_10_percent_off():
+    bill = PricingEngine({}, 18).price_cart(biscuits(), 10, 18)
+    # 99.99 less 10% is 9.999 -> 10.00, shared 3.34 / 3.33 / 3.33 (the first of the equal lines takes the paisa)
+    assert bill['subtotal'] == 9999
+    assert bill['discount'] == 1000
+    assert [line['bill_discount'] for line in bill['lines']] == [334, 333, 333]
+    assert [line['taxable'] for line in bill['lines']] == [2999, 3000, 3000]
+    assert [line['tax'] for line in bill['lines']] == [540, 540, 540]
+    assert bill['tax'] == 1620
+    assert bill['grand_total'] == 9999 - 1000 + 1620
+    check_adds_up(bill)
+
+
+def test_tax_rounded_once_on_the_bill():
+    bill = PricingEngine({}, 18, tax_rounding="bill").price_cart(biscuits(qty_per_line=3, lines=1), 10, 18)
+    assert (bill['subtotal'], bill['discount'], bill['tax']) == (9999, 1000, 1620)  # 8999 x 18% = 1619.82
+    assert bill['lines'][0]['tax'] is None
+    check_adds_up(bill)
+
+
+@pytest.mark.parametrize("rounding, discount", [("half_up", 3), ("half_even", 2), ("down", 2), ("up", 3)])
+def test_rounding_mode_applies_to_discounts(rounding, discount):
+    cart = Cart()
+    cart.add(1, "Toffee", 0.25, 1)
+    bill = PricingEngine({}, 0, rounding).price_cart(cart, 10, 0)
+    assert bill['discount'] == discount
+    assert bill['grand_total'] == 25 - discount
+
+
+def test_gst_by_category():
+    cart = Cart()
+    cart.add(1, "Rice", 100, 2, "Groceries")
+    cart.add(2, "Phone", 999.99, 1, "electronics")  # Categories match ignoring case
+    cart.add(3, "Toy", 10.50, 1)                    # No category: the default rate
+    bill = PricingEngine(RATES, 12).price_cart(cart)
+    assert [line['rate'] for line in bill['lines']] == [500, 2800, 1200]
+    assert [line['tax'] for line in bill['lines']] == [1000, 28000, 126]  # 27999.72 rounds up
+    assert (bill['subtotal'], bill['tax'], bill['grand_total']) == (121049, 29126, 150175)
+    # One typed rate replaces the category rates
+    assert PricingEngine(RATES, 12).price_cart(cart, 0, 18)['tax'] == 3600 + 18000 + 189
+    check_adds_up(bill)
+
+
+def test_line_discount_then_bill_discount():
+    cart = Cart()
+    cart.add(1, "Kettle", 200, 1)
+    cart.add(2, "Mug", 100, 1)
+    cart.set_discount(1, 12.5)
+    bill = PricingEngine({}, 18).price_cart(cart, 10, 18)
+    assert [line['line_discount'] for line in bill['lines']] == [2500, 0]
+    assert [line['net'] for line in bill['lines']] == [17500, 10000]
+    assert [line['bill_discount'] for line in bill['lines']] == [1750, 1000]
+    assert [line['tax'] for line in bill['lines']] == [2835, 1620]
+    assert (bill['gross'], bill['line_discount'], bill['subtotal'], bill['discount'], bill['tax'],
+            bill['grand_total']) == (30000, 2500, 27500, 2750, 4455, 29205)
+    check_adds_up(bill)
+    # What a sale stores: subtotal before any discount, discount = line + bill discounts
+    assert financials(bill) == {'subtotal': 300.0, 'discount': 52.5, 'tax': 44.55, 'grand_total': 292.05,
+                                'round_off': 0.0, 'line_discount': 25.0}
+
+
+def test_grand_total_rounded_to_whole_rupees():
+    bill = PricingEngine({}, 18, round_total_to=100).price_cart(biscuits(), 10, 18)
+    assert bill['grand_total'] == 10600
+    assert bill['round_off'] == -19
+    check_adds_up(bill)
+
+
+def test_bad_settings_are_rejected():
+    with pytest.raises(ValueError):
+        PricingEngine(rounding="bankers")
+    with pytest.raises(ValueError):
+        PricingEngine(tax_rounding="invoice")
+
+
+def random_carts(count, seed):
+    rng = random.Random(seed)
+    carts, discounts = [], []
+    for _ in range(count):
+        cart = Cart()
+        for pid in range(rng.randint(1, 8)):
+            cart.add(pid, f"Item {pid}", round(rng.uniform(0.01, 2500), 2), rng.randint(1, 9),
+                     rng.choice(list(RATES) + ["Toys", None]))
+            if rng.random() < 0.3:
+                cart.set_discount(pid, rng.choice([5, 12.5, 33.33]))
+        carts.append(cart)
+        discounts.append(rng.choice([0, 5, 7.5, 10, 33.33]))
+    return carts, discounts
+
+
+@pytest.mark.parametrize("rounding", ROUNDING_MODES)
+@pytest.mark.parametrize("tax_rounding", ["line", "bill"])
+def test_every_bill_adds_up(rounding, tax_rounding):
+    engine = PricingEngine(RATES, 12, rounding, tax_rounding)
+    for cart, discount in zip(*random_carts(200, rounding + tax_rounding)):
+        check_adds_up(engine.price_cart(cart, discount))
+
+
+@pytest.mark.parametrize("rounding", ROUNDING_MODES)
+@pytest.mark.parametrize("tax_rounding", ["line", "bill"])
+@pytest.mark.parametrize("round_total_to", [1, 100])
+def test_batch_pricing_agrees_with_one_bill_at_a_time(rounding, tax_rounding, round_total_to):
+    pytest.importorskip("numpy")
+    engine = PricingEngine(RATES, 12, rounding, tax_rounding, round_total_to)
+    carts, discounts = random_carts(100, 7)
+    batch = engine.price_carts(carts, discounts)
+    for n, (cart, discount) in enumerate(zip(carts, discounts)):
+        bill = engine.price_cart(cart, discount)
+        for key in ('gross', 'line_discount', 'subtotal', 'discount', 'tax', 'round_off', 'grand_total'):
+            assert int(batch[key][n]) == bill[key], (n, key)
+
+
+# --- reconcile ---
+def test_reconcile_of_an_empty_range(db):
+    pytest.importorskip("pandas")
+    report = reconcile(db, PricingEngine(RATES, 12))
+    assert report.empty
+    assert list(report.columns) == RECONCILE_COLUMNS
+
+
+def test_reconcile_finds_only_tampered_invoices(db):
+    pytest.importorskip("pandas")
+    engine = PricingEngine(RATES, 12)
+    billing = BillingService(db, pricing=engine)
+    rice = db.add_product("Rice", "Groceries", 33.33, 100, 5)
+    phone = db.add_product("Phone", "Electronics", 999.99, 10, 1)
+    cart = Cart()
+    billing.add_to_cart(cart, rice, 3, discount_percent=12.5)
+    billing.add_to_cart(cart, phone, 1)
+    first = billing.checkout(cart, 10, "GST")
+    billing.add_to_cart(cart, rice, 1)
+    second = billing.checkout(cart, 0, "GST")
+
+    report = reconcile(db, engine)
+    assert list(report.columns) == RECONCILE_COLUMNS
+    assert (report[["line_drift", "total_drift", "tax_drift"]] == 0).all().all()
+    assert not report['over_price'].any()
+
+    with db.transaction() as cur:
+        cur.execute("UPDATE sales SET tax = tax + 1 WHERE invoice_id = %s", (second['invoice_id'],))
+    report = reconcile(db, engine).set_index("invoice_id")
+    assert report.loc[first['invoice_id'], 'tax_drift'] == 0
+    assert report.loc[second['invoice_id'], 'tax_drift'] == -1
+    assert report.loc[second['invoice_id'], 'total_drift'] == 1
+    # At one flat rate every invoice is off from its category GST
+    assert (reconcile(db, engine, tax_percent=18)['tax_drift'] != 0).all()
@@ -0,0 +1,106 @@
+"""
+ReportEngine: results cached per report and arguments until a data
+version they depend on changes, running jobs joined, errors not cached.
+"""
+import threading
+
+import pytest
+
+from report_engine import ReportEngine
+from services import InventoryService, ReportService, ServiceError
+
+from test_database import make_sale
+
+
+class Counter:
+    """A report that counts its runs; `gate` holds it until set"""
+
+    def __init__(self):
+        self.runs = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, *args, **kwargs):
+        self.gate.wait(5)
+        self.runs += 1
+        return (self.runs, args, kwargs)
+
+
+@pytest.fixture
+def engine(db):
+    engine = ReportEngine(db, ReportService(db), InventoryService(db), workers=2, cache_size=3)
+    yield engine
+    engine.shutdown(wait=True)
+
+
+def test_results_are_cached_until_their_tables_change(db, engine):
+    sales, products = Counter(), Counter()
+    engine.register("by_sales", sales, tables=("sales",))
+    engine.register("by_products", products, tables=("products",))
+    assert engine.get("by_sales", "2024-03-01") == (1, ("2024-03-01",), {})
+    assert engine.get("by_sales", "2024-03-01") == (1, ("2024-03-01",), {})
+    assert engine.submit("by_sales", "2024-03-01").cached
+    assert engine.get("by_sales", "2024-04-01")[0] == 2  # Other arguments, another entry
+    engine.get("by_products")
+
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 5, 0)  # Stamps products only
+    assert engine.get("by_sales", "2024-03-01")[0] == 1
+    assert engine.get("by_products")[0] == 2
+
+    db.apply_sales([make_sale("INV-1", "2024-03-01 10:00:00", [(pid, "Green Tea", 120.50, 1)])])
+    assert engine.get("by_sales", "2024-03-01")[0] == 3
+    assert engine.stats()['hits'] == 3
+
+
+def test_a_change_during_a_run_is_not_served_from_cache(db, engine):
+    report = Counter()
+    engine.register("slow", report, tables=("sales",))
+    report.gate.clear()
+    job = engine.submit("slow")
+    db.mark_changed("sales")  # A sale lands while the report runs
+    report.gate.set()
+    job.wait(5)
+    assert engine.get("slow")[0] == 2
+
+
+def test_a_repeat_request_joins_the_running_job(engine):
+    report = Counter()
+    engine.register("slow", report, tables=("sales",))
+    report.gate.clear()
+    first = engine.submit("slow")
+    second = engine.submit("slow")
+    assert second is first
+    report.gate.set()
+    assert first.wait(5)
+    assert report.runs == 1
+
+
+def test_errors_are_raised_and_not_cached(engine):
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ServiceError("bad period")
+    engine.register("failing", failing)
+    for _ in range(2):
+        with pytest.raises(ServiceError):
+            engine.get("failing")
+    assert len(calls) == 2
+
+
+def test_the_oldest_entries_are_dropped(engine):
+    report = Counter()
+    engine.register("r", report, tables=("sales",))
+    for n in range(4):
+        engine.get("r", n)
+    assert engine.stats()['entries'] == 3
+    assert engine.get("r", 0)[0] == 5  # Evicted, so run again
+    assert engine.get("r", 3)[0] == 4
+
+
+def test_the_builtin_reports_run(db, engine):
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 5, 3)
+    db.apply_sales([make_sale("INV-1", "2024-03-01 10:00:00", [(pid, "Green Tea", 120.50, 2)])])
+    assert engine.get("sales_summary")['invoices'] == 1
+    assert engine.get("top_products", 5)[0]['quantity'] == 2
+    assert [row[0] for row in engine.get("low_stock")] == [pid]
@@ -0,0 +1,146 @@
+"""
+BillingService as the tills and the API use it: cart checks, checkout
+straight to the database or through the journal, and two tills (each
+with its own catalog and journal) selling the same stock.
+"""
+import pytest
+
+from database import ShopDatabase
+from invoice_ids import InvoiceIdGenerator
+from journal import SaleJournal
+from services import BillingService, NotFound, OutOfStock, ServiceError
+from cart import Cart
+
+
+def stock(db, pid):
+    return db.query("SELECT stock FROM products WHERE id = %s", (pid,), one=True)[0]
+
+
+@pytest.fixture
+def billing(db, tmp_path):
+    service = BillingService(db, invoice_ids=InvoiceIdGenerator(0, str(tmp_path / "ids")))
+    yield service
+    service.invoice_ids.close()
+
+
+def test_cart_lines_are_checked(db, billing):
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 5, 0)
+    cart = Cart()
+    for qty in (0, -1, "two", None):
+        with pytest.raises(ServiceError, match="Invalid Quantity"):
+            billing.add_to_cart(cart, pid, qty)
+    with pytest.raises(NotFound):
+        billing.add_to_cart(cart, 99, 1)
+    with pytest.raises(ServiceError):
+        billing.add_to_cart(cart, pid, 1, discount_percent=120)
+    billing.add_to_cart(cart, pid, 5)
+    with pytest.raises(OutOfStock, match="Only 5 available"):
+        billing.add_to_cart(cart, pid, 1)
+    with pytest.raises(ServiceError):
+        billing.checkout(Cart())
+
+
+def test_checkout_without_a_journal_writes_the_sale(db, billing):
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 5, 0)
+    cart = Cart()
+    billing.add_to_cart(cart, pid, 2, discount_percent=10)
+    invoice = billing.checkout(cart, 0, 18)
+    assert (invoice['subtotal'], invoice['discount'], invoice['tax'], invoice['grand_total']) == (
+        241.0, 24.1, 39.04, 255.94)
+    assert invoice['items'] == [("Green Tea", 120.5, 2, 216.9)]
+    assert len(cart) == 0
+    assert stock(db, pid) == 3
+    assert db.get_catalog().get(pid)[4] == 3
+    assert db.query("SELECT COUNT(*) FROM stock_reservations", one=True)[0] == 0
+
+
+def test_checkout_without_a_journal_is_refused_when_stock_went(db, billing):
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 1, 0)
+    cart = billing.cart_from_lines([{'id': pid, 'qty': 1}])
+    with db.transaction() as cur:
+        cur.execute("UPDATE products SET stock = 0 WHERE id = %s", (pid,))
+    with pytest.raises(OutOfStock):
+        billing.checkout(cart)
+    assert len(cart) == 1
+    assert db.query("SELECT COUNT(*) FROM sales", one=True)[0] == 0
+
+
+@pytest.fixture
+def tills(db, backend, tmp_path):
+    """Two tills on one database, each journaling its own sales"""
+    other = ShopDatabase(backend)
+    services = []
+    for n, till_db in enumerate((db, other), 1):
+        journal = SaleJournal(till_db, directory=str(tmp_path / f"journal-{n}"))
+        services.append(BillingService(till_db, journal=journal,
+                                       invoice_ids=InvoiceIdGenerator(n, str(tmp_path / f"ids-{n}"))))
+    yield services
+    for service in services:
+        service.journal.close()
+        service.invoice_ids.close()
+    other.close()
+
+
+def test_held_stock_cannot_be_added_by_another_till(db, tills):
+    first, second = tills
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 1, 0)
+    first.add_to_cart(Cart(), pid, 1)
+    with pytest.raises(OutOfStock):
+        second.add_to_cart(Cart(), pid, 1)
+
+
+def test_two_carts_race_for_the_last_unit(db, tills):
+    first, second = tills
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 1, 0)
+    for till in tills:
+        till.db.get_catalog()
+    # Both carts were filled without a hold (e.g. while holds were paused)
+    carts = [Cart(), Cart()]
+    first.add_to_cart(carts[0], pid, 1, reserve=False)
+    second.add_to_cart(carts[1], pid, 1, reserve=False)
+
+    first.checkout(carts[0])
+    with pytest.raises(OutOfStock):
+        second.checkout(carts[1])
+    assert len(carts[1]) == 1  # The refused cart is kept for the cashier
+    assert second.journal.lag()['pending'] == 0
+
+    for till in tills:
+        till.journal.drain()
+    assert stock(db, pid) == 0
+    assert db.query("SELECT COUNT(*) FROM sales", one=True)[0] == 1
+    assert db.query("SELECT COUNT(*) FROM stock_reservations", one=True)[0] == 0
+
+
+def test_a_lapsed_hold_loses_to_a_live_one(db, tills):
+    first, second = tills
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 1, 0)
+    carts = [Cart(), Cart()]
+    first.add_to_cart(carts[0], pid, 1)
+    with db.transaction() as cur:
+        cur.execute("UPDATE stock_reservations SET expires_at = 0")
+    second.add_to_cart(carts[1], pid, 1)
+
+    with pytest.raises(OutOfStock):
+        first.checkout(carts[0])
+    second.checkout(carts[1])
+    for till in tills:
+        till.journal.drain()
+    assert stock(db, pid) == 0
+
+
+def test_a_locked_row_does_not_freeze_the_till(db, tills):
+    first, second = tills
+    pid = db.add_product("Green Tea", "Groceries", 120.50, 5, 0)
+    cart = Cart()
+    with second.db.transaction() as cur:
+        cur.execute(f"SELECT stock FROM products WHERE id = %s{db.backend.for_update}", (pid,))
+        cur.fetchone()
+        # Scanning goes by cached stock; the bill waits for the other till
+        first.add_to_cart(cart, pid, 2)
+        with pytest.raises(ServiceError, match="Another till"):
+            first.checkout(cart)
+    assert first.holds_paused_until == 0.0
+    first.checkout(cart)
+    first.journal.drain()
+    assert stock(db, pid) == 3
@@ -0,0 +1,74 @@
+"""
+SalesSnapshot: closed months copied from the database and kept current
+when late sales land in them, and history() joining the snapshot with the
+open month read from the database.
+"""
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("pandas")
+
+from analytics import SalesAnalytics
+from snapshot import SalesSnapshot
+
+from test_database import make_sale
+
+TODAY = date(2024, 5, 10)  # May is open; March and April are closed
+
+
+@pytest.fixture
+def shop(db, tmp_path):
+    tea = db.add_product("Green Tea", "Groceries", 120.50, 500, 5)
+    pen = db.add_product("Ball Pen", "Stationery", 10, 500, 20)
+    db.apply_sales([
+        make_sale("INV-1", "2024-03-01 09:15:00", [(tea, "Green Tea", 120.50, 2), (pen, "Ball Pen", 10, 5)]),
+        make_sale("INV-2", "2024-04-30 23:59:00", [(pen, "Ball Pen", 10, 1)]),
+        make_sale("INV-3", "2024-05-02 11:00:00", [(tea, "Green Tea", 120.50, 1)]),
+    ])
+    return db, tea, pen, SalesSnapshot(str(tmp_path / "snapshot"))
+
+
+def test_only_closed_months_are_copied(shop):
+    db, tea, pen, snapshot = shop
+    assert snapshot.sync(db, TODAY) == 2
+    assert snapshot.months() == ["2024-03", "2024-04"]
+    assert snapshot.stats() == {'months': 2, 'through': "2024-04"}
+    assert snapshot.load("sales").column("invoice_id").to_pylist() == ["INV-1", "INV-2"]
+    assert snapshot.read_month("items", "2024-03").column("quantity").to_pylist() == [2, 5]
+    # Nothing moved: nothing is rewritten
+    assert snapshot.sync(db, TODAY) == 0
+
+
+def test_a_late_sale_rewrites_its_month(shop):
+    db, tea, pen, snapshot = shop
+    snapshot.sync(db, TODAY)
+    # A journal replayed late: a higher id than May's sale, dated in March
+    db.apply_sales([make_sale("INV-9", "2024-03-20 10:00:00", [(tea, "Green Tea", 120.50, 3)])])
+    assert snapshot.sync(db, TODAY) == 1
+    assert snapshot.load("sales", "2024-03-01", "2024-03-31").column("invoice_id").to_pylist() == ["INV-1", "INV-9"]
+    # The replaced file is cleaned up
+    assert len(os.listdir(os.path.join(snapshot.directory, "items", "month=2024-03"))) == 1
+
+
+def test_history_joins_the_snapshot_and_the_open_month(shop):
+    db, tea, pen, snapshot = shop
+    df = snapshot.history(db, "items", "2024-03-01", "2024-05-31", today=TODAY)
+    assert list(df['invoice_id']) == ["INV-1", "INV-1", "INV-2", "INV-3"]
+    assert list(df['total']) == [241.0, 50.0, 10.0, 120.5]
+    assert snapshot.months() == ["2024-03", "2024-04"]  # Synced on the way
+    # Ranges wholly inside one side
+    assert list(snapshot.history(db, "sales", "2024-05-01", today=TODAY)['invoice_id']) == ["INV-3"]
+    assert list(snapshot.history(db, "sales", None, "2024-04-15", today=TODAY)['invoice_id']) == ["INV-1"]
+    assert snapshot.history(db, "sales", "2024-04-02", "2024-04-03", today=TODAY).empty
+
+
+def test_basket_trend(shop, monkeypatch):
+    db, tea, pen, snapshot = shop
+    monkeypatch.setattr(SalesSnapshot, "open_month", staticmethod(lambda today=None: TODAY.strftime("%Y-%m")))
+    rows = SalesAnalytics(db, snapshot).basket_trend("2024-03-01", "2024-05-31")
+    assert [(row['month'], row['invoices'], row['avg_lines'], row['avg_units']) for row in rows] == [
+        ("2024-03", 1, 2.0, 7.0), ("2024-04", 1, 1.0, 1.0), ("2024-05", 1, 1.0, 1.0)]
+    assert [row['avg_bill'] for row in rows] == [291.0, 10.0, 120.5]
@@ -0,0 +1,89 @@
+"""
+Reorder forecasts from the per-product rollup, and the StockWatcher
+alerts raised as stock crosses each product's minimum.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+
+from stock_watch import StockWatcher, forecast, reorder_suggestions
+
+from test_database import make_sale
+
+
+def days_ago(n):
+    return f"{date.today() - timedelta(days=n)} 10:00:00"
+
+
+def sell(db, invoice_id, pid, name, qty):
+    sale = make_sale(invoice_id, days_ago(0), [(pid, name, 100, qty)])
+    assert db.process_sale(invoice_id, {}, sale['items'], sale['financials'])
+
+
+@pytest.fixture
+def shop(db):
+    tea = db.add_product("Green Tea", "Groceries", 100, 100, 10)
+    pen = db.add_product("Ball Pen", "Stationery", 10, 50, 5)
+    db.add_product("Stapler", "Stationery", 150, 4, 5)  # Low, never sold
+    db.apply_sales([
+        make_sale("INV-1", days_ago(1), [(tea, "Green Tea", 100, 28)]),
+        make_sale("INV-2", days_ago(3), [(tea, "Green Tea", 100, 28)]),
+        make_sale("INV-3", days_ago(2), [(pen, "Ball Pen", 10, 14)]),
+        make_sale("INV-4", days_ago(40), [(pen, "Ball Pen", 10, 30)]),  # Outside the window
+    ])
+    return db
+
+
+def test_forecast(shop):
+    df = forecast(shop, days=28, lead_days=7, cover_days=14)
+    assert list(df['name']) == ["Ball Pen", "Green Tea", "Stapler"]
+    pen, tea, stapler = (row for _, row in df.iterrows())
+    # 56 sold in 28 days leaves 44 for 22 days; 21 days of cover plus the minimum of 10 is 52
+    assert (tea['sold'], tea['velocity'], tea['days_left'], tea['reorder_qty']) == (56, 2.0, 22.0, 8)
+    # The sale 40 days ago left 6 on hand but does not count towards the rate
+    assert (pen['sold'], pen['velocity'], pen['days_left'], pen['reorder_qty']) == (14, 0.5, 12.0, 10)
+    assert stapler['days_left'] == float("inf")
+    assert stapler['reorder_qty'] == 1
+
+
+def test_reorder_suggestions(shop):
+    suggestions = reorder_suggestions(shop, days=28, lead_days=7, cover_days=14)
+    assert [row['name'] for row in suggestions] == ["Ball Pen", "Green Tea", "Stapler"]
+    assert suggestions[2] == {'id': 3, 'name': "Stapler", 'stock': 4, 'min_stock': 5,
+                              'velocity': 0.0, 'days_left': None, 'reorder_qty': 1}
+
+
+def test_forecast_without_sales(db):
+    db.add_product("Green Tea", "Groceries", 100, 0, 10)
+    df = forecast(db)
+    assert (df['sold'][0], df['velocity'][0], df['reorder_qty'][0]) == (0, 0.0, 10)
+
+
+def test_alerts_on_each_state_change(shop):
+    watcher = StockWatcher(shop)
+    assert [row[1] for row in watcher.at_risk()] == ["Stapler"]
+    assert watcher.take_alerts() == []  # Already low at start: shown by the report instead
+
+    sell(shop, "INV-5", 1, "Green Tea", 34)  # 10 left
+    sell(shop, "INV-6", 1, "Green Tea", 5)   # Still low
+    sell(shop, "INV-7", 1, "Green Tea", 5)   # Out
+    shop.update_product(1, "Green Tea", "Groceries", 100, 60, 10)
+    sell(shop, "INV-8", 2, "Ball Pen", 1)    # 5 left: at its minimum
+
+    alerts = watcher.take_alerts()
+    assert [(a['name'], a['kind'], a['stock']) for a in alerts] == [
+        ("Green Tea", "low", 10), ("Green Tea", "out", 0), ("Green Tea", "restocked", 60),
+        ("Ball Pen", "low", 5)]
+    assert watcher.take_alerts() == []
+    assert watcher.stats() == {'at_risk': 2, 'unread_alerts': 0}
+
+
+def test_only_the_latest_alerts_are_kept(db):
+    pid = db.add_product("Green Tea", "Groceries", 100, 100, 10)
+    watcher = StockWatcher(db, keep=2)
+    for stock in (5, 20, 0):
+        db.update_product(pid, "Green Tea", "Groceries", 100, stock, 10)
+    assert [a['kind'] for a in watcher.take_alerts()] == ["restocked", "out"]
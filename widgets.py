@@ -0,0 +1,202 @@
+import tkinter as tk
+from tkinter import ttk
+import metrics
+
+DEFAULT_ROW_HEIGHT = 20
+DEFAULT_HEADER_HEIGHT = 25
+
+
+class VirtualTreeview(tk.Frame):
+    """
+    A ttk.Treeview that only holds Tk items for the rows on screen.
+
+    Rows live in a plain Python list. A fixed set of item "slots" is reused
+    while scrolling, and a slot is only touched when the row it shows has
+    changed, so refreshing a 40k-row grid costs a handful of Tk calls.
+    """
+
+    def __init__(self, master, columns, height=15, key=None, format_row=None, row_tags=None, name="grid",
+                 **kwargs):
+        super().__init__(master, **kwargs)
+        self.grid_name = name         # label for the render timings in metrics
+        self.key = key                # row -> unique key (None = position)
+        self.format_row = format_row  # row -> values shown in the grid
+        self.row_tags = row_tags      # row -> tuple of tag names
+
+        self.rows = []
+        self.positions = {}     # key -> index into self.rows
+        self.offset = 0         # index of the first visible row
+        self.visible = height   # number of rows that fit on screen
+        self.slots = []         # Tk item ids, top to bottom
+        self.slot_cache = []    # (values, tags) currently shown in each slot
+        self.selected_key = None
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height, selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.visible))
+
+    # --- ttk.Treeview passthroughs used when building the grid ---
+    def heading(self, *args, **kwargs):
+        return self.tree.heading(*args, **kwargs)
+
+    def column(self, *args, **kwargs):
+        return self.tree.column(*args, **kwargs)
+
+    def tag_configure(self, *args, **kwargs):
+        return self.tree.tag_configure(*args, **kwargs)
+
+    # --- Backing data ---
+    def _key_of(self, row, pos):
+        return pos if self.key is None else self.key(row)
+
+    def _reindex(self, start=0):
+        for pos in range(start, len(self.rows)):
+            self.positions[self._key_of(self.rows[pos], pos)] = pos
+
+    def set_rows(self, rows):
+        """Replace the backing rows; only visible slots that differ are redrawn"""
+        self.rows = list(rows)
+        self.positions = {}
+        self._reindex()
+        if self.selected_key not in self.positions:
+            self.selected_key = None
+        self.render()
+
+    def upsert_row(self, row):
+        """Replace a row in place by key, or append it if it is new"""
+        pos = self.positions.get(self._key_of(row, len(self.rows)))
+        if pos is None or self.key is None:
+            self.rows.append(row)
+            self._reindex(len(self.rows) - 1)
+        else:
+            self.rows[pos] = row
+        self.render()
+
+    def remove_row(self, key):
+        pos = self.positions.pop(key, None)
+        if pos is None:
+            return
+        del self.rows[pos]
+        if self.key is None:
+            self.positions = {}
+            self._reindex()
+        else:
+            self._reindex(pos)
+        if self.selected_key == key:
+            self.selected_key = None
+        self.render()
+
+    def get_row(self, key):
+        pos = self.positions.get(key)
+        return None if pos is None else self.rows[pos]
+
+    def selected_row(self):
+        return self.get_row(self.selected_key) if self.selected_key is not None else None
+
+    # --- Rendering ---
+    def render(self):
+        with metrics.span("treeview_render", tree=self.grid_name):
+            self._render()
+
+    def _render(self):
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        wanted = min(self.visible, total)
+
+        # Grow or shrink the pool of slots to the number of rows on screen
+        while len(self.slots) < wanted:
+            self.slots.append(self.tree.insert("", "end"))
+            self.slot_cache.append(None)
+        while len(self.slots) > wanted:
+            self.tree.delete(self.slots.pop())
+            self.slot_cache.pop()
+
+        selected_slot = None
+        for i, iid in enumerate(self.slots):
+            pos = self.offset + i
+            row = self.rows[pos]
+            values = tuple(self.format_row(row)) if self.format_row else tuple(row)
+            tags = tuple(self.row_tags(row)) if self.row_tags else ()
+            if self.slot_cache[i] != (values, tags):
+                self.tree.item(iid, values=values, tags=tags)
+                self.slot_cache[i] = (values, tags)
+            if self.selected_key is not None and self._key_of(row, pos) == self.selected_key:
+                selected_slot = iid
+
+        current = self.tree.selection()
+        if selected_slot is None and current:
+            self.tree.selection_remove(*current)
+        elif selected_slot is not None and current != (selected_slot,):
+            self.tree.selection_set(selected_slot)
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + wanted) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_resize(self, event=None):
+        row_height = DEFAULT_ROW_HEIGHT
+        header = DEFAULT_HEADER_HEIGHT
+        if self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                header, row_height = bbox[1], bbox[3]
+        visible = max(1, (self.tree.winfo_height() - header) // max(row_height, 1))
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    # --- Scrolling & Selection ---
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), len(self.rows) - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.rows))
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS reports small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll_by(-delta * 3)
+
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection or selection[0] not in self.slots:
+            return
+        pos = self.offset + self.slots.index(selection[0])
+        if pos < len(self.rows):
+            self.selected_key = self._key_of(self.rows[pos], pos)
+
+    def move_selection(self, step):
+        if not self.rows:
+            return "break"
+        pos = self.positions.get(self.selected_key, self.offset - step)
+        pos = max(0, min(pos + step, len(self.rows) - 1))
+        self.selected_key = self._key_of(self.rows[pos], pos)
+        if pos < self.offset:
+            self.offset = pos
+        elif pos >= self.offset + self.visible:
+            self.offset = pos - self.visible + 1
+        self.render()
+        return "break"